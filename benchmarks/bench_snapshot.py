@@ -0,0 +1,95 @@
+"""
+    Память и скорость снимка клиентов (src/api/snapshot.py) без базы: снимок строится из тех же
+    строк, что заливает benchmarks.dataset, память меряется через tracemalloc (NumPy сообщает ему
+    о своих буферах, включая кучу StringDType).
+        python -m benchmarks.bench_snapshot --clients 1000000
+"""
+import time
+import random
+import argparse
+import tracemalloc
+
+from types import SimpleNamespace
+from datetime import datetime, timezone
+
+from benchmarks.dataset import CITIES, generate_clients
+from src.api.schemas import CurrentUserSchema
+from src.api.snapshot import ClientSnapshot
+from src.api.settings import CLIENT_SNAPSHOT_CHUNK_SIZE
+
+QUERIES = {
+    "all": {},
+    "gender": {"gender": "female"},
+    "first_name": {"first_name": "анна"},
+    "gender_last_name_desc": {"gender": "male", "last_name": "Петров", "sort_order": "desc"},
+    "distance_10km": {"distance": 10},
+    "distance_100km_gender": {"distance": 100, "gender": "female"},
+    "distance_1000km_first_name": {"distance": 1000, "first_name": "Maria"},
+}
+
+
+def generate_rows(count: int, seed: int) -> list:
+    rows = [SimpleNamespace(id=i + 1, email=email, first_name=first_name, last_name=last_name, gender=gender,
+                            photo=f"client_photos/{i % 256:02x}/{i:064x}.jpeg", latitude=latitude,
+                            longitude=longitude, time_created=time_created, time_updated=None)
+            for i, (email, _, first_name, last_name, gender, latitude, longitude, time_created)
+            in enumerate(generate_clients(count, random.Random(seed), datetime.now(timezone.utc)))]
+    rows.sort(key=lambda row: (row.time_created, row.id))
+    return rows
+
+
+def measure(call, repeats: int) -> str:
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return f"p50 {timings[len(timings) // 2]:8.3f} ms, max {timings[-1]:8.3f} ms"
+
+
+def build(rows: list) -> ClientSnapshot:
+    snapshot = ClientSnapshot()
+    for i in range(0, len(rows), CLIENT_SNAPSHOT_CHUNK_SIZE):
+        snapshot.apply(rows[i:i + CLIENT_SNAPSHOT_CHUNK_SIZE])
+    snapshot.within(0.0, 0.0, 1.0)  # строит сетку
+    return snapshot
+
+
+def main(clients: int, repeats: int, seed: int):
+    rows = generate_rows(clients, seed)
+
+    started = time.perf_counter()
+    build(rows)
+    elapsed = time.perf_counter() - started
+
+    # Отдельная сборка под tracemalloc: с ним Python-код заметно медленнее.
+    tracemalloc.start()
+    snapshot = build(rows)
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{clients} clients loaded in {elapsed:.1f} s")
+    print(f"memory: {used / clients:.1f} bytes per client (arrays {snapshot.nbytes() / clients:.1f}), "
+          f"{used / 2 ** 20:.1f} MiB total")
+
+    latitude, longitude = CITIES[0]
+    current_user = CurrentUserSchema(id=1, email="user0@example.com", first_name=None, latitude=latitude,
+                                     longitude=longitude)
+    for name, filters in QUERIES.items():
+        filters = dict(filters)
+        sort_order = filters.pop("sort_order", None)
+        print(f"{name:>28}: " + measure(
+            lambda: snapshot.query_clients(sort_order, current_user, limit=50, **filters), repeats))
+    for limit in (10, 100):
+        print(f"{f'nearest {limit}':>28}: " + measure(lambda: snapshot.nearest_clients(current_user, limit), repeats))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=1_000_000)
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    main(args.clients, args.repeats, args.seed)
@@ -0,0 +1,40 @@
+"""
+    Сравнение двух результатов benchmarks.load (например, до и после коммита):
+        python -m benchmarks.compare before.json after.json
+    Для pytest-benchmark есть своё сравнение: pytest-benchmark compare.
+"""
+import json
+import argparse
+
+METRICS = ("throughput_rps", "p50_ms", "p95_ms", "p99_ms", "errors")
+
+
+def compare(before: dict, after: dict) -> list[tuple]:
+    rows = []
+    for endpoint in sorted(set(before["endpoints"]) | set(after["endpoints"])):
+        old, new = before["endpoints"].get(endpoint, {}), after["endpoints"].get(endpoint, {})
+        for metric in METRICS:
+            old_value, new_value = old.get(metric), new.get(metric)
+            change = None
+            if old_value and new_value is not None:
+                change = (new_value - old_value) / old_value * 100
+            rows.append((endpoint, metric, old_value, new_value, change))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("before")
+    parser.add_argument("after")
+    args = parser.parse_args()
+
+    with open(args.before) as before, open(args.after) as after:
+        before, after = json.load(before), json.load(after)
+
+    print(f"{before.get('commit')} -> {after.get('commit')}")
+    print(f"{'endpoint':<8} {'metric':<15} {'before':>10} {'after':>10} {'change':>8}")
+    for endpoint, metric, old_value, new_value, change in compare(before, after):
+        old_text = "-" if old_value is None else f"{old_value:.1f}"
+        new_text = "-" if new_value is None else f"{new_value:.1f}"
+        change_text = "" if change is None else f"{change:+.1f}%"
+        print(f"{endpoint:<8} {metric:<15} {old_text:>10} {new_text:>10} {change_text:>8}")
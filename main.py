@@ -1,49 +1,156 @@
+import os
 import uvicorn
 
 from datetime import datetime
-from typing import List, Literal, Optional
+from contextlib import asynccontextmanager
+from typing import Literal, Optional
 from fastapi.staticfiles import StaticFiles
-from fastapi import FastAPI, Depends, Request
+from fastapi import FastAPI, Depends, Request, Query, HTTPException
+from fastapi.responses import StreamingResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.api.crud import get_clients_db, get_current_user
-from src.api.database import get_session
-from src.api.schemas import ClientSchema
+from src.api.crud import get_clients_db, get_current_user, build_clients_query, stream_clients_db, clients_cache, \
+    users_cache, get_auth_cache_stats, get_clients_version
+from src.api.database import get_read_session, get_read_sessionmaker, dispose_engines
+from src.api.schemas import ClientPageSchema
+from src.api.responses import PydanticJSONResponse
+from src.api.utils import get_cache_key, get_etag, etag_matches, require_location
+from src.api.mailer import outbox_worker
+from src.api.photos import photo_pipeline
+from src.api.metrics import MetricsMiddleware, register_stats, render_metrics, mark_worker_dead
+from src.api.invalidation import invalidation_listener
+from src.api.snapshot import client_snapshot
+from src.api.partitions import partition_maintainer
+from src.api.profiling import ProfilingMiddleware, request_profiler, loop_monitor, has_profile_token
+from src.api.ratelimit import RateLimitMiddleware, request_limits
+from src.api.uploads import BodySizeLimitMiddleware
+from src.api.settings import LIST_PAGE_DEFAULT_LIMIT, LIST_PAGE_MAX_LIMIT, EMAIL_WORKER_ENABLED, \
+    PHOTO_STORAGE_DIR, PHOTO_URL_PREFIX, CACHE_INVALIDATION_ENABLED, WEB_WORKERS, CLIENT_SNAPSHOT_ENABLED, \
+    RATE_LIMIT_ENABLED, LIST_HTTP_MAX_AGE_SECONDS, PARTITION_MAINTENANCE_ENABLED, PROFILING_ENABLED, \
+    LOOP_MONITOR_ENABLED, NDJSON_MEDIA_TYPE
 from src.api.router import router as client_router
 
 
-app = FastAPI(root_path="/api", docs_url='/docs', openapi_url='/openapi.json')
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if CACHE_INVALIDATION_ENABLED:
+        await invalidation_listener.start()
+    if EMAIL_WORKER_ENABLED:
+        outbox_worker.start()
+    if CLIENT_SNAPSHOT_ENABLED:
+        # Снимок грузится в фоне; пока он не готов, /list читает из базы.
+        client_snapshot.start()
+    if PARTITION_MAINTENANCE_ENABLED:
+        partition_maintainer.start()
+    if LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+    yield
+    await loop_monitor.stop()
+    await partition_maintainer.stop()
+    await client_snapshot.stop()
+    await outbox_worker.stop()
+    await invalidation_listener.stop()
+    photo_pipeline.shutdown()
+    await dispose_engines()
+    mark_worker_dead()
+
+
+app = FastAPI(root_path="/api", docs_url='/docs', openapi_url='/openapi.json', lifespan=lifespan)
 
 app.include_router(client_router)
+app.add_middleware(BodySizeLimitMiddleware)
+if RATE_LIMIT_ENABLED:
+    # Добавляется раньше MetricsMiddleware, то есть оказывается внутри неё: отказы 429/503 тоже попадают в метрики.
+    app.add_middleware(RateLimitMiddleware)
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+register_stats("clients_cache", clients_cache.stats)
+register_stats("users_cache", users_cache.stats)
+register_stats("token_cache", lambda: get_auth_cache_stats()["tokens"])
+register_stats("email_outbox", outbox_worker.stats)
+register_stats("cache_invalidation", invalidation_listener.stats)
+register_stats("client_snapshot", client_snapshot.stats)
+register_stats("rate_limit", request_limits.stats)
+register_stats("match_partitions", partition_maintainer.stats)
+register_stats("profiling", request_profiler.stats)
+register_stats("event_loop", loop_monitor.stats)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    return Response(render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
 
+@app.post("/debug/profile", include_in_schema=False)
+async def arm_profiling(request: Request, route: str, count: int = Query(1, ge=1, le=100)) -> dict:
+    """Профилировать count следующих запросов к маршруту route в этом воркере (pid в ответе)."""
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled.")
+    if not has_profile_token(request.scope):
+        raise HTTPException(status_code=403, detail="Profiling token required.")
+    if route not in {getattr(app_route, "path", None) for app_route in app.routes}:
+        raise HTTPException(status_code=404, detail="Unknown route.")
 
-@app.get("/list", response_model=List[ClientSchema])
+    request_profiler.arm(route, count)
+    return {"route": route, "count": count, "pid": os.getpid()}
+
+
+@app.get("/list", response_model=ClientPageSchema)
 async def get_clients_list(
         request: Request,
         gender: Optional[Literal["male", "female"]] = None,
         first_name: Optional[str] = None,
         last_name: Optional[str] = None,
+        search: Optional[str] = Query(None, min_length=3, max_length=64),
         distance: Optional[float] = None,
         time_created: Optional[datetime] = None,
         sort_order: Optional[Literal["desc", "asc"]] = None,
-        session: AsyncSession = Depends(get_session)) -> List[ClientSchema]:
+        limit: int = Query(LIST_PAGE_DEFAULT_LIMIT, ge=1, le=LIST_PAGE_MAX_LIMIT),
+        cursor: Optional[str] = None,
+        format: Optional[Literal["json", "ndjson"]] = None,
+        session: AsyncSession = Depends(get_read_session)) -> PydanticJSONResponse | StreamingResponse:
 
     current_user = await get_current_user(request, session)
 
-    clients = await get_clients_db(
-        session=session,
-        sort_order=sort_order,
-        current_user=current_user,
-        gender=gender,
-        first_name=first_name,
-        last_name=last_name,
-        time_created=time_created,
-        distance=distance)
+    if format == "ndjson" or (format is None and NDJSON_MEDIA_TYPE in request.headers.get("accept", "")):
+        # Полная выгрузка: без limit, но с фильтрами и курсором (для продолжения прерванной выгрузки).
+        if search:
+            raise HTTPException(status_code=400, detail="Search is not supported in ndjson export.")
+        # Запрос строится до начала ответа, чтобы ошибки фильтров (401/400) вернулись обычным статусом.
+        query = build_clients_query(sort_order, current_user, gender=gender, first_name=first_name,
+                                    last_name=last_name, time_created=time_created, distance=distance,
+                                    cursor=cursor)
+        return StreamingResponse(stream_clients_db(query, session_factory=get_read_sessionmaker(request)),
+                                 media_type=NDJSON_MEDIA_TYPE, headers={"Cache-Control": "no-store"})
+
+    filters = dict(gender=gender, first_name=first_name, last_name=last_name, search=search,
+                   time_created=time_created, distance=distance, limit=limit, cursor=cursor)
+    if distance:
+        require_location(current_user)
+    # Версия попадает и в ETag, и в ключ кэша страниц: после изменения таблицы старые страницы не отдаются.
+    filters["version"] = await get_clients_version(session, **filters)
+
+    etag = get_etag(get_cache_key(sort_order, current_user, **filters))
+    headers = {
+        "ETag": etag,
+        # Анонимный ответ одинаков для всех, его кэширует nginx; ответ пользователю перепроверяется по ETag.
+        "Cache-Control": f"public, max-age={LIST_HTTP_MAX_AGE_SECONDS}" if current_user is None else "private, no-cache",
+        "Vary": "Accept, Cookie",
+    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    clients = await get_clients_db(session=session, sort_order=sort_order, current_user=current_user, **filters)
 
-    return clients
+    return PydanticJSONResponse(clients, headers=headers)
 
 
-app.mount("/static", StaticFiles(directory="client_photos"), name="static")
+# В docker-compose фото отдаёт nginx (location /api/static/), сюда запросы доходят только при запуске без него.
+app.mount(PHOTO_URL_PREFIX, StaticFiles(directory=PHOTO_STORAGE_DIR), name="static")
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000)
+    # Воркеры - отдельные процессы со своими кэшами, согласованность держит LISTEN/NOTIFY (src/api/invalidation.py).
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=WEB_WORKERS)
@@ -0,0 +1,115 @@
+import time
+import asyncio
+
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class AsyncTTLCache:
+    """
+        Кэш результатов асинхронных запросов: хранит значения (а не корутины),
+        вытесняет записи по LRU и TTL, схлопывает одновременные промахи по одному ключу
+        в один запрос (single-flight) и сбрасывается явно через invalidate().
+    """
+
+    def __init__(self, maxsize: int, ttl: float, timer: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        while True:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > self.timer():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+                self.expirations += 1
+
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                return await self._load(key, loader)
+
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # Загрузчик работает на сессии первого запроса, и его отменили вместе с ним (клиент отключился).
+                # Если отменили не этот запрос, а первый, - загружаем заново сами, а не отдаём отмену дальше.
+                if not inflight.cancelled() or asyncio.current_task().cancelling():
+                    raise
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+
+        try:
+            value = await loader()
+        except BaseException as e:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # Помечаем исключение полученным, чтобы asyncio не ругался, если ждущих не было.
+                future.exception()
+            raise
+
+        # invalidate() снимает с _inflight загрузки сброшенных ключей: если ключ сбросили, пока шёл запрос,
+        # результат мог устареть - отдаём, но не сохраняем. Загрузки других ключей это не затрагивает.
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+            self._set(key, value)
+        future.set_result(value)
+
+        return value
+
+    def _set(self, key: Hashable, value: Any):
+        self._data[key] = (self.timer() + self.ttl, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, predicate: Callable[[Hashable], bool] | None = None):
+        """Сбрасывает все записи или только те, ключи которых удовлетворяют predicate."""
+        if predicate is None:
+            self._data.clear()
+            self._inflight.clear()
+        else:
+            for key in [key for key in self._data if predicate(key)]:
+                del self._data[key]
+            for key in [key for key in self._inflight if predicate(key)]:
+                del self._inflight[key]
+
+        self.invalidations += 1
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
@@ -1,151 +1,485 @@
-from io import BytesIO
-from typing import List
-from datetime import datetime
+import json
+from datetime import date, datetime
+from typing import AsyncIterator
 from fastapi import HTTPException, Request
-from sqlalchemy import select
-from sqlalchemy import and_, desc, asc
-from cachetools import TTLCache, cached
-from sqlalchemy.ext.asyncio import AsyncSession
-
-from src.api.settings import DAILY_LIKE_LIMIT
-from src.api.models import Client, Match
-from src.api.schemas import ClientSchema, CreateClientSchema
-from src.api.utils import save_client_photo, calculate_distance, send_mutual_match_email, get_cache_key, decode_jwt
-
-client_cache = TTLCache(maxsize=100, ttl=60)
+from sqlalchemy import select, tuple_, func, literal, exists, Select, any_, bindparam, Integer
+from sqlalchemy.orm import aliased
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy import and_, or_, desc, asc
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.api.cache import AsyncTTLCache
+from src.api.settings import DAILY_LIKE_LIMIT, LIST_PAGE_DEFAULT_LIMIT, LIST_CACHE_MAXSIZE, LIST_CACHE_TTL_SECONDS, \
+    NAME_SEARCH_MAX_RESULTS, USER_CACHE_MAXSIZE, USER_CACHE_TTL_SECONDS, NDJSON_CHUNK_SIZE
+from src.api.models import Client, Match, Outbox, table_version, daily_likes, match_pair
+from src.api.schemas import ClientSchema, CreateClientSchema, ClientPageSchema, CurrentUserSchema, \
+    BatchMatchResultSchema, MatchResultSchema, FeedPageSchema, NearestClientsSchema, client_list_adapter, \
+    feed_item_adapter, nearest_client_adapter
+from src.api.mailer import outbox_worker
+from src.api.database import async_session
+from src.api.invalidation import publish_invalidation, register_invalidation_handler
+from src.api.snapshot import client_snapshot
+from src.api.utils import build_mutual_match_emails, build_batch_mutual_match_emails, \
+    get_cache_key, decode_jwt_cached, get_bounding_box, sql_calculate_distance, encode_cursor, decode_cursor, \
+    escape_like, require_location, token_cache, token_cache_stats
+
+clients_cache = AsyncTTLCache(maxsize=LIST_CACHE_MAXSIZE, ttl=LIST_CACHE_TTL_SECONDS)
+users_cache = AsyncTTLCache(maxsize=USER_CACHE_MAXSIZE, ttl=USER_CACHE_TTL_SECONDS)
+
+CLIENT_LIST_COLUMNS = (Client.id, Client.email, Client.first_name, Client.last_name, Client.gender, Client.photo,
+                       Client.longitude, Client.latitude, Client.time_created)
 
 
 async def create_client_db(
         session: AsyncSession,
-        client: CreateClientSchema,
-        photo: BytesIO) -> ClientSchema:
+        client: CreateClientSchema) -> ClientSchema:
     client = Client(**client.model_dump())
-    client.photo = await save_client_photo(photo, client.email)
 
     session.add(client)
 
     try:
+        # Остальные воркеры сбросят свои кэши по NOTIFY, который уйдёт вместе с COMMIT.
+        await publish_invalidation(session, {"cache": "clients"}, {"cache": "users", "email": client.email})
         await session.commit()
-        return ClientSchema.from_orm(client)
     except Exception as e:
         await session.rollback()
         raise HTTPException(status_code=403, detail=f"An error occurred while creating a new user. {e}")
 
+    invalidate_clients_cache()
+    invalidate_current_user(client.email)
+
+    if client_snapshot.ready:
+        # Свою регистрацию снимок видит сразу, не дожидаясь дельты.
+        await session.refresh(client, ["time_created", "time_updated"])
+        client_snapshot.apply([client])
+
+    return ClientSchema.from_orm(client)
+
+
+def invalidate_clients_cache():
+    """Вызывается после любого изменения таблицы client (создание, обновление профиля)."""
+    clients_cache.invalidate()
+    client_snapshot.request_refresh()
+
+
+register_invalidation_handler("clients", lambda event: invalidate_clients_cache())
+
 
-@cached(cache=client_cache, key=lambda *args, **kwargs: get_cache_key(*args[1:], **kwargs))
 async def get_clients_db(
         session: AsyncSession,
         sort_order: str | None,
-        current_user: CreateClientSchema | None,
-        **kwargs) -> List[ClientSchema] | CreateClientSchema:
-    query = select(Client)
+        current_user: CurrentUserSchema | None,
+        **kwargs) -> ClientPageSchema | CreateClientSchema:
+    if client_snapshot.supports(**kwargs):
+        return client_snapshot.query_clients(sort_order, current_user, **kwargs)
 
-    filters = []
+    return await clients_cache.get_or_load(
+        get_cache_key(sort_order, current_user, **kwargs),
+        lambda: query_clients_db(session, sort_order, current_user, **kwargs))
+
+
+async def get_clients_version(session: AsyncSession, **kwargs) -> int | tuple[int, int]:
+    """
+        Версия данных, из которых будет построен ответ /list: версия снимка, если запрос обслужит он,
+        иначе версия таблицы client в базе. Читается до основного запроса, поэтому данные не старее версии.
+    """
+    if client_snapshot.supports(**kwargs):
+        return client_snapshot.etag_version
+    return await get_table_version(session, Client.__tablename__)
+
+
+async def get_table_version(session: AsyncSession, name: str) -> int:
+    result = await session.execute(select(table_version.c.version).where(table_version.c.name == name))
+    return result.scalar() or 0
+
+
+async def query_clients_db(
+        session: AsyncSession,
+        sort_order: str | None,
+        current_user: CurrentUserSchema | None,
+        **kwargs) -> ClientPageSchema | CreateClientSchema:
     if kwargs.get('email'):
-        result = await session.execute(query.where(Client.email == kwargs['email']))
+        result = await session.execute(select(Client).where(Client.email == kwargs['email']))
         client = result.scalars().first()
         return CreateClientSchema.from_orm(client)
+
+    limit = kwargs.get('limit') or LIST_PAGE_DEFAULT_LIMIT
+
+    # Поиск - одна страница лучших совпадений: limit урезается до NAME_SEARCH_MAX_RESULTS,
+    # cursor не учитывается, next_cursor всегда пустой.
+    if kwargs.get('search'):
+        return await search_clients_db(session, kwargs['search'], get_clients_filters(current_user, **kwargs),
+                                       min(limit, NAME_SEARCH_MAX_RESULTS))
+
+    query = build_clients_query(sort_order, current_user, **kwargs)
+
+    result = await session.execute(query.limit(limit + 1))
+    clients = result.all()
+
+    next_cursor = None
+    if len(clients) > limit:
+        clients = clients[:limit]
+        next_cursor = encode_cursor(clients[-1].time_created, clients[-1].id)
+
+    return ClientPageSchema.model_construct(items=client_list_adapter.validate_python(clients, from_attributes=True),
+                                            next_cursor=next_cursor)
+
+
+def get_clients_filters(current_user: CurrentUserSchema | None, **kwargs) -> list:
+    filters = []
     if kwargs.get('gender'):
         filters.append(Client.gender == kwargs['gender'])
+    # ILIKE '%...%' по колонкам имён обслуживается GIN-индексами pg_trgm.
     if kwargs.get('first_name'):
-        filters.append(Client.first_name.ilike(f"%{kwargs['first_name']}%"))
+        filters.append(Client.first_name.ilike(f"%{escape_like(kwargs['first_name'])}%", escape="/"))
     if kwargs.get('last_name'):
-        filters.append(Client.last_name.ilike(f"%{kwargs['last_name']}%"))
+        filters.append(Client.last_name.ilike(f"%{escape_like(kwargs['last_name'])}%", escape="/"))
     if kwargs.get('time_created'):
         filters.append(Client.time_created == kwargs['time_created'])
+    if kwargs.get('distance'):
+        filters.extend(get_distance_filters(current_user, kwargs['distance']))
+    return filters
+
+
+def build_clients_query(sort_order: str | None, current_user: CurrentUserSchema | None, **kwargs) -> Select:
+    """Запрос списка клиентов с фильтрами, курсором и сортировкой, но без LIMIT."""
+    # Выбираем только отдаваемые колонки (без пароля) кортежами, без ORM-сущностей.
+    query = select(*CLIENT_LIST_COLUMNS)
+    filters = get_clients_filters(current_user, **kwargs)
+
+    # Keyset-пагинация по (time_created, id): каждая страница - ограниченный проход
+    # по индексу ix_client_time_created_id, без OFFSET.
+    page_key = tuple_(Client.time_created, Client.id)
+    if kwargs.get('cursor'):
+        last_key = tuple_(*decode_cursor(kwargs['cursor']))
+        filters.append(page_key < last_key if sort_order == "desc" else page_key > last_key)
 
     if filters:
         query = query.where(and_(*filters))
 
     if sort_order == "desc":
-        query = query.order_by(desc(Client.time_created))
-    if sort_order == "asc" or not sort_order:
-        query = query.order_by(asc(Client.time_created))
+        return query.order_by(desc(Client.time_created), desc(Client.id))
+    return query.order_by(asc(Client.time_created), asc(Client.id))
+
+
+async def stream_clients_db(query: Select, chunk_size: int = NDJSON_CHUNK_SIZE,
+                            session_factory: async_sessionmaker = async_session) -> AsyncIterator[bytes]:
+    """
+        Выгрузка в NDJSON через серверный курсор: в памяти одновременно не больше chunk_size строк.
+        Открывает свою сессию - сессия из Depends(get_session) закрывается раньше, чем начнётся отдача тела.
+        После каждой пачки строк идёт строка {"next_cursor": ...}: прерванную выгрузку продолжают с cursor
+        из последней полученной такой строки, без пропусков и повторов.
+    """
+    async with session_factory() as session:
+        result = await session.stream(query.execution_options(yield_per=chunk_size))
+        async for rows in result.partitions(chunk_size):
+            clients = client_list_adapter.validate_python(rows, from_attributes=True)
+            next_cursor = json.dumps({"next_cursor": encode_cursor(rows[-1].time_created, rows[-1].id)}).encode()
+            yield b"".join(client.model_dump_json().encode() + b"\n" for client in clients) + next_cursor + b"\n"
+
+
+async def search_clients_db(session: AsyncSession, search: str, filters: list, limit: int) -> ClientPageSchema:
+    """
+        Ранжированный поиск по имени и фамилии: триграммный оператор % (через GIN-индексы),
+        сортировка по похожести, не больше limit результатов и без пагинации.
+    """
+    rank = func.greatest(func.similarity(Client.first_name, search), func.similarity(Client.last_name, search))
+
+    query = select(*CLIENT_LIST_COLUMNS).where(
+        and_(or_(Client.first_name.op('%')(search), Client.last_name.op('%')(search)), *filters)
+    ).order_by(desc(rank), asc(Client.id)).limit(limit)
 
     result = await session.execute(query)
-    clients = result.scalars().all()
+    clients = result.all()
 
-    if kwargs.get('distance'):
-        if not current_user:
-            raise HTTPException(status_code=401, detail="You are not authorized!")
+    return ClientPageSchema.model_construct(items=client_list_adapter.validate_python(clients, from_attributes=True),
+                                            next_cursor=None)
+
+
+def get_distance_filters(current_user: CurrentUserSchema | None, distance: float) -> list:
+    """
+        Фильтр по расстоянию выполняется в БД: сначала ограничивающий прямоугольник,
+        который отрабатывает по индексу ix_client_latitude_longitude, затем точная
+        проверка по формуле гаверсинуса только для оставшихся строк.
+    """
+    latitude, longitude = require_location(current_user)
 
-        if current_user.latitude is None or current_user.longitude is None:
-            raise HTTPException(status_code=400, detail="Current user location is not set.")
+    min_lat, max_lat, lon_ranges = get_bounding_box(latitude, longitude, distance)
 
-        clients_in_range = [
-            ClientSchema.from_orm(client) for client in clients
-            if client.latitude is not None and client.longitude is not None and calculate_distance(
-                   current_user.latitude,
-                   current_user.longitude, client.latitude,
-                   client.longitude) <= kwargs['distance']
-        ]
+    filters = [Client.latitude.between(min_lat, max_lat), Client.longitude.is_not(None)]
+    if lon_ranges:
+        filters.append(or_(*[Client.longitude.between(min_lon, max_lon) for min_lon, max_lon in lon_ranges]))
 
-        return clients_in_range
+    filters.append(sql_calculate_distance(latitude, longitude, Client.latitude, Client.longitude) <= distance)
 
-    return [ClientSchema.from_orm(client) for client in clients]
+    return filters
 
 
-async def check_mutual_match(session: AsyncSession, target_client: Client, current_user: CreateClientSchema) -> bool:
-    mutual_match = await session.execute(
-        select(Match).where(
-            Match.user_id == target_client.id,
-            Match.target_user_id == current_user.id
-        )
+async def get_nearest_clients_db(session: AsyncSession, current_user: CurrentUserSchema | None,
+                                 limit: int) -> NearestClientsSchema:
+    """Ближайшие клиенты: по снимку, а пока он не загружен (или выключен) - сортировкой в базе."""
+    if client_snapshot.ready:
+        return NearestClientsSchema.model_construct(items=client_snapshot.nearest_clients(current_user, limit))
+
+    latitude, longitude = require_location(current_user)
+    distance = sql_calculate_distance(latitude, longitude, Client.latitude, Client.longitude).label("distance")
+
+    result = await session.execute(
+        select(*CLIENT_LIST_COLUMNS, distance)
+        .where(Client.latitude.is_not(None), Client.longitude.is_not(None), Client.id != current_user.id)
+        .order_by(distance, Client.id)
+        .limit(limit))
+
+    return NearestClientsSchema.model_construct(
+        items=nearest_client_adapter.validate_python(result.all(), from_attributes=True))
+
+
+def get_used_likes(user_id: int, today: date):
+    """Лайки за сегодня - одна строка счётчика daily_likes по первичному ключу."""
+    return func.coalesce(select(daily_likes.c.count).where(daily_likes.c.user_id == user_id,
+                                                           daily_likes.c.day == today).scalar_subquery(), 0)
+
+
+def count_likes_statement(user_id: int, today: date, count: int):
+    statement = pg_insert(daily_likes).values(user_id=user_id, day=today, count=count)
+    return statement.on_conflict_do_update(index_elements=[daily_likes.c.user_id, daily_likes.c.day],
+                                           set_={"count": daily_likes.c.count + statement.excluded.count})
+
+
+def build_like_statement(user_id: int, target_id: int, today: date):
+    """
+        Один запрос на лайк: проверка цели, дневной счётчик, вставка пары в match_pair при непревышенном
+        лимите (ON CONFLICT DO NOTHING - повторный лайк не вставится), лайка в match - только для
+        вставленной пары, увеличение счётчика и проверка встречного лайка.
+    """
+    target = select(Client.id, Client.email, Client.first_name).where(Client.id == target_id).cte("target")
+    used = get_used_likes(user_id, today)
+    paired = (
+        pg_insert(match_pair)
+        .from_select(["user_id", "target_user_id"],
+                     select(literal(user_id), target.c.id).where(used < DAILY_LIKE_LIMIT))
+        .on_conflict_do_nothing()
+        .returning(match_pair.c.user_id, match_pair.c.target_user_id)
+        .cte("paired")
+    )
+    inserted = (
+        pg_insert(Match)
+        .from_select(["user_id", "target_user_id"], select(paired.c.user_id, paired.c.target_user_id))
+        .returning(Match.id)
+        .cte("inserted")
+    )
+    counted = (
+        pg_insert(daily_likes)
+        .from_select(["user_id", "day", "count"],
+                     select(literal(user_id), literal(today), literal(1)).select_from(inserted))
+        .on_conflict_do_update(index_elements=[daily_likes.c.user_id, daily_likes.c.day],
+                               set_={"count": daily_likes.c.count + 1})
+        .returning(daily_likes.c.count)
+        .cte("counted")
     )
-    mutual_match = mutual_match.scalars().first()
 
-    if mutual_match:
-        return True
-    return False
+    return select(
+        select(target.c.email).scalar_subquery().label("email"),
+        select(target.c.first_name).scalar_subquery().label("first_name"),
+        used.label("used_likes"),
+        exists(select(counted.c.count)).label("inserted"),
+        exists().where(Match.user_id == target_id, Match.target_user_id == user_id).label("mutual"),
+    )
 
 
 async def create_match_db(
         id: int,
-        current_user: CreateClientSchema | None,
+        current_user: CurrentUserSchema | None,
         session: AsyncSession) -> dict:
+    if not current_user:
+        raise HTTPException(status_code=401, detail="You are not authorized!")
+
     if current_user.id == id:
         raise HTTPException(status_code=403, detail="You can't evaluate yourself!")
 
-    target_client = await session.get(Client, id)
+    today = datetime.utcnow().date()
 
-    if not target_client:
-        raise HTTPException(status_code=404, detail="The client you want to send sympathy to is not there!")
+    # Лайки одного пользователя сериализуются на транзакционной advisory-блокировке, чтобы параллельные
+    # лайки не превысили дневной лимит. Она берётся отдельным запросом: снимок данных для проверки лимита
+    # должен быть сделан уже после неё. Повторный лайк отсекает первичный ключ match_pair.
+    await session.execute(select(func.pg_advisory_xact_lock(current_user.id)))
+    like = (await session.execute(build_like_statement(current_user.id, id, today))).one()
 
-    today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    daily_likes_count = await session.execute(select(Match).where(
-        Match.user_id == current_user.id,
-        Match.time_created >= today_start
-    )
-    )
+    if not like.inserted:
+        await session.rollback()
+
+        if like.email is None:
+            raise HTTPException(status_code=404, detail="The client you want to send sympathy to is not there!")
+        if like.used_likes >= DAILY_LIKE_LIMIT:
+            raise HTTPException(status_code=400, detail="Daily like limit reached.")
+        raise HTTPException(status_code=400, detail="You have already matched this client.")
 
-    if len(daily_likes_count.scalars().all()) >= DAILY_LIKE_LIMIT:
-        raise HTTPException(status_code=400, detail="Daily like limit reached.")
+    if like.mutual:
+        # Письма только ставятся в очередь в той же транзакции, отправляет их EmailOutboxWorker.
+        session.add_all([Outbox(recipient=recipient, subject=subject, body=body)
+                         for recipient, subject, body in build_mutual_match_emails(current_user, like)])
 
-    match = await session.execute(select(Match).where(
-        Match.user_id == current_user.id,
-        Match.target_user_id == target_client.id
-    )
+    await session.commit()
+
+    if like.mutual:
+        outbox_worker.wake()
+        return {"message": "Mutual match!", "target_email": like.email}
+
+    return {'message': 'Match sent!'}
+
+
+def build_batch_targets_statement(user_id: int, target_ids: list[int], today: date):
+    """
+        Один запрос на всю пачку лайков: какие цели существуют (id = ANY(...)), какие уже лайкнуты,
+        какие лайкнули нас (для взаимных симпатий - LEFT JOIN по match в обе стороны)
+        и сколько лайков уже потрачено сегодня.
+    """
+    mine = aliased(Match)
+    theirs = aliased(Match)
+    used = get_used_likes(user_id, today)
+
+    return (
+        select(Client.id, Client.email, Client.first_name,
+               mine.id.is_not(None).label("already"),
+               theirs.id.is_not(None).label("mutual"),
+               used.label("used_likes"))
+        .outerjoin(mine, and_(mine.user_id == user_id, mine.target_user_id == Client.id))
+        .outerjoin(theirs, and_(theirs.user_id == Client.id, theirs.target_user_id == user_id))
+        .where(Client.id == any_(bindparam("target_ids", target_ids, type_=ARRAY(Integer))))
     )
-    match = match.scalars().first()
 
-    if not match:
-        match = Match(user_id=current_user.id, target_user_id=target_client.id)
-        session.add(match)
+
+async def create_matches_db(
+        target_ids: list[int],
+        current_user: CurrentUserSchema | None,
+        session: AsyncSession) -> BatchMatchResultSchema:
+    """
+        Лайки пачкой: проверка целей, лимит DAILY_LIKE_LIMIT на всю пачку (в порядке target_ids),
+        один INSERT на все новые лайки и письма о взаимных симпатиях одной группой в outbox.
+    """
+    if not current_user:
+        raise HTTPException(status_code=401, detail="You are not authorized!")
+
+    target_ids = list(dict.fromkeys(target_ids))
+    today = datetime.utcnow().date()
+
+    # Та же блокировка, что и в create_match_db: одиночные и пачечные лайки делят один лимит.
+    await session.execute(select(func.pg_advisory_xact_lock(current_user.id)))
+    result = await session.execute(build_batch_targets_statement(current_user.id, target_ids, today))
+    targets = {target.id: target for target in result}
+
+    remaining = DAILY_LIKE_LIMIT - next(iter(targets.values())).used_likes if targets else 0
+    statuses, to_insert = {}, []
+    for target_id in target_ids:
+        target = targets.get(target_id)
+        if target_id == current_user.id:
+            statuses[target_id] = "self"
+        elif target is None:
+            statuses[target_id] = "not_found"
+        elif target.already:
+            statuses[target_id] = "already_matched"
+        elif remaining <= 0:
+            statuses[target_id] = "limit_reached"
+        else:
+            to_insert.append(target_id)
+            remaining -= 1
+
+    # Повторные лайки отсеяны по already, но решает первичный ключ match_pair: в match идут только
+    # вставленные пары.
+    if to_insert:
+        result = await session.execute(
+            pg_insert(match_pair)
+            .values([{"user_id": current_user.id, "target_user_id": target_id} for target_id in to_insert])
+            .on_conflict_do_nothing()
+            .returning(match_pair.c.target_user_id))
+        paired = set(result.scalars())
+        for target_id in to_insert:
+            if target_id not in paired:
+                statuses[target_id] = "already_matched"
+        to_insert = [target_id for target_id in to_insert if target_id in paired]
+
+    if to_insert:
+        await session.execute(
+            pg_insert(Match)
+            .values([{"user_id": current_user.id, "target_user_id": target_id} for target_id in to_insert]))
+        await session.execute(count_likes_statement(current_user.id, today, len(to_insert)))
+
+    mutuals = []
+    for target_id in to_insert:
+        if targets[target_id].mutual:
+            statuses[target_id] = "mutual"
+            mutuals.append(targets[target_id])
+        else:
+            statuses[target_id] = "matched"
+
+    if mutuals:
+        session.add_all([Outbox(recipient=recipient, subject=subject, body=body)
+                         for recipient, subject, body in build_batch_mutual_match_emails(current_user, mutuals)])
+
+    if to_insert:
+        await session.commit()
     else:
-        raise HTTPException(status_code=400, detail="You have already matched this client.")
+        await session.rollback()
 
-    await session.commit()
+    if mutuals:
+        outbox_worker.wake()
 
-    mutual_match = await check_mutual_match(session, target_client, current_user)
+    return BatchMatchResultSchema(results=[
+        MatchResultSchema(target_id=target_id, status=statuses[target_id],
+                          target_email=targets[target_id].email if statuses[target_id] == "mutual" else None)
+        for target_id in target_ids
+    ])
 
-    if mutual_match:
-        try:
-            result = await send_mutual_match_email(current_user, target_client)
-        except Exception:
-            return {'message': 'Сообщение должно было быть отправлено, но произошла ошибка!'}
-        return result
 
-    return {'message': 'Match sent!'}
+def build_feed_query(feed: str, user_id: int):
+    """
+        likes - кого лайкнул пользователь, liked_by - кто лайкнул его (по индексам
+        ix_match_user_id_time_created и ix_match_target_user_id_time_created), mutuals - самосоединение
+        match со встречным лайком (по ix_match_user_id_target_user_id). Сортировка - по времени лайка (match.time_created, match.id);
+        для mutuals это время лайка самого пользователя.
+    """
+    columns = (*CLIENT_LIST_COLUMNS, Match.time_created.label("matched_at"))
+
+    if feed == "liked_by":
+        return select(*columns).select_from(Match).join(Client, Client.id == Match.user_id).where(
+            Match.target_user_id == user_id)
+
+    query = select(*columns).select_from(Match).join(Client, Client.id == Match.target_user_id).where(
+        Match.user_id == user_id)
+    if feed == "mutuals":
+        theirs = aliased(Match)
+        query = query.join(theirs, and_(theirs.user_id == Match.target_user_id, theirs.target_user_id == user_id))
+
+    return query
+
+
+async def get_feed_db(
+        session: AsyncSession,
+        feed: str,
+        current_user: CurrentUserSchema | None,
+        limit: int = LIST_PAGE_DEFAULT_LIMIT,
+        cursor: str | None = None) -> FeedPageSchema:
+    if not current_user:
+        raise HTTPException(status_code=401, detail="You are not authorized!")
+
+    query = build_feed_query(feed, current_user.id)
+
+    # Keyset-пагинация от новых лайков к старым, курсор - (match.time_created, match.id).
+    if cursor:
+        query = query.where(tuple_(Match.time_created, Match.id) < tuple_(*decode_cursor(cursor)))
+    query = query.add_columns(Match.id.label("match_id")).order_by(desc(Match.time_created), desc(Match.id))
+
+    result = await session.execute(query.limit(limit + 1))
+    rows = result.all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].matched_at, rows[-1].match_id)
+
+    return FeedPageSchema.model_construct(items=feed_item_adapter.validate_python(rows, from_attributes=True),
+                                          next_cursor=next_cursor)
 
 
 async def get_client_by_email(session: AsyncSession, email: str):
@@ -159,12 +493,47 @@ async def get_client_by_email(session: AsyncSession, email: str):
     return CreateClientSchema.from_orm(client)
 
 
-async def get_current_user(request: Request, session: AsyncSession) -> CreateClientSchema | None:
+async def load_current_user(session: AsyncSession, email: str) -> CurrentUserSchema:
+    result = await session.execute(
+        select(Client.id, Client.email, Client.first_name, Client.longitude, Client.latitude).where(
+            Client.email == email)
+    )
+    client = result.first()
+
+    if not client:
+        raise HTTPException(status_code=401, detail="User Not Found! Delete cookies!")
+
+    return CurrentUserSchema.model_validate(client)
+
+
+async def get_current_user(request: Request, session: AsyncSession) -> CurrentUserSchema | None:
+    """
+        Токен проверяется через кэш decode_jwt_cached, а пользователь берётся из users_cache,
+        поэтому повторный запрос с тем же токеном не делает ни RSA-проверки, ни запроса в БД.
+    """
     auth_token = request.cookies.get("auth_token")
 
     if not auth_token:
         return None
 
-    current_user = await get_client_by_email(session, email=decode_jwt(auth_token)['email'])
+    # Токен профилирования подписан тем же ключом, но email в нём нет - это не сессия пользователя.
+    email = decode_jwt_cached(auth_token).get('email')
+    if email is None:
+        raise HTTPException(status_code=401, detail="You are not authorized!")
+
+    current_user = await users_cache.get_or_load(email, lambda: load_current_user(session, email))
 
     return current_user
+
+
+def invalidate_current_user(email: str):
+    """Вызывается при создании пользователя и при изменении его профиля."""
+    users_cache.invalidate(lambda key: key == email)
+
+
+register_invalidation_handler(
+    "users", lambda event: invalidate_current_user(event["email"]) if event.get("email") else users_cache.invalidate())
+
+
+def get_auth_cache_stats() -> dict:
+    return {"tokens": {**token_cache_stats, "size": len(token_cache)}, "users": users_cache.stats()}
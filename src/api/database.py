@@ -1,11 +1,18 @@
+import itertools
+
+from fastapi import Request, Response, Depends
 from sqlalchemy.sql import func
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import DeclarativeBase
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncEngine
 from sqlalchemy import Column, Integer, DateTime
 from sqlalchemy.ext.declarative import declared_attr
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 
-from src.api.settings import DATABASE_URL, DATABASE_ECHO
+from src.api.settings import DATABASE_URL, DATABASE_ECHO, DATABASE_REPLICA_URLS, DATABASE_POOL_SIZE, \
+    DATABASE_MAX_OVERFLOW, DATABASE_REPLICA_POOL_SIZE, DATABASE_REPLICA_MAX_OVERFLOW, DATABASE_POOL_PRE_PING, \
+    DATABASE_POOL_RECYCLE_SECONDS, DATABASE_STATEMENT_CACHE_SIZE, READ_YOUR_WRITES_SECONDS, READ_PRIMARY_COOKIE
+from src.api.metrics import InstrumentedQueuePool, instrument_engine
 
 
 class BaseModel(DeclarativeBase):
@@ -21,10 +28,55 @@ class BaseModel(DeclarativeBase):
     time_updated = Column(DateTime(timezone=True), onupdate=func.now())
 
 
-async_engine = create_async_engine(DATABASE_URL, echo=DATABASE_ECHO)
+def create_engine(url: str, pool_size: int, max_overflow: int, pool_name: str) -> AsyncEngine:
+    connect_args = {}
+    if make_url(url).get_driver_name() == "asyncpg":
+        # Кэш SQLAlchemy-адаптера и собственный кэш asyncpg: при 0 выражения не переиспользуются между запросами.
+        connect_args = {"prepared_statement_cache_size": DATABASE_STATEMENT_CACHE_SIZE,
+                        "statement_cache_size": DATABASE_STATEMENT_CACHE_SIZE}
+
+    engine = create_async_engine(url, echo=DATABASE_ECHO, poolclass=InstrumentedQueuePool,
+                                 pool_size=pool_size, max_overflow=max_overflow,
+                                 pool_pre_ping=DATABASE_POOL_PRE_PING, pool_recycle=DATABASE_POOL_RECYCLE_SECONDS,
+                                 connect_args=connect_args)
+    instrument_engine(engine.sync_engine, pool_name)
+    return engine
+
+
+async_engine = create_engine(DATABASE_URL, DATABASE_POOL_SIZE, DATABASE_MAX_OVERFLOW, "db_pool")
 async_session = async_sessionmaker(async_engine, expire_on_commit=False)
 
+replica_engines = [create_engine(url, DATABASE_REPLICA_POOL_SIZE, DATABASE_REPLICA_MAX_OVERFLOW, f"db_replica{i}_pool")
+                   for i, url in enumerate(DATABASE_REPLICA_URLS)]
+replica_sessions = [async_sessionmaker(engine, expire_on_commit=False) for engine in replica_engines]
+_next_replica = itertools.cycle(replica_sessions)
+
+
+def get_read_sessionmaker(request: Request) -> async_sessionmaker:
+    """Реплики по кругу; основная база - если реплик нет или клиент недавно что-то записал."""
+    if not replica_sessions or request.cookies.get(READ_PRIMARY_COOKIE):
+        return async_session
+    return next(_next_replica)
+
+
+async def dispose_engines():
+    for engine in (async_engine, *replica_engines):
+        await engine.dispose()
+
 
 async def get_session() -> AsyncSession:
     async with async_session() as session:
         yield session
+
+
+async def get_read_session(request: Request) -> AsyncSession:
+    """Сессия для эндпоинтов, которые только читают."""
+    async with get_read_sessionmaker(request)() as session:
+        yield session
+
+
+async def get_write_session(response: Response, session: AsyncSession = Depends(get_session)) -> AsyncSession:
+    """Сессия основной базы для эндпоинтов с записью. Следующие чтения клиента тоже пойдут в основную базу."""
+    if replica_sessions:
+        response.set_cookie(READ_PRIMARY_COOKIE, "1", max_age=READ_YOUR_WRITES_SECONDS, httponly=True)
+    return session
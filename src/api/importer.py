@@ -0,0 +1,230 @@
+"""
+    Массовый импорт клиентов из манифеста (CSV с заголовком или JSONL) и zip-архива с фото.
+    Используется эндпоинтом POST /clients/import и из командной строки:
+        python -m src.api.importer clients.csv photos.zip --report report.json
+
+    Колонки манифеста - поля ImportClientSchema (photo - имя файла в архиве).
+"""
+import io
+import os
+import csv
+import json
+import asyncio
+import zipfile
+import argparse
+import itertools
+
+from typing import IO, Iterable, Iterator
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from src.api.models import Client
+from src.api.database import async_session
+from src.api.photos import PhotoPipeline, photo_pipeline, render_photo_files, spool_photo
+from src.api.schemas import ImportClientSchema, ImportFailureSchema, ImportReportSchema
+from src.api.crud import invalidate_clients_cache, users_cache
+from src.api.invalidation import publish_invalidation
+from src.api.utils import hash_password, store_photo_files
+from src.api.settings import IMPORT_BATCH_SIZE, IMPORT_MAX_PHOTO_BYTES, PHOTO_WORKERS, PHOTO_SPOOL_DIR
+
+MANIFEST_FORMATS = ("csv", "jsonl")
+
+
+def get_manifest_format(filename: str | None) -> str:
+    extension = (filename or "").rsplit(".", 1)[-1].lower()
+    if extension not in MANIFEST_FORMATS:
+        raise ValueError(f"Manifest must be one of: {', '.join(MANIFEST_FORMATS)}.")
+    return extension
+
+
+def read_manifest(stream: IO[str], format: str) -> Iterator[tuple[int, dict | None]]:
+    """Лениво отдаёт (номер строки, поля). Для нечитаемой строки JSONL вместо полей - None."""
+    if format == "csv":
+        # Номер 1 - заголовок, данные начинаются со второй строки, как в редакторе таблиц.
+        yield from enumerate(csv.DictReader(stream), start=2)
+        return
+
+    for number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError:
+            row = None
+        yield number, row if isinstance(row, dict) else None
+
+
+def format_validation_error(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in error.errors())
+
+
+class ClientImporter:
+    """
+        Импорт пачками по batch_size строк: проверка строк, отсев уже существующих email одним
+        запросом, обработка фото в пуле процессов (не больше concurrency одновременно) и
+        многострочный INSERT ... ON CONFLICT DO NOTHING. Ошибка в строке попадает в отчёт
+        и не прерывает пачку.
+    """
+
+    def __init__(self,
+                 session_factory: async_sessionmaker = async_session,
+                 pipeline: PhotoPipeline = photo_pipeline,
+                 batch_size: int = IMPORT_BATCH_SIZE,
+                 concurrency: int = PHOTO_WORKERS * 2,
+                 max_photo_bytes: int = IMPORT_MAX_PHOTO_BYTES,
+                 watermark_text: str = "TEXT"):
+        self.session_factory = session_factory
+        self.pipeline = pipeline
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_photo_bytes = max_photo_bytes
+        self.watermark_text = watermark_text
+
+    async def run(self, rows: Iterable[tuple[int, dict | None]], archive: zipfile.ZipFile) -> ImportReportSchema:
+        report = ImportReportSchema()
+        seen: set[str] = set()
+        imported: set[str] = set()
+
+        rows = iter(rows)
+        while batch := list(itertools.islice(rows, self.batch_size)):
+            imported |= await self.import_batch(batch, archive, seen, report)
+
+        report.failures.sort(key=lambda failure: failure.row)
+        if imported:
+            invalidate_clients_cache()
+            users_cache.invalidate(lambda key: key in imported)
+
+        return report
+
+    async def import_batch(self, batch: list[tuple[int, dict | None]], archive: zipfile.ZipFile,
+                           seen: set[str], report: ImportReportSchema) -> set[str]:
+        report.total += len(batch)
+
+        def fail(number: int, email: str | None, error: str):
+            report.failed += 1
+            report.failures.append(ImportFailureSchema(row=number, email=email, error=error))
+
+        clients = []
+        for number, row in batch:
+            if row is None:
+                fail(number, None, "Invalid JSON object.")
+                continue
+            try:
+                client = ImportClientSchema.model_validate(row)
+            except ValidationError as e:
+                fail(number, row.get("email"), format_validation_error(e))
+                continue
+            if client.email in seen:
+                fail(number, client.email, "Duplicate email in manifest.")
+                continue
+            seen.add(client.email)
+            clients.append((number, client))
+
+        if not clients:
+            return set()
+
+        # Уже зарегистрированные email отсеиваем до обработки фото, чтобы не тратить на них CPU.
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(Client.email).where(Client.email.in_([client.email for _, client in clients])))
+            existing = set(result.scalars())
+
+        pending = []
+        for number, client in clients:
+            if client.email in existing:
+                fail(number, client.email, "Client with this email already exists.")
+            else:
+                pending.append((number, client))
+
+        slots = asyncio.Semaphore(self.concurrency)
+        photos = await asyncio.gather(*[self.process_photo(archive, client.photo, slots) for _, client in pending],
+                                      return_exceptions=True)
+
+        values = {}
+        numbers = {}
+        for (number, client), photo in zip(pending, photos):
+            if isinstance(photo, BaseException):
+                fail(number, client.email, f"Photo {client.photo!r}: {photo}")
+                continue
+            values[client.email] = {
+                **client.model_dump(exclude={"photo"}),
+                "password": hash_password(client.password),
+                "photo": photo,
+            }
+            numbers[client.email] = number
+
+        if not values:
+            return set()
+
+        async with self.session_factory() as session:
+            # Email мог появиться после проверки выше (параллельная регистрация) - такие строки пропускаются.
+            result = await session.execute(
+                pg_insert(Client).values(list(values.values()))
+                .on_conflict_do_nothing(index_elements=[Client.email])
+                .returning(Client.email))
+            inserted = set(result.scalars())
+            if inserted:
+                # Email-ов в пачке слишком много для одного NOTIFY (до 8000 байт) - кэш пользователей сбрасывается целиком.
+                await publish_invalidation(session, {"cache": "clients"}, {"cache": "users"})
+            await session.commit()
+
+        for email in values.keys() - inserted:
+            fail(numbers[email], email, "Client with this email already exists.")
+        report.imported += len(inserted)
+
+        return inserted
+
+    async def process_photo(self, archive: zipfile.ZipFile, name: str, slots: asyncio.Semaphore) -> str:
+        async with slots:
+            try:
+                info = archive.getinfo(name)
+            except KeyError:
+                raise ValueError("not found in archive")
+            if info.file_size > self.max_photo_bytes:
+                raise ValueError(f"larger than {self.max_photo_bytes} bytes")
+
+            # Как и при регистрации: фото распаковывается кусками во временный файл, а воркер пишет варианты на диск.
+            with archive.open(info) as photo:
+                path = await asyncio.to_thread(spool_photo, photo, PHOTO_SPOOL_DIR)
+            try:
+                digest, files = await asyncio.get_running_loop().run_in_executor(
+                    self.pipeline.executor, render_photo_files, path, self.watermark_text, PHOTO_SPOOL_DIR)
+            finally:
+                os.remove(path)
+            return await store_photo_files(digest, files)
+
+
+async def import_clients(manifest: IO[bytes], format: str, photos: IO[bytes], **kwargs) -> ImportReportSchema:
+    try:
+        archive = zipfile.ZipFile(photos)
+    except zipfile.BadZipFile:
+        raise ValueError("Photos must be a zip archive.")
+
+    with archive:
+        rows = read_manifest(io.TextIOWrapper(manifest, encoding="utf-8-sig", newline=""), format)
+        return await ClientImporter(**kwargs).run(rows, archive)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("manifest", help="CSV или JSONL")
+    parser.add_argument("photos", help="zip-архив с фото")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    parser.add_argument("--report", help="Куда записать отчёт в JSON (по умолчанию - только итог в stdout)")
+    args = parser.parse_args()
+
+    async def main():
+        with open(args.manifest, "rb") as manifest, open(args.photos, "rb") as photos:
+            try:
+                return await import_clients(manifest, get_manifest_format(args.manifest), photos,
+                                            batch_size=args.batch_size)
+            finally:
+                photo_pipeline.shutdown()
+
+    report = asyncio.run(main())
+    print(f"total={report.total} imported={report.imported} failed={report.failed}")
+    if args.report:
+        with open(args.report, "w") as output:
+            output.write(report.model_dump_json(indent=2))
@@ -0,0 +1,122 @@
+import json
+import asyncio
+import logging
+import asyncpg
+
+from typing import Callable
+from sqlalchemy import select, func
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.api.settings import DATABASE_URL, CACHE_INVALIDATION_CHANNEL, CACHE_INVALIDATION_RECONNECT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Обработчики по имени кэша: {"cache": "clients"} -> handlers["clients"](event).
+handlers: dict[str, Callable[[dict], None]] = {}
+
+
+def register_invalidation_handler(cache: str, handler: Callable[[dict], None]):
+    handlers[cache] = handler
+
+
+def handle_event(event: dict):
+    handler = handlers.get(event.get("cache"))
+    if handler is None:
+        logger.warning("Unknown cache invalidation event: %s", event)
+        return
+    handler(event)
+
+
+def invalidate_all():
+    for handler in handlers.values():
+        handler({})
+
+
+async def publish_invalidation(session: AsyncSession, *events: dict):
+    """
+        NOTIFY в транзакции сессии: Postgres доставит события всем воркерам только после COMMIT
+        (и не доставит при откате), поэтому вызывать нужно до session.commit().
+    """
+    if session.bind.dialect.name != "postgresql":
+        return
+    await session.execute(select(*[func.pg_notify(CACHE_INVALIDATION_CHANNEL, json.dumps(event))
+                                   for event in events]))
+
+
+class CacheInvalidationListener:
+    """
+        Держит отдельное asyncpg-соединение с LISTEN и сбрасывает локальные кэши процесса
+        по событиям других воркеров. Пока соединения нет, события могли потеряться -
+        после переподключения кэши сбрасываются целиком.
+    """
+
+    def __init__(self, database_url: str | None = DATABASE_URL, channel: str = CACHE_INVALIDATION_CHANNEL,
+                 reconnect_interval: float = CACHE_INVALIDATION_RECONNECT_SECONDS):
+        self.database_url = database_url
+        self.channel = channel
+        self.reconnect_interval = reconnect_interval
+
+        self._task: asyncio.Task | None = None
+        self._listening = asyncio.Event()
+
+        self.received = 0
+        self.reconnects = 0
+
+    async def start(self):
+        """Возвращается, когда LISTEN уже выполнен (или первая попытка подключения не удалась)."""
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+            try:
+                await asyncio.wait_for(self._listening.wait(), timeout=self.reconnect_interval)
+            except asyncio.TimeoutError:
+                logger.warning("Cache invalidation listener is not connected yet")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def on_notification(self, connection, pid, channel, payload):
+        self.received += 1
+        try:
+            handle_event(json.loads(payload))
+        except Exception:
+            logger.exception("Bad cache invalidation event: %r", payload)
+
+    async def run(self):
+        # asyncpg не понимает "postgresql+asyncpg://".
+        dsn = make_url(self.database_url).set(drivername="postgresql").render_as_string(hide_password=False)
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(dsn)
+                closed = asyncio.Event()
+                connection.add_termination_listener(lambda _: closed.set())
+                await connection.add_listener(self.channel, self.on_notification)
+
+                if self.reconnects:
+                    invalidate_all()
+                self._listening.set()
+                await closed.wait()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Cache invalidation listener failed")
+            finally:
+                self._listening.clear()
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+
+            self.reconnects += 1
+            await asyncio.sleep(self.reconnect_interval)
+
+    def stats(self) -> dict:
+        return {"listening": int(self._listening.is_set()), "received": self.received, "reconnects": self.reconnects}
+
+
+invalidation_listener = CacheInvalidationListener()
@@ -0,0 +1,199 @@
+import time
+import random
+import asyncio
+import logging
+import aiosmtplib
+
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from src.api.models import Outbox
+from src.api.utils import send_email
+from src.api.database import async_session
+from src.api.settings import SENDER_EMAIL, SENDER_PASSWORD, SMTP_SERVER, SMTP_PORT, EMAIL_BATCH_SIZE, \
+    EMAIL_POLL_INTERVAL_SECONDS, EMAIL_MAX_ATTEMPTS, EMAIL_RETRY_BASE_SECONDS, EMAIL_RETRY_MAX_SECONDS, \
+    SMTP_IDLE_TIMEOUT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+def get_retry_delay(attempts: int, base: float = EMAIL_RETRY_BASE_SECONDS,
+                    maximum: float = EMAIL_RETRY_MAX_SECONDS) -> timedelta:
+    """Экспоненциальная задержка с джиттером: base, 2*base, 4*base... но не больше maximum."""
+    delay = min(maximum, base * 2 ** (attempts - 1))
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+class EmailOutboxWorker:
+    """
+        Фоновая отправка писем из таблицы outbox: пачками по batch_size через одно
+        переиспользуемое SMTP-соединение, с повторами и экспоненциальной задержкой.
+        Несколько воркеров (процессов) могут работать одновременно - строки
+        разбираются через SELECT ... FOR UPDATE SKIP LOCKED.
+    """
+
+    def __init__(self,
+                 session_factory: async_sessionmaker = async_session,
+                 hostname: str | None = SMTP_SERVER,
+                 port: int | None = int(SMTP_PORT) if SMTP_PORT else None,
+                 username: str | None = SENDER_EMAIL,
+                 password: str | None = SENDER_PASSWORD,
+                 sender: str | None = SENDER_EMAIL,
+                 start_tls: bool = True,
+                 batch_size: int = EMAIL_BATCH_SIZE,
+                 poll_interval: float = EMAIL_POLL_INTERVAL_SECONDS,
+                 max_attempts: int = EMAIL_MAX_ATTEMPTS,
+                 idle_timeout: float = SMTP_IDLE_TIMEOUT_SECONDS):
+        self.session_factory = session_factory
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.sender = sender
+        self.start_tls = start_tls
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.idle_timeout = idle_timeout
+
+        self._smtp: aiosmtplib.SMTP | None = None
+        self._last_used = 0.0
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+        self.queue_depth = 0
+        self.sent = 0
+        self.failed = 0
+        self.connections = 0
+        self.send_latencies: deque[float] = deque(maxlen=1000)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.close_connection()
+
+    def wake(self):
+        """Сигнал о новых письмах в очереди, чтобы не ждать следующего опроса."""
+        self._wakeup.set()
+
+    async def run(self):
+        while True:
+            try:
+                processed = await self.process_batch()
+            except Exception:
+                logger.exception("Email outbox batch failed")
+                processed = 0
+
+            if processed < self.batch_size:
+                if self._smtp is not None and time.monotonic() - self._last_used > self.idle_timeout:
+                    await self.close_connection()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+    async def process_batch(self) -> int:
+        async with self.session_factory() as session:
+            now = datetime.now(timezone.utc)
+            result = await session.execute(
+                select(Outbox)
+                .where(Outbox.sent_at.is_(None), Outbox.next_attempt_at <= now)
+                .order_by(Outbox.next_attempt_at)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            emails = result.scalars().all()
+
+            if emails:
+                errors = await self.send_batch(emails)
+                now = datetime.now(timezone.utc)
+                for email in emails:
+                    error = errors.get(email.id)
+                    if error is None:
+                        email.sent_at = now
+                        continue
+                    email.attempts += 1
+                    email.last_error = str(error)[:512]
+                    if email.attempts >= self.max_attempts:
+                        # Письмо больше не отправляем, но оставляем в таблице для разбора.
+                        email.sent_at = now
+                        logger.error("Giving up on email %s to %s: %s", email.id, email.recipient, error)
+                    else:
+                        email.next_attempt_at = now + get_retry_delay(email.attempts)
+
+            self.queue_depth = await session.scalar(
+                select(func.count()).select_from(Outbox).where(Outbox.sent_at.is_(None)))
+            await session.commit()
+
+        return len(emails)
+
+    async def send_batch(self, emails: list) -> dict:
+        """Отправляет письма по одному соединению. Возвращает {id письма: ошибка} для неудачных."""
+        errors = {}
+        for email in emails:
+            started = time.perf_counter()
+            try:
+                smtp = await self.get_connection()
+            except (aiosmtplib.SMTPException, OSError) as e:
+                # Сервер недоступен - остаток пачки уйдёт на повтор, не пытаясь подключаться к нему заново.
+                for failed in emails[emails.index(email):]:
+                    errors[failed.id] = e
+                    self.failed += 1
+                break
+
+            try:
+                await send_email(smtp, email.recipient, email.subject, email.body, self.sender)
+            except (aiosmtplib.SMTPException, OSError) as e:
+                errors[email.id] = e
+                self.failed += 1
+                # Соединение могло оказаться в неопределённом состоянии - следующее письмо откроет новое.
+                await self.close_connection()
+            else:
+                self.sent += 1
+                self.send_latencies.append(time.perf_counter() - started)
+        self._last_used = time.monotonic()
+
+        return errors
+
+    async def get_connection(self) -> aiosmtplib.SMTP:
+        if self._smtp is None or not self._smtp.is_connected:
+            smtp = aiosmtplib.SMTP(hostname=self.hostname, port=self.port, start_tls=self.start_tls,
+                                   username=self.username, password=self.password)
+            await smtp.connect()
+            self._smtp = smtp
+            self.connections += 1
+        return self._smtp
+
+    async def close_connection(self):
+        smtp, self._smtp = self._smtp, None
+        if smtp is not None and smtp.is_connected:
+            try:
+                await smtp.quit()
+            except aiosmtplib.SMTPException:
+                smtp.close()
+
+    def stats(self) -> dict:
+        latencies = sorted(self.send_latencies)
+        return {
+            "queue_depth": self.queue_depth,
+            "sent": self.sent,
+            "failed": self.failed,
+            "connections": self.connections,
+            "send_latency_avg_seconds": sum(latencies) / len(latencies) if latencies else 0.0,
+            "send_latency_p95_seconds": latencies[int(len(latencies) * 0.95)] if latencies else 0.0,
+        }
+
+
+outbox_worker = EmailOutboxWorker()
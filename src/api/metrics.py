@@ -0,0 +1,251 @@
+import os
+import re
+import time
+import logging
+import inspect
+import functools
+
+from contextvars import ContextVar
+from typing import Callable
+from prometheus_client import Histogram, Counter, CollectorRegistry, REGISTRY, generate_latest, multiprocess
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from src.api.settings import METRICS_QUERY_WARN_THRESHOLD, METRICS_REPEATED_QUERY_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "Request latency by route.",
+                            ["method", "route", "status"])
+DB_QUERY_DURATION = Histogram("db_query_duration_seconds", "Duration of a single SQL statement.")
+DB_QUERIES_PER_REQUEST = Histogram("db_queries_per_request", "SQL statements executed per request.",
+                                   buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, float("inf")))
+DB_QUERY_TIME_PER_REQUEST = Histogram("db_query_time_per_request_seconds", "Total SQL time per request.")
+DB_POOL_CHECKOUT_WAIT = Histogram("db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection.",
+                                  buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+TOO_MANY_QUERIES = Counter("db_too_many_queries_requests_total",
+                           "Requests that executed more than METRICS_QUERY_WARN_THRESHOLD statements.", ["route"])
+REPEATED_QUERIES = Counter("db_repeated_queries_requests_total",
+                           "Requests that repeated one SQL statement METRICS_REPEATED_QUERY_THRESHOLD times or more.",
+                           ["route"])
+REQUESTS_REJECTED = Counter("http_requests_rejected_total",
+                            "Requests rejected before processing (rate limit, concurrency cap or body size).", ["route", "reason"])
+FUNCTION_DURATION = Histogram("function_duration_seconds", "Duration of instrumented hot-path functions.", ["name"])
+EVENT_LOOP_LAG = Histogram("event_loop_lag_seconds", "Delay of event loop heartbeats past their schedule.",
+                           buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
+EVENT_LOOP_BLOCKED = Counter("event_loop_blocked_total", "Event loop stalls longer than LOOP_BLOCK_THRESHOLD_SECONDS.")
+
+
+class RequestQueries:
+    __slots__ = ("count", "duration", "statements")
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        # Текст SQL -> [число выполнений, суммарное время]. Тексты из кэша компиляции SQLAlchemy
+        # повторяются одними и теми же строками, поэтому словарь маленький.
+        self.statements: dict[str, list] = {}
+
+    def add(self, statement: str, duration: float):
+        self.count += 1
+        self.duration += duration
+        stats = self.statements.get(statement)
+        if stats is None:
+            self.statements[statement] = [1, duration]
+        else:
+            stats[0] += 1
+            stats[1] += duration
+
+    def grouped(self) -> list[tuple[str, int, float]]:
+        """(нормализованный SQL, выполнений, суммарное время) от самых частых к редким."""
+        groups: dict[str, list] = {}
+        for statement, (count, duration) in self.statements.items():
+            group = groups.setdefault(normalize_statement(statement), [0, 0.0])
+            group[0] += count
+            group[1] += duration
+        return sorted(((statement, count, duration) for statement, (count, duration) in groups.items()),
+                      key=lambda group: group[1], reverse=True)
+
+    def repeated(self, threshold: int) -> list[tuple[str, int, float]]:
+        return [group for group in self.grouped() if group[1] >= threshold]
+
+
+SQL_NUMBER = re.compile(r"\b\d+(\.\d+)?\b")
+SQL_STRING = re.compile(r"'(?:[^']|'')*'")
+# Развёрнутые списки IN (...) и VALUES разной длины: ($1, $2, $3) и (%s, %s) -> (?).
+SQL_PARAMETER_LIST = re.compile(r"\((?:\s*(?:\$\d+|%s|\?|%\(\w+\)s)(?:::\w+(?:\[\])?)?\s*,?)+\)")
+SQL_ROWS = re.compile(r"\(\?\)(?:\s*,\s*\(\?\))+")
+SQL_SPACE = re.compile(r"\s+")
+
+
+@functools.lru_cache(maxsize=1024)
+def normalize_statement(statement: str) -> str:
+    """SQL без литералов и с одним маркером вместо списков параметров - одинаковые запросы с разными данными."""
+    statement = SQL_STRING.sub("?", statement)
+    statement = SQL_PARAMETER_LIST.sub("(?)", statement)
+    statement = SQL_ROWS.sub("(?)", statement)
+    statement = SQL_NUMBER.sub("?", statement)
+    return SQL_SPACE.sub(" ", statement).strip()
+
+
+# Счётчик запросов к БД текущего HTTP-запроса. Объект изменяемый, поэтому его видят
+# и гринлеты SQLAlchemy (они наследуют контекст вызывающей корутины).
+request_queries: ContextVar[RequestQueries | None] = ContextVar("request_queries", default=None)
+
+
+def timed(name: str) -> Callable:
+    """Декоратор: пишет длительность вызова (синхронного или асинхронного) в FUNCTION_DURATION."""
+    histogram = FUNCTION_DURATION.labels(name)
+
+    def decorator(function):
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await function(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - started)
+        else:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - started)
+        return wrapper
+
+    return decorator
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Пул соединений, замеряющий ожидание свободного соединения (pool_timeout) при checkout."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started)
+
+
+def instrument_engine(engine: Engine, pool_name: str = "db_pool"):
+    """Подписывается на события движка: длительность и число SQL-запросов, заполненность пула (метрики {pool_name}_*)."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info["query_started"].pop()
+        DB_QUERY_DURATION.observe(duration)
+
+        queries = request_queries.get()
+        if queries is not None:
+            queries.add(statement, duration)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+    # У NullPool/StaticPool (SQLite в тестах) счётчиков нет.
+    if isinstance(engine.pool, QueuePool):
+        register_stats(pool_name, lambda: {
+            "connections_in_use": engine.pool.checkedout(),
+            "connections": engine.pool.checkedin() + engine.pool.checkedout(),
+        })
+
+
+class MetricsMiddleware:
+    """
+        ASGI-мидлварь: гистограмма задержек по шаблону маршрута (а не по пути, чтобы
+        /clients/1/match/ и /clients/2/match/ были одной серией) и число SQL-запросов на запрос.
+    """
+
+    def __init__(self, app, query_warn_threshold: int = METRICS_QUERY_WARN_THRESHOLD,
+                 repeated_query_threshold: int = METRICS_REPEATED_QUERY_THRESHOLD):
+        self.app = app
+        self.query_warn_threshold = query_warn_threshold
+        self.repeated_query_threshold = repeated_query_threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        queries = RequestQueries()
+        token = request_queries.set(queries)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - started
+            request_queries.reset(token)
+
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_LATENCY.labels(scope["method"], route, status).observe(duration)
+            DB_QUERIES_PER_REQUEST.observe(queries.count)
+            DB_QUERY_TIME_PER_REQUEST.observe(queries.duration)
+
+            if queries.count > self.query_warn_threshold:
+                TOO_MANY_QUERIES.labels(route).inc()
+                logger.warning("%s %s executed %s SQL queries (%.1f ms in the database)",
+                               scope["method"], route, queries.count, queries.duration * 1000)
+
+            if queries.count >= self.repeated_query_threshold:
+                repeated = queries.repeated(self.repeated_query_threshold)
+                if repeated:
+                    REPEATED_QUERIES.labels(route).inc()
+                    statement, count, total = repeated[0]
+                    logger.warning("%s %s repeated one SQL query %s times (%.1f ms), possible N+1: %s",
+                                   scope["method"], route, count, total * 1000, statement[:500])
+
+
+class StatsCollector:
+    """Отдаёт словари stats() кэшей и воркеров как gauge-метрики с префиксом prefix."""
+
+    def __init__(self, prefix: str, stats: Callable[[], dict]):
+        self.prefix = prefix
+        self.stats = stats
+
+    def collect(self):
+        for name, value in self.stats().items():
+            yield GaugeMetricFamily(f"{self.prefix}_{name}", f"{self.prefix} {name}", value=value)
+
+
+# Состояние конкретного процесса (кэши, пул соединений, очереди). При нескольких воркерах
+# (PROMETHEUS_MULTIPROC_DIR) эти значения относятся к воркеру, ответившему на /metrics.
+process_registry = CollectorRegistry(auto_describe=True)
+
+
+def register_stats(prefix: str, stats: Callable[[], dict]):
+    process_registry.register(StatsCollector(prefix, stats))
+
+
+def render_metrics() -> bytes:
+    """Гистограммы и счётчики - суммарно по всем воркерам, если задан PROMETHEUS_MULTIPROC_DIR."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry) + generate_latest(process_registry)
+
+
+def mark_worker_dead():
+    """Вызывается при остановке воркера, чтобы его gauge-файлы не попадали в сумму."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,75 @@
+"""
+    Миграции при старте контейнера:
+        python -m src.api.migrate          # alembic upgrade head, только если база отстаёт
+        python -m src.api.migrate --check  # код 1, если база не на head; схема не меняется
+    Ревизия в alembic_version, которой нет среди миграций, - код 2 и подсказка про alembic stamp.
+
+    Проверка читает alembic_version одним запросом и заголовки файлов миграций, не запуская env.py,
+    поэтому обычный перезапуск без новых миграций занимает доли секунды.
+"""
+import sys
+import asyncio
+import argparse
+
+from alembic import command
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from alembic.runtime.migration import MigrationContext
+from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.api.settings import DATABASE_URL
+
+
+# Ревизия схемы из первой закоммиченной миграции. Базы, созданные до неё autogenerate при старте,
+# записаны в alembic_version под ревизией, которой нет среди файлов.
+INITIAL_REVISION = "3a824b1ff5c9"
+
+
+def get_head_revisions(config: Config) -> set[str]:
+    return set(ScriptDirectory.from_config(config).get_heads())
+
+
+def get_known_revisions(config: Config) -> set[str]:
+    return {script.revision for script in ScriptDirectory.from_config(config).walk_revisions()}
+
+
+async def get_current_revisions(database_url: str) -> set[str]:
+    engine = create_async_engine(database_url, poolclass=NullPool)
+    try:
+        async with engine.connect() as conn:
+            return set(await conn.run_sync(lambda sync_conn: MigrationContext.configure(sync_conn).get_current_heads()))
+    finally:
+        await engine.dispose()
+
+
+def migrate(config: Config, database_url: str, check: bool = False) -> int:
+    heads = get_head_revisions(config)
+    current = asyncio.run(get_current_revisions(database_url))
+    if current == heads:
+        print(f"Database is at head {', '.join(sorted(heads))}")
+        return 0
+
+    unknown = current - get_known_revisions(config)
+    if unknown:
+        print(f"Database is at unknown revision {', '.join(sorted(unknown))}. If it was created by the old "
+              f"autogenerate step, stamp it once with `alembic stamp --purge {INITIAL_REVISION}` and restart.",
+              file=sys.stderr)
+        return 2
+
+    if check:
+        print(f"Database is at {', '.join(sorted(current)) or 'base'}, head is {', '.join(sorted(heads))}",
+              file=sys.stderr)
+        return 1
+
+    command.upgrade(config, "heads")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--check", action="store_true", help="Только проверить, что база на head")
+    parser.add_argument("--config", default="alembic.ini")
+    args = parser.parse_args()
+
+    sys.exit(migrate(Config(args.config), DATABASE_URL, args.check))
@@ -69,8 +69,9 @@ def run_migrations_online() -> None:
     )
 
     with connectable.connect() as connection:
+        # Каждая миграция - в своей транзакции: блокировки одной не держатся, пока идут следующие.
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata, transaction_per_migration=True
         )
 
         with context.begin_transaction():
@@ -0,0 +1,33 @@
+"""Client gender index
+
+Revision ID: 0077ca50c652
+Revises: f3bd153a1360
+Create Date: 2026-10-18 16:12:40.318652
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0077ca50c652'
+down_revision: Union[str, None] = 'f3bd153a1360'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY не блокирует запись в client, но не работает внутри транзакции.
+    # Прерванная сборка оставляет невалидный индекс - его удаляем и строим заново.
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_client_gender_time_created_id', table_name='client',
+                      postgresql_concurrently=True, if_exists=True)
+        op.create_index('ix_client_gender_time_created_id', 'client', ['gender', 'time_created', 'id'],
+                        unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_client_gender_time_created_id', table_name='client', postgresql_concurrently=True)
@@ -0,0 +1,32 @@
+"""Match user_id, time_created index
+
+Revision ID: 02323abdb147
+Revises: 3bfea9ec8cb3
+Create Date: 2026-10-18 12:37:40.918265
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '02323abdb147'
+down_revision: Union[str, None] = '3bfea9ec8cb3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY не блокирует запись в match, но не работает внутри транзакции.
+    # Прерванная сборка оставляет невалидный индекс - его удаляем и строим заново.
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_match_user_id_time_created', table_name='match', postgresql_concurrently=True, if_exists=True)
+        op.create_index('ix_match_user_id_time_created', 'match', ['user_id', 'time_created'], unique=False,
+                        postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_match_user_id_time_created', table_name='match', postgresql_concurrently=True)
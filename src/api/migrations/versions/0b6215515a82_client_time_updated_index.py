@@ -0,0 +1,32 @@
+"""Client time_updated index
+
+Revision ID: 0b6215515a82
+Revises: 2b54bbbbe078
+Create Date: 2026-10-18 15:02:44.518377
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0b6215515a82'
+down_revision: Union[str, None] = '2b54bbbbe078'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY не блокирует запись в client, но не работает внутри транзакции.
+    # Прерванная сборка оставляет невалидный индекс - его удаляем и строим заново.
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_client_time_updated', table_name='client', postgresql_concurrently=True, if_exists=True)
+        op.create_index('ix_client_time_updated', 'client', ['time_updated'], unique=False,
+                        postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_client_time_updated', table_name='client', postgresql_concurrently=True)
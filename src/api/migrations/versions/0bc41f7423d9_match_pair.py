@@ -0,0 +1,40 @@
+"""match_pair: unique (user_id, target_user_id) for partitioned match
+
+Revision ID: 0bc41f7423d9
+Revises: 594d4f920fb8
+Create Date: 2026-10-18 18:20:14.502931
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0bc41f7423d9'
+down_revision: Union[str, None] = '594d4f920fb8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'match_pair',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('target_user_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['target_user_id'], ['client.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['client.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'target_user_id')
+    )
+    # Дубли, которые могли появиться без ограничения: остаётся самый ранний лайк пары.
+    op.execute("""
+        DELETE FROM match USING match AS earlier
+        WHERE match.user_id = earlier.user_id AND match.target_user_id = earlier.target_user_id
+        AND (match.time_created, match.id) > (earlier.time_created, earlier.id)
+    """)
+    op.execute("INSERT INTO match_pair (user_id, target_user_id) SELECT user_id, target_user_id FROM match")
+
+
+def downgrade() -> None:
+    op.drop_table('match_pair')
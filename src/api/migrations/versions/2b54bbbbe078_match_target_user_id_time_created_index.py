@@ -0,0 +1,33 @@
+"""Match target_user_id, time_created index
+
+Revision ID: 2b54bbbbe078
+Revises: c911728e7200
+Create Date: 2026-10-18 13:41:07.215904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2b54bbbbe078'
+down_revision: Union[str, None] = 'c911728e7200'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY не блокирует запись в match, но не работает внутри транзакции.
+    # Прерванная сборка оставляет невалидный индекс - его удаляем и строим заново.
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_match_target_user_id_time_created', table_name='match', postgresql_concurrently=True,
+                      if_exists=True)
+        op.create_index('ix_match_target_user_id_time_created', 'match', ['target_user_id', 'time_created'],
+                        unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_match_target_user_id_time_created', table_name='match', postgresql_concurrently=True)
@@ -0,0 +1,58 @@
+"""Initial
+
+Revision ID: 3a824b1ff5c9
+Revises: 
+Create Date: 2026-10-18 10:02:11.412309
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3a824b1ff5c9'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'client',
+        sa.Column('first_name', sa.String(length=64), nullable=True),
+        sa.Column('last_name', sa.String(length=64), nullable=True),
+        sa.Column('email', sa.String(length=64), nullable=False),
+        sa.Column('gender', sa.String(length=10), nullable=True),
+        sa.Column('photo', sa.String(length=256), nullable=True),
+        sa.Column('password', sa.String(length=256), nullable=False),
+        sa.Column('longitude', sa.Float(), nullable=True),
+        sa.Column('latitude', sa.Float(), nullable=True),
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('time_created', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('time_updated', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email')
+    )
+    op.create_index(op.f('ix_client_id'), 'client', ['id'], unique=False)
+    op.create_table(
+        'match',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('target_user_id', sa.Integer(), nullable=False),
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('time_created', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('time_updated', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['target_user_id'], ['client.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['client.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'target_user_id', name='unique_match')
+    )
+    op.create_index(op.f('ix_match_id'), 'match', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_match_id'), table_name='match')
+    op.drop_table('match')
+    op.drop_index(op.f('ix_client_id'), table_name='client')
+    op.drop_table('client')
@@ -0,0 +1,39 @@
+"""Client name trigram indexes
+
+Revision ID: 3bfea9ec8cb3
+Revises: aef6a882dbda
+Create Date: 2026-10-18 11:48:06.552081
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3bfea9ec8cb3'
+down_revision: Union[str, None] = 'aef6a882dbda'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY не блокирует запись в client, но не работает внутри транзакции.
+    # Прерванная сборка оставляет невалидный индекс - его удаляем и строим заново.
+    with op.get_context().autocommit_block():
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.drop_index('ix_client_first_name_trgm', table_name='client', postgresql_concurrently=True, if_exists=True)
+        op.create_index('ix_client_first_name_trgm', 'client', ['first_name'], unique=False,
+                        postgresql_using='gin', postgresql_ops={'first_name': 'gin_trgm_ops'},
+                        postgresql_concurrently=True)
+        op.drop_index('ix_client_last_name_trgm', table_name='client', postgresql_concurrently=True, if_exists=True)
+        op.create_index('ix_client_last_name_trgm', 'client', ['last_name'], unique=False,
+                        postgresql_using='gin', postgresql_ops={'last_name': 'gin_trgm_ops'},
+                        postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_client_last_name_trgm', table_name='client', postgresql_concurrently=True)
+        op.drop_index('ix_client_first_name_trgm', table_name='client', postgresql_concurrently=True)
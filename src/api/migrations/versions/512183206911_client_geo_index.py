@@ -0,0 +1,32 @@
+"""Client geo index
+
+Revision ID: 512183206911
+Revises: 3a824b1ff5c9
+Create Date: 2026-10-18 10:14:52.803417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '512183206911'
+down_revision: Union[str, None] = '3a824b1ff5c9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY не блокирует запись в client, но не работает внутри транзакции.
+    # Прерванная сборка оставляет невалидный индекс - его удаляем и строим заново.
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_client_latitude_longitude', table_name='client', postgresql_concurrently=True, if_exists=True)
+        op.create_index('ix_client_latitude_longitude', 'client', ['latitude', 'longitude'], unique=False,
+                        postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_client_latitude_longitude', table_name='client', postgresql_concurrently=True)
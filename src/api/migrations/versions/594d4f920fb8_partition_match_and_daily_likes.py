@@ -0,0 +1,168 @@
+"""Partition match by month, daily_likes counter
+
+Revision ID: 594d4f920fb8
+Revises: 0077ca50c652
+Create Date: 2026-10-18 17:05:51.640217
+
+Строки не копируются: старая таблица целиком подключается секцией истории match_YYYY_MM текущего месяца
+(FROM MINVALUE до начала следующего). Долгие шаги - проверка CHECK по time_created и индексы под ключи
+новой таблицы - идут без блокировки записи (VALIDATE, CREATE INDEX CONCURRENTLY), поэтому ATTACH ничего
+не сканирует и держит эксклюзивную блокировку только на время правки каталога.
+"""
+from typing import Sequence, Union
+from datetime import date, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '594d4f920fb8'
+down_revision: Union[str, None] = '0077ca50c652'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+CREATE_MATCH_PARTITIONS_FUNCTION = """
+CREATE OR REPLACE FUNCTION create_match_partitions(first_month date, last_month date) RETURNS integer AS $$
+DECLARE
+    month_start date := date_trunc('month', first_month);
+    partition_name text;
+    created integer := 0;
+BEGIN
+    WHILE month_start <= last_month LOOP
+        partition_name := 'match_' || to_char(month_start, 'YYYY_MM');
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I PARTITION OF match FOR VALUES FROM (%L) TO (%L)', partition_name,
+                           month_start::timestamp AT TIME ZONE 'UTC',
+                           (month_start + interval '1 month') AT TIME ZONE 'UTC');
+            created := created + 1;
+        END IF;
+        month_start := month_start + interval '1 month';
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+def create_match_indexes() -> None:
+    op.create_index('ix_match_user_id_time_created', 'match', ['user_id', 'time_created'], unique=False)
+    op.create_index('ix_match_target_user_id_time_created', 'match', ['target_user_id', 'time_created'],
+                    unique=False)
+
+
+def get_history_partition() -> tuple[str, date]:
+    month = op.get_bind().scalar(sa.text("SELECT date_trunc('month', now() AT TIME ZONE 'UTC')::date"))
+    return f"match_{month:%Y_%m}", (month + timedelta(days=32)).replace(day=1)
+
+
+def upgrade() -> None:
+    history, next_month = get_history_partition()
+    bound = f"{next_month.isoformat()} 00:00:00+00"
+
+    op.create_table(
+        'daily_likes',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['client.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'day')
+    )
+    # Лимит проверяется только за сегодня (UTC) - счётчик заполняется сегодняшними лайками.
+    op.execute("""
+        INSERT INTO daily_likes (user_id, day, count)
+        SELECT user_id, (now() AT TIME ZONE 'UTC')::date, count(*) FROM match
+        WHERE time_created >= date_trunc('day', now() AT TIME ZONE 'UTC') AT TIME ZONE 'UTC'
+        GROUP BY user_id
+    """)
+    # NOT VALID: существующие строки не проверяются, новые - сразу. Совпадает с ограничением секции,
+    # поэтому ATTACH PARTITION не сканирует таблицу, а SET NOT NULL опирается на него же.
+    op.execute(f"""
+        ALTER TABLE match ADD CONSTRAINT "{history}_time_created_check"
+        CHECK (time_created IS NOT NULL AND time_created < '{bound}') NOT VALID
+    """)
+
+    with op.get_context().autocommit_block():
+        op.execute("UPDATE match SET time_created = now() WHERE time_created IS NULL")
+        op.execute(f'ALTER TABLE match VALIDATE CONSTRAINT "{history}_time_created_check"')
+        # Индексы, которыми ATTACH заменит первичный ключ и ix_match_user_id_target_user_id новой таблицы.
+        op.drop_index(f'{history}_id_time_created_idx', table_name='match', postgresql_concurrently=True,
+                      if_exists=True)
+        op.create_index(f'{history}_id_time_created_idx', 'match', ['id', 'time_created'], unique=True,
+                        postgresql_concurrently=True)
+        op.drop_index(f'{history}_user_id_target_user_id_idx', table_name='match', postgresql_concurrently=True,
+                      if_exists=True)
+        op.create_index(f'{history}_user_id_target_user_id_idx', 'match', ['user_id', 'target_user_id'],
+                        unique=False, postgresql_concurrently=True)
+
+    # Дальше только правка каталога: старая таблица становится секцией истории, имена освобождаются.
+    op.execute("ALTER TABLE match ALTER COLUMN time_created SET NOT NULL")
+    op.execute("ALTER TABLE match DROP CONSTRAINT match_pkey")
+    op.execute(f'ALTER TABLE match ADD CONSTRAINT "{history}_pkey" '
+               f'PRIMARY KEY USING INDEX "{history}_id_time_created_idx"')
+    op.execute(f'ALTER INDEX ix_match_user_id_time_created RENAME TO "{history}_user_id_time_created_idx"')
+    op.execute(f'ALTER INDEX ix_match_target_user_id_time_created '
+               f'RENAME TO "{history}_target_user_id_time_created_idx"')
+    op.execute(f'ALTER TABLE match RENAME TO "{history}"')
+
+    # id остаётся integer, как в старой таблице: секция обязана совпадать с родителем по типам колонок.
+    op.create_table(
+        'match',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('time_created', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('time_updated', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('target_user_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['target_user_id'], ['client.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['client.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id', 'time_created'),
+        postgresql_partition_by='RANGE (time_created)'
+    )
+    op.execute("ALTER SEQUENCE match_id_seq OWNED BY match.id")
+    op.execute("ALTER TABLE match ALTER COLUMN id SET DEFAULT nextval('match_id_seq')")
+    create_match_indexes()
+    op.create_index('ix_match_user_id_target_user_id', 'match', ['user_id', 'target_user_id'], unique=False)
+
+    op.execute(f"ALTER TABLE match ATTACH PARTITION \"{history}\" FOR VALUES FROM (MINVALUE) TO ('{bound}')")
+    op.execute(f'ALTER TABLE "{history}" DROP CONSTRAINT "{history}_time_created_check"')
+
+    # Секции со следующего месяца и на два месяца вперёд; дальше их продлевает src/api/partitions.py.
+    op.execute(CREATE_MATCH_PARTITIONS_FUNCTION)
+    op.execute(f"""
+        SELECT create_match_partitions('{next_month.isoformat()}',
+                                       (now() AT TIME ZONE 'UTC' + interval '2 month')::date)
+    """)
+
+
+def downgrade() -> None:
+    history = op.get_bind().scalar(sa.text("""
+        SELECT child.relname FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = 'match'::regclass AND pg_get_expr(child.relpartbound, child.oid) LIKE '%MINVALUE%'
+    """))
+    if history is None:
+        raise RuntimeError("match has no history partition (dropped by MATCH_RETENTION_MONTHS?), "
+                           "restore the unpartitioned table by hand")
+
+    op.drop_table('daily_likes')
+
+    op.execute(f'ALTER TABLE match DETACH PARTITION "{history}"')
+    op.execute(f'ALTER SEQUENCE match_id_seq OWNED BY "{history}".id')
+    # Лайки, поставленные после секционирования, возвращаются в старую таблицу.
+    op.execute(f"""
+        INSERT INTO "{history}" (id, time_created, time_updated, user_id, target_user_id)
+        SELECT id, time_created, time_updated, user_id, target_user_id FROM match
+        ORDER BY id
+        ON CONFLICT DO NOTHING
+    """)
+    op.execute("DROP TABLE match")
+    op.execute("DROP FUNCTION create_match_partitions(date, date)")
+
+    op.execute(f'ALTER TABLE "{history}" RENAME TO match')
+    op.execute(f'ALTER TABLE match DROP CONSTRAINT "{history}_pkey"')
+    op.execute("ALTER TABLE match ADD CONSTRAINT match_pkey PRIMARY KEY (id)")
+    op.execute("ALTER TABLE match ALTER COLUMN time_created DROP NOT NULL")
+    op.execute(f'DROP INDEX "{history}_user_id_target_user_id_idx"')
+    op.execute(f'ALTER INDEX "{history}_user_id_time_created_idx" RENAME TO ix_match_user_id_time_created')
+    op.execute(f'ALTER INDEX "{history}_target_user_id_time_created_idx" '
+               f'RENAME TO ix_match_target_user_id_time_created')
@@ -0,0 +1,92 @@
+"""Default partition for match
+
+Revision ID: 7c3e9a51d2b4
+Revises: 0bc41f7423d9
+Create Date: 2026-10-18 18:41:37.218406
+
+Лайки за месяц без секции (обслуживание не работало) попадают в match_default вместо ошибки;
+create_match_partitions переносит их в секцию месяца, когда та создаётся.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c3e9a51d2b4'
+down_revision: Union[str, None] = '0bc41f7423d9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+CREATE_MATCH_PARTITIONS_FUNCTION = """
+CREATE OR REPLACE FUNCTION create_match_partitions(first_month date, last_month date) RETURNS integer AS $$
+DECLARE
+    month_start date := date_trunc('month', first_month);
+    partition_name text;
+    lower_bound timestamptz;
+    upper_bound timestamptz;
+    created integer := 0;
+BEGIN
+    WHILE month_start <= last_month LOOP
+        partition_name := 'match_' || to_char(month_start, 'YYYY_MM');
+        lower_bound := month_start::timestamp AT TIME ZONE 'UTC';
+        upper_bound := (month_start + interval '1 month') AT TIME ZONE 'UTC';
+        IF to_regclass(partition_name) IS NULL THEN
+            IF EXISTS (SELECT 1 FROM match_default WHERE time_created >= lower_bound AND time_created < upper_bound) THEN
+                EXECUTE format('CREATE TABLE %I (LIKE match INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', partition_name);
+                EXECUTE format('WITH moved AS (DELETE FROM match_default WHERE time_created >= %L AND time_created < %L '
+                               'RETURNING *) INSERT INTO %I SELECT * FROM moved', lower_bound, upper_bound, partition_name);
+                EXECUTE format('ALTER TABLE match ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', partition_name,
+                               lower_bound, upper_bound);
+            ELSE
+                EXECUTE format('CREATE TABLE %I PARTITION OF match FOR VALUES FROM (%L) TO (%L)', partition_name,
+                               lower_bound, upper_bound);
+            END IF;
+            created := created + 1;
+        END IF;
+        month_start := month_start + interval '1 month';
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+PREVIOUS_CREATE_MATCH_PARTITIONS_FUNCTION = """
+CREATE OR REPLACE FUNCTION create_match_partitions(first_month date, last_month date) RETURNS integer AS $$
+DECLARE
+    month_start date := date_trunc('month', first_month);
+    partition_name text;
+    created integer := 0;
+BEGIN
+    WHILE month_start <= last_month LOOP
+        partition_name := 'match_' || to_char(month_start, 'YYYY_MM');
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I PARTITION OF match FOR VALUES FROM (%L) TO (%L)', partition_name,
+                           month_start::timestamp AT TIME ZONE 'UTC',
+                           (month_start + interval '1 month') AT TIME ZONE 'UTC');
+            created := created + 1;
+        END IF;
+        month_start := month_start + interval '1 month';
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+def upgrade() -> None:
+    op.execute(CREATE_MATCH_PARTITIONS_FUNCTION)
+    op.execute("CREATE TABLE match_default PARTITION OF match DEFAULT")
+
+
+def downgrade() -> None:
+    # Строки из match_default переносятся в секции своих месяцев, пока функция ещё умеет это делать.
+    op.execute("""
+        SELECT create_match_partitions((min(time_created) AT TIME ZONE 'UTC')::date,
+                                       (max(time_created) AT TIME ZONE 'UTC')::date)
+        FROM match_default HAVING count(*) > 0
+    """)
+    op.execute("DROP TABLE match_default")
+    op.execute(PREVIOUS_CREATE_MATCH_PARTITIONS_FUNCTION)
@@ -0,0 +1,61 @@
+"""Bump table_version only when client rows changed
+
+Revision ID: a4d81f6c0e27
+Revises: 7c3e9a51d2b4
+Create Date: 2026-10-18 19:02:55.730184
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4d81f6c0e27'
+down_revision: Union[str, None] = '7c3e9a51d2b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("DROP TRIGGER client_bump_table_version ON client")
+    op.execute("""
+        CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP <> 'TRUNCATE' THEN
+                IF NOT EXISTS (SELECT 1 FROM changed_rows) THEN
+                    RETURN NULL;
+                END IF;
+            END IF;
+            UPDATE table_version SET version = version + 1 WHERE name = TG_TABLE_NAME;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    # Таблица переходов задаётся только для одного события, поэтому триггеров четыре.
+    for event, transition in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+        op.execute(f"""
+            CREATE TRIGGER client_bump_table_version_{event.lower()} AFTER {event} ON client
+            REFERENCING {transition} TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()
+        """)
+    op.execute("""
+        CREATE TRIGGER client_bump_table_version_truncate AFTER TRUNCATE ON client
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()
+    """)
+
+
+def downgrade() -> None:
+    for event in ("insert", "update", "delete", "truncate"):
+        op.execute(f"DROP TRIGGER client_bump_table_version_{event} ON client")
+    op.execute("""
+        CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+        BEGIN
+            UPDATE table_version SET version = version + 1 WHERE name = TG_TABLE_NAME;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER client_bump_table_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON client
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()
+    """)
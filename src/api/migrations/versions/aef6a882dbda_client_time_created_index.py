@@ -0,0 +1,32 @@
+"""Client time_created index
+
+Revision ID: aef6a882dbda
+Revises: 512183206911
+Create Date: 2026-10-18 11:03:27.190544
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'aef6a882dbda'
+down_revision: Union[str, None] = '512183206911'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY не блокирует запись в client, но не работает внутри транзакции.
+    # Прерванная сборка оставляет невалидный индекс - его удаляем и строим заново.
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_client_time_created_id', table_name='client', postgresql_concurrently=True, if_exists=True)
+        op.create_index('ix_client_time_created_id', 'client', ['time_created', 'id'], unique=False,
+                        postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_client_time_created_id', table_name='client', postgresql_concurrently=True)
@@ -0,0 +1,44 @@
+"""Email outbox
+
+Revision ID: c911728e7200
+Revises: 02323abdb147
+Create Date: 2026-10-18 13:20:55.067731
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c911728e7200'
+down_revision: Union[str, None] = '02323abdb147'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'outbox',
+        sa.Column('recipient', sa.String(length=64), nullable=False),
+        sa.Column('subject', sa.String(length=256), nullable=False),
+        sa.Column('body', sa.Text(), nullable=False),
+        sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('sent_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('last_error', sa.String(length=512), nullable=True),
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('time_created', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('time_updated', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_outbox_id'), 'outbox', ['id'], unique=False)
+    op.create_index('ix_outbox_pending', 'outbox', ['next_attempt_at'], unique=False,
+                    postgresql_where=sa.text('sent_at IS NULL'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_outbox_pending', table_name='outbox')
+    op.drop_index(op.f('ix_outbox_id'), table_name='outbox')
+    op.drop_table('outbox')
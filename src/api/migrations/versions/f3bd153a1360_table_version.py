@@ -0,0 +1,44 @@
+"""Table version for client
+
+Revision ID: f3bd153a1360
+Revises: 0b6215515a82
+Create Date: 2026-10-18 15:37:12.904126
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3bd153a1360'
+down_revision: Union[str, None] = '0b6215515a82'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('table_version',
+                    sa.Column('name', sa.String(length=64), nullable=False),
+                    sa.Column('version', sa.BigInteger(), server_default='0', nullable=False),
+                    sa.PrimaryKeyConstraint('name'))
+    op.execute("INSERT INTO table_version (name, version) VALUES ('client', 0)")
+    op.execute("""
+        CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+        BEGIN
+            UPDATE table_version SET version = version + 1 WHERE name = TG_TABLE_NAME;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER client_bump_table_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON client
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER client_bump_table_version ON client")
+    op.execute("DROP FUNCTION bump_table_version()")
+    op.drop_table('table_version')
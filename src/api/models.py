@@ -1,7 +1,15 @@
-from sqlalchemy import String, Float, Integer, ForeignKey, UniqueConstraint
+from sqlalchemy import String, Float, Integer, BigInteger, Text, Date, DateTime, ForeignKey, Index, DDL, Table, \
+    Column, FetchedValue, event, text
+from sqlalchemy.sql import func
 from sqlalchemy.orm import mapped_column, relationship
 
 from src.api.database import BaseModel
+from src.api.settings import MATCH_PARTITIONS_AHEAD_MONTHS
+
+
+# Триграммные индексы по именам требуют расширения pg_trgm (в миграциях оно создаётся отдельно).
+event.listen(BaseModel.metadata, "before_create",
+             DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"))
 
 
 class Client(BaseModel):
@@ -24,13 +32,182 @@ class Client(BaseModel):
     given_matches = relationship("Match", foreign_keys="Match.user_id", back_populates="user")
     received_matches = relationship("Match", foreign_keys="Match.target_user_id", back_populates="target_user")
 
+    __table_args__ = (
+        Index("ix_client_latitude_longitude", "latitude", "longitude"),
+        Index("ix_client_time_created_id", "time_created", "id"),
+        # Фильтр по полу с той же keyset-пагинацией - проход по индексу без сортировки.
+        Index("ix_client_gender_time_created_id", "gender", "time_created", "id"),
+        # Дельты снимка клиентов (src/api/snapshot.py) выбирают изменённые строки по time_updated.
+        Index("ix_client_time_updated", "time_updated"),
+        Index("ix_client_first_name_trgm", "first_name",
+              postgresql_using="gin", postgresql_ops={"first_name": "gin_trgm_ops"}),
+        Index("ix_client_last_name_trgm", "last_name",
+              postgresql_using="gin", postgresql_ops={"last_name": "gin_trgm_ops"}),
+    )
+
+
+# Версия содержимого таблицы: триггер увеличивает её в той же транзакции, что и изменение строк,
+# поэтому новая версия видна одновременно с изменениями. По ней /list строит ETag.
+table_version = Table(
+    "table_version", BaseModel.metadata,
+    Column("name", String(length=64), primary_key=True),
+    Column("version", BigInteger, nullable=False, server_default="0"),
+)
+
+BUMP_TABLE_VERSION_FUNCTION = """
+CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP <> 'TRUNCATE' THEN
+        IF NOT EXISTS (SELECT 1 FROM changed_rows) THEN
+            RETURN NULL;
+        END IF;
+    END IF;
+    UPDATE table_version SET version = version + 1 WHERE name = TG_TABLE_NAME;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+# Триггер на оператор, а не на строку: импорт пачкой увеличивает версию один раз. Строка table_version
+# заблокирована до коммита, поэтому изменения client во всех воркерах выстраиваются в очередь на ней
+# (benchmarks/bench_client_writes.py). Операторы, не изменившие ни одной строки (ON CONFLICT DO NOTHING
+# на занятых email, UPDATE без совпадений), по пустой таблице переходов changed_rows версию не трогают.
+# Таблица переходов задаётся только для одного события, поэтому триггеров четыре.
+CLIENT_VERSION_TRIGGERS = (
+    "CREATE TRIGGER client_bump_table_version_insert AFTER INSERT ON client "
+    "REFERENCING NEW TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()",
+    "CREATE TRIGGER client_bump_table_version_update AFTER UPDATE ON client "
+    "REFERENCING NEW TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()",
+    "CREATE TRIGGER client_bump_table_version_delete AFTER DELETE ON client "
+    "REFERENCING OLD TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()",
+    "CREATE TRIGGER client_bump_table_version_truncate AFTER TRUNCATE ON client "
+    "FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()",
+)
+
+event.listen(table_version, "after_create", DDL("INSERT INTO table_version (name, version) VALUES ('client', 0)"))
+event.listen(Client.__table__, "after_create", DDL(BUMP_TABLE_VERSION_FUNCTION).execute_if(dialect="postgresql"))
+for statement in CLIENT_VERSION_TRIGGERS:
+    event.listen(Client.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+
 
 class Match(BaseModel):
 
+    """
+        Секционирована по месяцам time_created (секции match_YYYY_MM): вставка идёт в небольшую
+        текущую секцию, а старые месяцы удаляются целиком (src/api/partitions.py).
+        Уникальный ключ в секционированной таблице обязан включать time_created, поэтому
+        уникальность пары (user_id, target_user_id) держит первичный ключ несекционированной match_pair:
+        лайк вставляется в match, только если вставилась строка match_pair.
+    """
+
+    # Значение по умолчанию - из последовательности match_id_seq, она создаётся после таблицы. Тип integer,
+    # как у таблицы до секционирования: она подключена секцией истории, а типы колонок секций совпадают с родителем.
+    id = Column(Integer, primary_key=True, server_default=FetchedValue())
+    time_created = Column(DateTime(timezone=True), primary_key=True, server_default=func.now())
+
     user_id = mapped_column(Integer, ForeignKey("client.id", ondelete="CASCADE"), nullable=False)
     target_user_id = mapped_column(Integer, ForeignKey("client.id", ondelete="CASCADE"), nullable=False)
 
-    __table_args__ = (UniqueConstraint("user_id", "target_user_id", name="unique_match"),)
+    __table_args__ = (
+        # Лента "кого я лайкнул" - по user_id, лента "кто лайкнул меня" - по target_user_id.
+        Index("ix_match_user_id_time_created", "user_id", "time_created"),
+        Index("ix_match_target_user_id_time_created", "target_user_id", "time_created"),
+        # Проверка "уже лайкнул" и встречного лайка.
+        Index("ix_match_user_id_target_user_id", "user_id", "target_user_id"),
+        {"postgresql_partition_by": "RANGE (time_created)"},
+    )
 
     user = relationship("Client", foreign_keys=[user_id], back_populates="given_matches")
     target_user = relationship("Client", foreign_keys=[target_user_id], back_populates="received_matches")
+
+
+# Создаёт недостающие месячные секции match с first_month по last_month включительно. Границы - по UTC.
+# Лайки, для месяца которых секции не было, лежат в match_default: такая секция создаётся отдельной
+# таблицей, в неё переносятся строки этого месяца из match_default, и она подключается через ATTACH
+# (CREATE ... PARTITION OF упал бы на строках в секции по умолчанию).
+# Проценты удвоены для DDL(); в миграции функция записана без удвоения.
+CREATE_MATCH_PARTITIONS_FUNCTION = """
+CREATE OR REPLACE FUNCTION create_match_partitions(first_month date, last_month date) RETURNS integer AS $$
+DECLARE
+    month_start date := date_trunc('month', first_month);
+    partition_name text;
+    lower_bound timestamptz;
+    upper_bound timestamptz;
+    created integer := 0;
+BEGIN
+    WHILE month_start <= last_month LOOP
+        partition_name := 'match_' || to_char(month_start, 'YYYY_MM');
+        lower_bound := month_start::timestamp AT TIME ZONE 'UTC';
+        upper_bound := (month_start + interval '1 month') AT TIME ZONE 'UTC';
+        IF to_regclass(partition_name) IS NULL THEN
+            IF EXISTS (SELECT 1 FROM match_default WHERE time_created >= lower_bound AND time_created < upper_bound) THEN
+                EXECUTE format('CREATE TABLE %%I (LIKE match INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', partition_name);
+                EXECUTE format('WITH moved AS (DELETE FROM match_default WHERE time_created >= %%L AND time_created < %%L '
+                               'RETURNING *) INSERT INTO %%I SELECT * FROM moved', lower_bound, upper_bound, partition_name);
+                EXECUTE format('ALTER TABLE match ATTACH PARTITION %%I FOR VALUES FROM (%%L) TO (%%L)', partition_name,
+                               lower_bound, upper_bound);
+            ELSE
+                EXECUTE format('CREATE TABLE %%I PARTITION OF match FOR VALUES FROM (%%L) TO (%%L)', partition_name,
+                               lower_bound, upper_bound);
+            END IF;
+            created := created + 1;
+        END IF;
+        month_start := month_start + interval '1 month';
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+# Явная последовательность вместо BIGSERIAL: автоинкремент в составном ключе не создать в SQLite
+# (там id задаются явно).
+for statement in ("CREATE SEQUENCE IF NOT EXISTS match_id_seq OWNED BY match.id",
+                  "ALTER TABLE match ALTER COLUMN id SET DEFAULT nextval('match_id_seq')"):
+    event.listen(Match.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+event.listen(Match.__table__, "after_create",
+             DDL(CREATE_MATCH_PARTITIONS_FUNCTION).execute_if(dialect="postgresql"))
+# Если обслуживание секций не работало дольше MATCH_PARTITIONS_AHEAD_MONTHS, лайки попадают сюда, а не в ошибку.
+event.listen(Match.__table__, "after_create",
+             DDL("CREATE TABLE IF NOT EXISTS match_default PARTITION OF match DEFAULT").execute_if(dialect="postgresql"))
+# Для create_all (тесты, бенчмарки): прошлый месяц, текущий и MATCH_PARTITIONS_AHEAD_MONTHS вперёд.
+event.listen(Match.__table__, "after_create", DDL(
+    "SELECT create_match_partitions((now() AT TIME ZONE 'UTC' - interval '1 month')::date, "
+    f"(now() AT TIME ZONE 'UTC' + interval '{MATCH_PARTITIONS_AHEAD_MONTHS} month')::date)"
+).execute_if(dialect="postgresql"))
+
+
+# Пары (кто, кого) из match: первичный ключ не даёт поставить второй такой же лайк ни одному писателю.
+# Строки удаляются вместе с секцией match, в которой лежит лайк (src/api/partitions.py).
+match_pair = Table(
+    "match_pair", BaseModel.metadata,
+    Column("user_id", Integer, ForeignKey("client.id", ondelete="CASCADE"), primary_key=True),
+    Column("target_user_id", Integer, ForeignKey("client.id", ondelete="CASCADE"), primary_key=True),
+)
+
+
+# Счётчик лайков пользователя за день (UTC): дневной лимит проверяется чтением одной строки по первичному ключу.
+daily_likes = Table(
+    "daily_likes", BaseModel.metadata,
+    Column("user_id", Integer, ForeignKey("client.id", ondelete="CASCADE"), primary_key=True),
+    Column("day", Date, primary_key=True),
+    Column("count", Integer, nullable=False),
+)
+
+
+class Outbox(BaseModel):
+
+    """
+        Очередь исходящих писем. Запись добавляется в той же транзакции, что и событие
+        (например, взаимный лайк), а отправляет её фоновый EmailOutboxWorker.
+    """
+
+    recipient = mapped_column(String(length=64), nullable=False)
+    subject = mapped_column(String(length=256), nullable=False)
+    body = mapped_column(Text, nullable=False)
+    attempts = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    next_attempt_at = mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    sent_at = mapped_column(DateTime(timezone=True), nullable=True)
+    last_error = mapped_column(String(length=512), nullable=True)
+
+    __table_args__ = (
+        Index("ix_outbox_pending", "next_attempt_at", postgresql_where=text("sent_at IS NULL")),
+    )
@@ -0,0 +1,154 @@
+"""
+    Обслуживание секционированной таблицы match и счётчика daily_likes: раз в
+    PARTITION_MAINTENANCE_INTERVAL_SECONDS создаются секции на MATCH_PARTITIONS_AHEAD_MONTHS месяцев вперёд,
+    удаляются секции старше MATCH_RETENTION_MONTHS (DROP TABLE секции вместо DELETE по строкам, из match_pair
+    удаляются только пары этих лайков)
+    и строки daily_likes старше DAILY_LIKES_RETENTION_DAYS.
+"""
+import re
+import time
+import asyncio
+import logging
+
+from typing import Iterable
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy import select, delete, func, text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from src.api.models import daily_likes
+from src.api.database import async_session
+from src.api.settings import PARTITION_MAINTENANCE_INTERVAL_SECONDS, MATCH_PARTITIONS_AHEAD_MONTHS, \
+    MATCH_RETENTION_MONTHS, DAILY_LIKES_RETENTION_DAYS
+
+logger = logging.getLogger(__name__)
+
+PARTITION_NAME = re.compile(r"^match_(\d{4})_(\d{2})$")
+MAINTENANCE_LOCK = "match_partition_maintenance"
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def get_expired_partitions(names: Iterable[str], today: date, retention_months: int) -> list[str]:
+    """Секции match_YYYY_MM целиком старше retention_months месяцев до текущего; при 0 - ни одной."""
+    if retention_months <= 0:
+        return []
+
+    cutoff = add_months(today.replace(day=1), -retention_months)
+    expired = []
+    for name in names:
+        found = PARTITION_NAME.match(name)
+        if found and date(int(found[1]), int(found[2]), 1) < cutoff:
+            expired.append(name)
+    return sorted(expired)
+
+
+class PartitionMaintainer:
+    """
+        Запускается в каждом воркере; за один проход работает тот, кто взял advisory-блокировку,
+        остальные его пропускают. DDL на родительской таблице ждёт блокировку не дольше lock_timeout,
+        чтобы не выстраивать за собой очередь лайков - при неудаче проход повторится позже.
+    """
+
+    def __init__(self,
+                 session_factory: async_sessionmaker = async_session,
+                 interval: float = PARTITION_MAINTENANCE_INTERVAL_SECONDS,
+                 ahead_months: int = MATCH_PARTITIONS_AHEAD_MONTHS,
+                 retention_months: int = MATCH_RETENTION_MONTHS,
+                 counter_retention_days: int = DAILY_LIKES_RETENTION_DAYS,
+                 lock_timeout: str = "5s"):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.ahead_months = ahead_months
+        self.retention_months = retention_months
+        self.counter_retention_days = counter_retention_days
+        self.lock_timeout = lock_timeout
+
+        self._task: asyncio.Task | None = None
+
+        self.runs = 0
+        self.created = 0
+        self.dropped = 0
+        self.pruned = 0
+        # Для алертов по /metrics: ошибки подряд, время последнего успешного прохода (unix)
+        # и число лайков в match_default - то есть в месяцах, для которых не нашлось секции.
+        self.failures = 0
+        self.last_success = 0.0
+        self.default_rows = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self):
+        while True:
+            try:
+                await self.maintain()
+                self.failures = 0
+            except Exception:
+                self.failures += 1
+                logger.exception("Match partition maintenance failed (%s in a row)", self.failures)
+            await asyncio.sleep(self.interval)
+
+    async def maintain(self, today: date | None = None) -> bool:
+        """Возвращает False, если проход уже выполняет другой воркер."""
+        today = today or datetime.now(timezone.utc).date()
+        month = today.replace(day=1)
+
+        async with self.session_factory() as session:
+            locked = await session.scalar(select(func.pg_try_advisory_xact_lock(func.hashtext(MAINTENANCE_LOCK), 0)))
+            if not locked:
+                return False
+            await session.execute(text(f"SET LOCAL lock_timeout = '{self.lock_timeout}'"))
+
+            created = await session.scalar(
+                select(func.create_match_partitions(month, add_months(month, self.ahead_months))))
+
+            result = await session.execute(text(
+                "SELECT child.relname FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+                "WHERE pg_inherits.inhparent = 'match'::regclass"))
+            expired = get_expired_partitions(result.scalars(), today, self.retention_months)
+            for name in expired:
+                # Имя проверено регулярным выражением в get_expired_partitions. Вместе с лайками уходят
+                # и их пары, иначе этого пользователя нельзя было бы лайкнуть снова.
+                await session.execute(text(
+                    f'DELETE FROM match_pair USING "{name}" AS expired '
+                    'WHERE match_pair.user_id = expired.user_id AND match_pair.target_user_id = expired.target_user_id'))
+                await session.execute(text(f'DROP TABLE "{name}"'))
+
+            default_rows = await session.scalar(text("SELECT count(*) FROM match_default"))
+
+            result = await session.execute(
+                delete(daily_likes).where(daily_likes.c.day < today - timedelta(days=self.counter_retention_days)))
+
+            await session.commit()
+
+        if created or expired:
+            logger.info("Match partitions: created %s, dropped %s", created, ", ".join(expired) or "none")
+        if default_rows:
+            logger.warning("%s likes are in match_default, partitions for their months are missing", default_rows)
+        self.default_rows = default_rows
+        self.last_success = time.time()
+        self.runs += 1
+        self.created += created
+        self.dropped += len(expired)
+        self.pruned += result.rowcount
+        return True
+
+    def stats(self) -> dict:
+        return {"runs": self.runs, "created": self.created, "dropped": self.dropped, "pruned_counters": self.pruned,
+                "failures": self.failures, "last_success_time": self.last_success, "default_rows": self.default_rows}
+
+
+partition_maintainer = PartitionMaintainer()
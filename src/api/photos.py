@@ -0,0 +1,202 @@
+import os
+import uuid
+import shutil
+import asyncio
+import hashlib
+import tempfile
+import multiprocessing
+
+from typing import IO, Iterator
+from PIL import Image, ImageDraw, ImageFont, UnidentifiedImageError
+from fastapi import HTTPException
+from concurrent.futures import ProcessPoolExecutor
+
+from src.api.settings import PHOTO_WORKERS, PHOTO_QUEUE_SIZE, PHOTO_QUEUE_TIMEOUT_SECONDS, PHOTO_VARIANTS, \
+    PHOTO_WEBP, PHOTO_JPEG_QUALITY, PHOTO_FONT_PATHS, PHOTO_FONT_SIZE, PHOTO_FORMATS, PHOTO_MAX_PIXELS, \
+    PHOTO_CHUNK_SIZE
+
+# Шрифт загружается один раз на процесс-воркер (см. init_worker), а не на каждое фото.
+_font = None
+
+
+def init_worker(font_paths: tuple[str, ...] = PHOTO_FONT_PATHS, font_size: int = PHOTO_FONT_SIZE):
+    global _font
+
+    for font_path in font_paths:
+        try:
+            _font = ImageFont.truetype(font_path, font_size)
+            return
+        except IOError:
+            continue
+    _font = ImageFont.load_default()
+
+
+def draw_watermark(image: Image.Image, watermark_text: str):
+    """Накладывает полупрозрачный текст в правый нижний угол, смешивая только область под ним."""
+    if _font is None:
+        init_worker()
+
+    left, top, right, bottom = _font.getbbox(watermark_text)
+    x = image.width - right - 10
+    y = image.height - bottom - 10
+    box = (max(x + left, 0), max(y + top, 0), min(x + right, image.width), min(y + bottom, image.height))
+    if box[0] >= box[2] or box[1] >= box[3]:
+        return
+
+    region = image.crop(box).convert("RGBA")
+    overlay = Image.new("RGBA", region.size)
+    ImageDraw.Draw(overlay).text((x - box[0], y - box[1]), watermark_text, fill=(255, 255, 255, 128), font=_font)
+
+    image.paste(Image.alpha_composite(region, overlay).convert("RGB"), box[:2])
+
+
+def probe_photo(file: IO[bytes], formats: tuple[str, ...] = PHOTO_FORMATS,
+                max_pixels: int = PHOTO_MAX_PIXELS) -> tuple[str, int, int]:
+    """
+        Формат и размеры по заголовку файла: Image.open не декодирует пиксели. Неизвестный формат - 415,
+        слишком много пикселей (в том числе «бомба» - маленький файл, огромный при распаковке) - 413.
+    """
+    try:
+        with Image.open(file) as image:
+            format, (width, height) = image.format, image.size
+    except Image.DecompressionBombError:
+        format, width, height = None, max_pixels, max_pixels
+    except OSError:
+        format, width, height = None, 0, 0
+    finally:
+        file.seek(0)
+
+    if width * height > max_pixels:
+        raise HTTPException(status_code=413, detail=f"Photo must be at most {max_pixels} pixels.")
+    if format not in formats:
+        raise HTTPException(status_code=415, detail=f"Photo must be one of: {', '.join(formats)}.")
+    return format, width, height
+
+
+def spool_photo(file: IO[bytes], directory: str, chunk_size: int = PHOTO_CHUNK_SIZE) -> str:
+    """Копирует загрузку кусками во временный файл в directory, откуда её прочитает процесс-воркер."""
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=directory, suffix=".upload", delete=False) as output:
+        try:
+            shutil.copyfileobj(file, output, chunk_size)
+        except BaseException:
+            os.unlink(output.name)
+            raise
+    return output.name
+
+
+def iter_photo_variants(path: str, watermark_text: str,
+                        variants: dict[str, int] = PHOTO_VARIANTS,
+                        webp: bool = PHOTO_WEBP,
+                        max_pixels: int = PHOTO_MAX_PIXELS) -> Iterator[tuple[str, Image.Image]]:
+    """
+        Выдаёт пары ("full.jpeg", изображение) от большего варианта к меньшему; изображение одно
+        и уменьшается на месте, поэтому сохранять вариант нужно до перехода к следующему.
+    """
+    try:
+        image = Image.open(path)
+    except UnidentifiedImageError:
+        # Сообщение Pillow содержит путь к временному файлу - в отчёт импорта он не нужен.
+        raise ValueError("cannot identify image file")
+    if image.width * image.height > max_pixels:
+        raise ValueError(f"more than {max_pixels} pixels")
+
+    # Для JPEG декодер сразу уменьшает изображение в 2/4/8 раз, не разжимая полный размер.
+    largest = max(variants.values())
+    image.draft("RGB", (largest, largest))
+    image = image.convert("RGB")
+    image.thumbnail((largest, largest))
+
+    draw_watermark(image, watermark_text)
+
+    for name, size in sorted(variants.items(), key=lambda item: -item[1]):
+        image.thumbnail((size, size))
+        yield f"{name}.jpeg", image
+        if webp:
+            yield f"{name}.webp", image
+
+
+def save_photo_variant(image: Image.Image, variant: str, output, quality: int = PHOTO_JPEG_QUALITY):
+    if variant.endswith(".webp"):
+        image.save(output, format="WEBP", quality=quality)
+    else:
+        image.save(output, format="JPEG", quality=quality, optimize=True)
+
+
+def render_photo_files(path: str, watermark_text: str, directory: str,
+                       variants: dict[str, int] = PHOTO_VARIANTS,
+                       webp: bool = PHOTO_WEBP,
+                       quality: int = PHOTO_JPEG_QUALITY,
+                       chunk_size: int = PHOTO_CHUNK_SIZE) -> tuple[str, dict[str, str]]:
+    """
+        Выполняется в процессе-воркере: читает фото с диска и пишет варианты во временные файлы в directory -
+        через процесс web-воркера проходят только пути. Возвращает хеш и {"full.jpeg": путь, ...}; каждый
+        вариант вписан в квадрат со стороной variants[name] пикселей.
+        Хеш считается от всех вариантов сразу: если изменится любой из них, изменятся и все имена файлов.
+    """
+    files = {}
+    try:
+        for variant, image in iter_photo_variants(path, watermark_text, variants, webp):
+            files[variant] = os.path.join(directory, f"{uuid.uuid4().hex}.{variant}.tmp")
+            save_photo_variant(image, variant, files[variant], quality)
+
+        digest = hashlib.sha256()
+        for variant in sorted(files):
+            digest.update(variant.encode())
+            with open(files[variant], "rb") as file:
+                while chunk := file.read(chunk_size):
+                    digest.update(chunk)
+    except BaseException:
+        for filepath in files.values():
+            if os.path.exists(filepath):
+                os.unlink(filepath)
+        raise
+    return digest.hexdigest(), files
+
+
+class PhotoPipeline:
+    """
+        Пул процессов для обработки фото. Одновременно в работе (включая ожидающие
+        свободного воркера) не больше queue_size фото: остальные загрузки ждут,
+        а после queue_timeout получают 503, чтобы всплеск загрузок не съел всю память.
+    """
+
+    def __init__(self, workers: int = PHOTO_WORKERS, queue_size: int = PHOTO_QUEUE_SIZE,
+                 queue_timeout: float = PHOTO_QUEUE_TIMEOUT_SECONDS):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+
+        self._executor: ProcessPoolExecutor | None = None
+        self._slots = asyncio.Semaphore(queue_size)
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"),
+                                                 initializer=init_worker)
+        return self._executor
+
+    async def render(self, path: str, watermark_text: str, directory: str) -> tuple[str, dict[str, str]]:
+        """Фото и его варианты передаются воркеру путями (см. render_photo_files)."""
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=503, detail="Too many photos are being processed, try again later.")
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, render_photo_files,
+                                                                    path, watermark_text, directory)
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            raise HTTPException(status_code=422, detail=f"Photo can't be processed: {e}")
+        finally:
+            self._slots.release()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+photo_pipeline = PhotoPipeline()
@@ -0,0 +1,290 @@
+"""
+    Профилирование отдельных запросов в работающем воркере, без перезапуска с DATABASE_ECHO.
+
+    Профиль снимается, если у запроса есть заголовок PROFILE_TOKEN_HEADER с токеном профилирования
+    или маршрут взведён через POST /debug/profile (в том воркере, который принял этот запрос):
+        python -m src.api.profiling token --minutes 30
+        curl -H "X-Profile-Token: <токен>" http://localhost/api/list
+        curl -X POST -H "X-Profile-Token: <токен>" "http://localhost/api/debug/profile?route=/list&count=5"
+
+    В PROFILE_DIR пишутся <id>.json (время, SQL по нормализованному тексту с пометкой повторов, стеки)
+    и <id>.folded - свёрнутые стеки для flamegraph.pl или speedscope; id возвращается в заголовке X-Profile.
+    Выборка стеков - отдельным потоком по sys._current_frames(), поэтому в профиль попадает всё,
+    что event loop делал за время запроса, включая соседние запросы этого воркера.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import logging
+import argparse
+import threading
+
+from collections import Counter
+from datetime import datetime, timezone
+from fastapi import HTTPException
+
+from src.api.metrics import request_queries, EVENT_LOOP_LAG, EVENT_LOOP_BLOCKED
+from src.api.ratelimit import match_route
+from src.api.utils import encode_jwt, decode_jwt_cached
+from src.api.settings import PROFILE_DIR, PROFILE_TOKEN_HEADER, PROFILE_TOKEN_SCOPE, PROFILE_SAMPLE_INTERVAL_SECONDS, \
+    METRICS_REPEATED_QUERY_THRESHOLD, LOOP_BLOCK_THRESHOLD_SECONDS, LOOP_MONITOR_INTERVAL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+_frame_labels: dict = {}
+
+
+def get_frame_label(code) -> str:
+    label = _frame_labels.get(code)
+    if label is None:
+        label = _frame_labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return label
+
+
+def get_stack(frame) -> list[str]:
+    """Стек от корня к текущей функции."""
+    stack = []
+    while frame is not None:
+        stack.append(get_frame_label(frame.f_code))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def has_profile_token(scope) -> bool:
+    header = PROFILE_TOKEN_HEADER.encode()
+    for name, value in scope["headers"]:
+        if name == header:
+            try:
+                return decode_jwt_cached(value.decode("latin-1")).get("scope") == PROFILE_TOKEN_SCOPE
+            except HTTPException:
+                return False
+    return False
+
+
+class StackSampler:
+    """
+        Раз в interval секунд снимает стек потока thread_id. Частота ограничена переключением GIL:
+        пока поток event loop выполняет Python-код, сэмплер получает управление раз в sys.getswitchinterval().
+    """
+
+    def __init__(self, thread_id: int, interval: float = PROFILE_SAMPLE_INTERVAL_SECONDS):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter[str] = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.samples[";".join(get_stack(frame))] += 1
+            # Без этого стек держит ссылки на кадры до следующей выборки.
+            del frame
+
+
+class RequestProfiler:
+    """Решает, какие запросы профилировать, и пишет профили на диск. Одновременно - не больше одного профиля."""
+
+    def __init__(self, directory: str = PROFILE_DIR, interval: float = PROFILE_SAMPLE_INTERVAL_SECONDS,
+                 repeated_query_threshold: int = METRICS_REPEATED_QUERY_THRESHOLD):
+        self.directory = directory
+        self.interval = interval
+        self.repeated_query_threshold = repeated_query_threshold
+        # Шаблон маршрута -> сколько следующих запросов профилировать.
+        self.armed: dict[str, int] = {}
+        self.active = False
+        self.written = 0
+
+    def arm(self, route: str, count: int):
+        self.armed[route] = count
+
+    def should_profile(self, scope) -> bool:
+        if self.active:
+            return False
+        if has_profile_token(scope):
+            return True
+        if self.armed:
+            route = match_route(scope)
+            path = route.path if route is not None else None
+            if self.armed.get(path, 0) > 0:
+                self.armed[path] -= 1
+                if not self.armed[path]:
+                    del self.armed[path]
+                return True
+        return False
+
+    def build_profile(self, scope, status: int, duration: float, samples: Counter) -> dict:
+        queries = request_queries.get()
+        grouped = queries.grouped() if queries is not None else []
+        route = scope.get("route")
+        return {
+            "method": scope["method"],
+            "path": scope["path"],
+            "route": getattr(route, "path", None),
+            "status": status,
+            "duration_ms": duration * 1000,
+            "pid": os.getpid(),
+            "sample_interval_ms": self.interval * 1000,
+            "samples": sum(samples.values()),
+            "queries": {
+                "count": queries.count if queries is not None else 0,
+                "duration_ms": queries.duration * 1000 if queries is not None else 0.0,
+                "statements": [{"sql": statement, "count": count, "duration_ms": total * 1000,
+                                "repeated": count >= self.repeated_query_threshold}
+                               for statement, count, total in grouped],
+            },
+            "stacks": [{"stack": stack, "samples": count} for stack, count in samples.most_common()],
+        }
+
+    def write(self, name: str, profile: dict, samples: Counter):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, f"{name}.json"), "w") as output:
+            json.dump(profile, output, ensure_ascii=False, indent=2)
+        with open(os.path.join(self.directory, f"{name}.folded"), "w") as output:
+            output.writelines(f"{stack} {count}\n" for stack, count in samples.items())
+        self.written += 1
+
+    def stats(self) -> dict:
+        return {"active": int(self.active), "armed": sum(self.armed.values()), "written": self.written}
+
+
+request_profiler = RequestProfiler()
+
+
+class ProfilingMiddleware:
+    """
+        Снимает профиль выбранного запроса и возвращает его имя в заголовке X-Profile.
+        Стоит внутри MetricsMiddleware, чтобы видеть счётчик SQL-запросов текущего запроса.
+    """
+
+    def __init__(self, app, profiler: RequestProfiler = request_profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.profiler.should_profile(scope):
+            return await self.app(scope, receive, send)
+
+        name = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-profile", name.encode())]
+            await send(message)
+
+        self.profiler.active = True
+        sampler = StackSampler(threading.get_ident(), self.profiler.interval)
+        sampler.start()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - started
+            sampler.stop()
+            self.profiler.active = False
+
+            profile = {"id": name, **self.profiler.build_profile(scope, status, duration, sampler.samples)}
+            try:
+                await asyncio.to_thread(self.profiler.write, name, profile, sampler.samples)
+                logger.info("Profile of %s %s written to %s.json", scope["method"], scope["path"],
+                            os.path.join(self.profiler.directory, name))
+            except OSError:
+                logger.exception("Can't write profile")
+
+
+class LoopBlockingMonitor:
+    """
+        Сторож event loop: корутина обновляет отметку времени каждые interval секунд, а отдельный
+        поток проверяет её. Если цикл не обновлял отметку дольше threshold, поток снимает стек
+        потока event loop - это и есть синхронный вызов, который его держит. Длительность
+        зависания пишется в лог, когда цикл оживает.
+    """
+
+    def __init__(self, threshold: float = LOOP_BLOCK_THRESHOLD_SECONDS, interval: float = LOOP_MONITOR_INTERVAL_SECONDS):
+        self.threshold = threshold
+        self.interval = interval
+
+        self._beat = 0.0
+        self._stack: list[str] | None = None
+        self._task: asyncio.Task | None = None
+        self._thread: threading.Thread | None = None
+        self._stopped = threading.Event()
+
+        self.stalls = 0
+        self.max_lag = 0.0
+
+    def start(self):
+        if self._task is None:
+            self._beat = time.monotonic()
+            self._stopped.clear()
+            self._task = asyncio.create_task(self.heartbeat())
+            self._thread = threading.Thread(target=self.watch, args=(threading.get_ident(),),
+                                            name="loop-monitor", daemon=True)
+            self._thread.start()
+
+    async def stop(self):
+        if self._task is not None:
+            self._stopped.set()
+            self._thread.join()
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def heartbeat(self):
+        while True:
+            scheduled = time.monotonic() + self.interval
+            self._beat = scheduled
+            await asyncio.sleep(self.interval)
+            self.on_beat(time.monotonic() - scheduled)
+
+    def on_beat(self, lag: float):
+        EVENT_LOOP_LAG.observe(max(lag, 0.0))
+        self.max_lag = max(self.max_lag, lag)
+        stack, self._stack = self._stack, None
+        if lag >= self.threshold:
+            self.stalls += 1
+            EVENT_LOOP_BLOCKED.inc()
+            logger.warning("Event loop was blocked for %.0f ms in:\n  %s", lag * 1000,
+                           "\n  ".join(stack[-12:]) if stack else "<stack not captured>")
+
+    def watch(self, thread_id: int):
+        while not self._stopped.wait(self.interval):
+            if self._stack is None and time.monotonic() - self._beat > self.threshold:
+                frame = sys._current_frames().get(thread_id)
+                if frame is not None:
+                    self._stack = get_stack(frame)
+                del frame
+
+    def stats(self) -> dict:
+        return {"stalls": self.stalls, "max_lag_seconds": self.max_lag}
+
+
+loop_monitor = LoopBlockingMonitor()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    token_parser = subparsers.add_parser("token", help="Токен для заголовка X-Profile-Token")
+    token_parser.add_argument("--minutes", type=int, default=30)
+    args = parser.parse_args()
+
+    print(encode_jwt({"sub": "profiler", "scope": PROFILE_TOKEN_SCOPE}, expire_minutes=args.minutes))
@@ -0,0 +1,226 @@
+"""
+    Ограничение частоты и конкурентности запросов до того, как начнётся работа с базой или фото.
+    Маршрут определяется по шаблону (/clients/{id}/match/), лимиты берутся из settings.
+
+    Частота - token bucket в форме GCRA: на ключ (email пользователя или упакованный IP) хранится
+    одно число - момент, когда корзина снова станет полной. Ключ с моментом в прошлом ничем
+    не отличается от отсутствующего, поэтому такие ключи удаляются, а всего ключей не больше max_keys.
+"""
+import math
+import time
+import ipaddress
+
+from urllib.parse import parse_qs
+from collections import OrderedDict
+from typing import Callable
+from starlette.routing import Match
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+from src.api.utils import decode_jwt_cached
+from src.api.metrics import REQUESTS_REJECTED
+from src.api.settings import RATE_LIMITS_PER_USER, RATE_LIMITS_PER_IP, RATE_LIMIT_MAX_KEYS, CONCURRENCY_LIMITS, \
+    CONCURRENCY_ROUTES, CONCURRENCY_EXPORT_ROUTES, SHED_RETRY_AFTER_SECONDS, NDJSON_MEDIA_TYPE
+
+# Сколько просроченных ключей удаляется за один запрос.
+EVICT_PER_REQUEST = 2
+
+
+class RateLimiter:
+
+    def __init__(self, rate: float, burst: int, max_keys: int = RATE_LIMIT_MAX_KEYS,
+                 timer: Callable[[], float] = time.monotonic):
+        self.interval = 1 / rate
+        self.tolerance = burst * self.interval
+        self.max_keys = max_keys
+        self.timer = timer
+        # Ключ -> момент, когда корзина снова полна. Порядок - по последнему обращению.
+        self._full_at: OrderedDict[str | bytes, float] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._full_at)
+
+    def acquire(self, key: str | bytes) -> float:
+        """Списывает токен. Возвращает 0, если запрос разрешён, иначе - через сколько секунд повторить."""
+        now = self.timer()
+        self._evict(now)
+
+        full_at = max(self._full_at.get(key, now), now) + self.interval
+        if full_at - now > self.tolerance:
+            return full_at - now - self.tolerance
+
+        self._full_at[key] = full_at
+        self._full_at.move_to_end(key)
+        if len(self._full_at) > self.max_keys:
+            self._full_at.popitem(last=False)
+        return 0.0
+
+    def _evict(self, now: float):
+        # Первым идёт ключ, к которому дольше всего не обращались: если его корзина ещё не полна,
+        # то у остальных, скорее всего, тоже.
+        for _ in range(EVICT_PER_REQUEST):
+            if not self._full_at:
+                return
+            key, full_at = next(iter(self._full_at.items()))
+            if full_at > now:
+                return
+            del self._full_at[key]
+
+
+class ConcurrencyLimit:
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self.rejected = 0
+
+
+def build_limiters(limits: dict[str, tuple[float, int]]) -> dict[str, RateLimiter]:
+    return {route: RateLimiter(rate, burst) for route, (rate, burst) in limits.items()}
+
+
+class RequestLimits:
+    """Лимиты частоты на пользователя и на IP по маршрутам и ограничения одновременных запросов по группам."""
+
+    def __init__(self,
+                 user_limits: dict[str, tuple[float, int]] = RATE_LIMITS_PER_USER,
+                 ip_limits: dict[str, tuple[float, int]] = RATE_LIMITS_PER_IP,
+                 concurrency_limits: dict[str, int] = CONCURRENCY_LIMITS,
+                 concurrency_routes: dict[str, str] = CONCURRENCY_ROUTES,
+                 export_routes: dict[str, str] = CONCURRENCY_EXPORT_ROUTES):
+        self.user_limiters = build_limiters(user_limits)
+        self.ip_limiters = build_limiters(ip_limits)
+        self.groups = {name: ConcurrencyLimit(limit) for name, limit in concurrency_limits.items()}
+        self.concurrency_routes = concurrency_routes
+        self.export_routes = export_routes
+
+    def check_rate(self, scope, path: str | None) -> float:
+        """0, если запрос укладывается в лимиты, иначе - через сколько секунд повторить."""
+        limiter = self.ip_limiters.get(path, self.ip_limiters.get("*"))
+        ip = get_client_ip(scope)
+        if limiter is not None and ip is not None:
+            retry_after = limiter.acquire(ip)
+            if retry_after:
+                return retry_after
+
+        limiter = self.user_limiters.get(path, self.user_limiters.get("*"))
+        user = get_user_key(scope) if limiter is not None else None
+        if user is not None:
+            return limiter.acquire(user)
+
+        return 0.0
+
+    def group(self, scope, path: str | None) -> ConcurrencyLimit | None:
+        if path in self.export_routes and is_ndjson_export(scope):
+            return self.groups.get(self.export_routes[path])
+        return self.groups.get(self.concurrency_routes.get(path))
+
+    def stats(self) -> dict:
+        stats = {"user_keys": sum(map(len, self.user_limiters.values())),
+                 "ip_keys": sum(map(len, self.ip_limiters.values()))}
+        for name, group in self.groups.items():
+            stats[f"{name}_active"] = group.active
+            stats[f"{name}_rejected"] = group.rejected
+        return stats
+
+
+request_limits = RequestLimits()
+
+
+class RateLimitMiddleware:
+    """
+        ASGI-мидлварь: лимиты на пользователя (по cookie auth_token) и на IP, затем ограничение
+        одновременных запросов для групп тяжёлых маршрутов. Отказ - 429 или 503 с Retry-After,
+        без чтения тела запроса.
+    """
+
+    def __init__(self, app, limits: RequestLimits = request_limits):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        route = match_route(scope)
+        path = route.path if route is not None else None
+
+        retry_after = self.limits.check_rate(scope, path)
+        if retry_after:
+            return await self.reject(scope, receive, send, route, 429, "Too many requests.", retry_after,
+                                     "rate_limit")
+
+        group = self.limits.group(scope, path)
+        if group is None:
+            return await self.app(scope, receive, send)
+
+        if group.active >= group.limit:
+            group.rejected += 1
+            return await self.reject(scope, receive, send, route, 503, "Server is busy, try again later.",
+                                     SHED_RETRY_AFTER_SECONDS, "overload")
+
+        group.active += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            group.active -= 1
+
+    async def reject(self, scope, receive, send, route, status: int, detail: str, retry_after: float, reason: str):
+        if route is not None:
+            # Чтобы MetricsMiddleware записала отказ под шаблоном маршрута.
+            scope["route"] = route
+        REQUESTS_REJECTED.labels(route.path if route is not None else "unmatched", reason).inc()
+
+        response = JSONResponse({"detail": detail}, status_code=status,
+                                headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+        await response(scope, receive, send)
+
+
+def match_route(scope):
+    """Маршрут приложения для запроса (роутер FastAPI ещё не отработал)."""
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route
+    return None
+
+
+def get_client_ip(scope) -> bytes | None:
+    """
+        IP клиента в упакованном виде (4 или 16 байт). X-Real-IP от nginx учитывается, только если
+        запрос пришёл из частной сети - иначе заголовок мог подставить сам клиент.
+    """
+    address = scope.get("client")[0] if scope.get("client") else None
+    try:
+        ip = ipaddress.ip_address(address)
+        if ip.is_private or ip.is_loopback:
+            for name, value in scope["headers"]:
+                if name == b"x-real-ip":
+                    ip = ipaddress.ip_address(value.decode("latin-1").strip())
+                    break
+        return ip.packed
+    except (TypeError, ValueError):
+        return None
+
+
+def is_ndjson_export(scope) -> bool:
+    """Так же, как выбирает формат /list: параметр format, а без него - заголовок Accept."""
+    formats = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("format")
+    if formats:
+        return formats[-1] == "ndjson"
+    return any(name == b"accept" and NDJSON_MEDIA_TYPE.encode() in value for name, value in scope["headers"])
+
+
+def get_user_key(scope) -> str | None:
+    for name, value in scope["headers"]:
+        if name != b"cookie":
+            continue
+        for cookie in value.decode("latin-1").split(";"):
+            cookie_name, _, token = cookie.strip().partition("=")
+            if cookie_name == "auth_token" and token:
+                try:
+                    return decode_jwt_cached(token).get("email")
+                except HTTPException:
+                    # Битый или просроченный токен - ограничиваем только по IP, ответ даст сам эндпоинт.
+                    return None
+    return None
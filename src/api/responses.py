@@ -0,0 +1,12 @@
+from pydantic import BaseModel
+from fastapi.responses import JSONResponse
+
+
+class PydanticJSONResponse(JSONResponse):
+    """
+        Отдаёт уже провалидированную pydantic-модель, сериализуя её сразу в JSON через pydantic-core.
+        Если эндпоинт возвращает Response, FastAPI не валидирует результат по response_model повторно.
+    """
+
+    def render(self, content: BaseModel) -> bytes:
+        return content.model_dump_json().encode()
@@ -1,12 +1,20 @@
-from typing import Literal
+import hmac
+
+from typing import Literal, Optional
 from pydantic import EmailStr
 from sqlalchemy.ext.asyncio import AsyncSession
-from fastapi import APIRouter, Form, File, UploadFile, Depends, Response, HTTPException, Request
+from fastapi import APIRouter, Form, File, UploadFile, Depends, Response, HTTPException, Request, Header, Query
 
-from src.api.utils import hash_password, add_watermark, encode_jwt
-from src.api.database import get_session
-from src.api.crud import create_client_db, create_match_db, get_current_user, get_client_by_email
-from src.api.schemas import CreateClientSchema, ClientSchema, LoginClientSchema, AuthTokenSchema
+from src.api.utils import hash_password, ingest_client_photo, encode_jwt
+from src.api.database import get_read_session, get_write_session
+from src.api.crud import create_client_db, create_match_db, create_matches_db, get_current_user, get_client_by_email, \
+    get_feed_db, get_nearest_clients_db
+from src.api.responses import PydanticJSONResponse
+from src.api.importer import import_clients, get_manifest_format
+from src.api.settings import ADMIN_TOKEN, LIST_PAGE_DEFAULT_LIMIT, LIST_PAGE_MAX_LIMIT, NEAREST_DEFAULT_LIMIT, \
+    NEAREST_MAX_LIMIT
+from src.api.schemas import CreateClientSchema, ClientSchema, LoginClientSchema, AuthTokenSchema, \
+    ImportReportSchema, BatchMatchSchema, BatchMatchResultSchema, FeedPageSchema, NearestClientsSchema
 
 
 router = APIRouter(prefix="/clients", tags=["Clients"])
@@ -22,12 +30,12 @@ async def create_client(
         latitude: float = Form(...),
         gender: Literal['male', 'female'] = Form(...),
         photo: UploadFile = File(...),
-        session: AsyncSession = Depends(get_session)) -> ClientSchema:
+        session: AsyncSession = Depends(get_write_session)) -> ClientSchema:
 
     client = CreateClientSchema(
         email=email,
         password=hash_password(password),
-        photo=None,
+        photo=await ingest_client_photo(photo),
         id=None,
         first_name=first_name,
         last_name=last_name,
@@ -36,17 +44,34 @@ async def create_client(
         gender=gender
     )
 
-    photo_w_wm = await add_watermark(photo)
-
-    client = await create_client_db(session, client, photo_w_wm)
+    client = await create_client_db(session, client)
 
     return client
 
 
+@router.post("/import", response_model=ImportReportSchema)
+async def import_clients_bulk(
+        manifest: UploadFile = File(...),
+        photos: UploadFile = File(...),
+        x_admin_token: str | None = Header(None)) -> ImportReportSchema:
+    """
+        Массовый импорт: манифест (CSV или JSONL) и zip-архив с фото. Доступен только с заголовком
+        X-Admin-Token. Ошибки отдельных строк возвращаются в отчёте, остальные строки импортируются.
+        Большие импорты удобнее запускать из консоли: python -m src.api.importer.
+    """
+    if not ADMIN_TOKEN or not hmac.compare_digest((x_admin_token or "").encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Admin token required.")
+
+    try:
+        return await import_clients(manifest.file, get_manifest_format(manifest.filename), photos.file)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.post("/login", response_model=AuthTokenSchema)
 async def login(login_payload: LoginClientSchema,
                 response: Response,
-                session: AsyncSession = Depends(get_session)) -> AuthTokenSchema:
+                session: AsyncSession = Depends(get_read_session)) -> AuthTokenSchema:
     """Эндпоинт авторизации клиента. По-хорошему он должен находится в отдельном сервисе."""
 
     client = await get_client_by_email(session, email=login_payload.email)
@@ -66,11 +91,74 @@ async def logout(response: Response):
     response.delete_cookie("auth_token")
 
 
+@router.post("/match/", response_model=BatchMatchResultSchema)
+async def match_batch(
+        payload: BatchMatchSchema,
+        request: Request,
+        session: AsyncSession = Depends(get_write_session)) -> BatchMatchResultSchema:
+    """Лайки сразу нескольким клиентам (например, накопленные свайпы). Результат - по каждой цели."""
+
+    current_user = await get_current_user(request, session)
+
+    return await create_matches_db(payload.target_ids, current_user, session)
+
+
+@router.get("/me/likes", response_model=FeedPageSchema)
+async def get_my_likes(
+        request: Request,
+        limit: int = Query(LIST_PAGE_DEFAULT_LIMIT, ge=1, le=LIST_PAGE_MAX_LIMIT),
+        cursor: Optional[str] = None,
+        session: AsyncSession = Depends(get_read_session)) -> PydanticJSONResponse:
+    """Кого лайкнул текущий пользователь, от новых к старым."""
+
+    current_user = await get_current_user(request, session)
+
+    return PydanticJSONResponse(await get_feed_db(session, "likes", current_user, limit, cursor))
+
+
+@router.get("/me/liked-by", response_model=FeedPageSchema)
+async def get_my_liked_by(
+        request: Request,
+        limit: int = Query(LIST_PAGE_DEFAULT_LIMIT, ge=1, le=LIST_PAGE_MAX_LIMIT),
+        cursor: Optional[str] = None,
+        session: AsyncSession = Depends(get_read_session)) -> PydanticJSONResponse:
+    """Кто лайкнул текущего пользователя, от новых к старым."""
+
+    current_user = await get_current_user(request, session)
+
+    return PydanticJSONResponse(await get_feed_db(session, "liked_by", current_user, limit, cursor))
+
+
+@router.get("/me/mutuals", response_model=FeedPageSchema)
+async def get_my_mutuals(
+        request: Request,
+        limit: int = Query(LIST_PAGE_DEFAULT_LIMIT, ge=1, le=LIST_PAGE_MAX_LIMIT),
+        cursor: Optional[str] = None,
+        session: AsyncSession = Depends(get_read_session)) -> PydanticJSONResponse:
+    """Взаимные симпатии текущего пользователя."""
+
+    current_user = await get_current_user(request, session)
+
+    return PydanticJSONResponse(await get_feed_db(session, "mutuals", current_user, limit, cursor))
+
+
+@router.get("/me/nearest", response_model=NearestClientsSchema)
+async def get_my_nearest(
+        request: Request,
+        limit: int = Query(NEAREST_DEFAULT_LIMIT, ge=1, le=NEAREST_MAX_LIMIT),
+        session: AsyncSession = Depends(get_read_session)) -> PydanticJSONResponse:
+    """Ближайшие к текущему пользователю клиенты, по возрастанию расстояния (distance - в км)."""
+
+    current_user = await get_current_user(request, session)
+
+    return PydanticJSONResponse(await get_nearest_clients_db(session, current_user, limit))
+
+
 @router.post("/{id}/match/")
 async def match(
         id: int,
         request: Request,
-        session: AsyncSession = Depends(get_session)) -> dict:
+        session: AsyncSession = Depends(get_write_session)) -> dict:
 
     current_user = await get_current_user(request, session)
 
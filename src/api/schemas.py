@@ -1,5 +1,8 @@
-from typing import Literal
-from pydantic import EmailStr, BaseModel
+from typing import List, Literal
+from datetime import datetime
+from pydantic import EmailStr, BaseModel, TypeAdapter, Field
+
+from src.api.settings import MATCH_BATCH_MAX_SIZE
 
 
 class ClientSchema(BaseModel):
@@ -18,11 +21,124 @@ class ClientSchema(BaseModel):
         from_attributes = True
 
 
+class ClientRowSchema(ClientSchema):
+
+    """
+        Строка /list, прочитанная из БД. Email уже проверен как EmailStr при регистрации,
+        а повторная проверка через email_validator - основная часть CPU на сериализацию страницы.
+    """
+
+    email: str
+
+
+# Валидация целой страницы строк за один вызов pydantic-core.
+client_list_adapter = TypeAdapter(List[ClientRowSchema])
+
+
+class FeedItemSchema(ClientRowSchema):
+
+    """Клиент в ленте лайков; matched_at - время лайка, по которому лента отсортирована."""
+
+    matched_at: datetime
+
+
+class FeedPageSchema(BaseModel):
+
+    items: List[FeedItemSchema]
+    next_cursor: str | None
+
+
+feed_item_adapter = TypeAdapter(List[FeedItemSchema])
+
+
+class NearestClientSchema(ClientRowSchema):
+
+    """Клиент из /clients/me/nearest; distance - расстояние до текущего пользователя в км."""
+
+    distance: float
+
+
+class NearestClientsSchema(BaseModel):
+
+    items: List[NearestClientSchema]
+
+
+nearest_client_adapter = TypeAdapter(List[NearestClientSchema])
+
+
 class CreateClientSchema(ClientSchema):
 
     password: str
 
 
+class ImportClientSchema(BaseModel):
+
+    """Строка манифеста массового импорта. photo - имя файла внутри архива с фото."""
+
+    # EmailStr пропускает до 254 символов, а client.email - String(64): длинный email должен стать
+    # ошибкой строки, а не ошибкой многострочного INSERT всей пачки.
+    email: EmailStr = Field(max_length=64)
+    password: str = Field(min_length=1)
+    first_name: str = Field(max_length=64)
+    last_name: str = Field(max_length=64)
+    gender: Literal["male", "female"]
+    longitude: float = Field(ge=-180, le=180)
+    latitude: float = Field(ge=-90, le=90)
+    photo: str
+
+
+class ImportFailureSchema(BaseModel):
+
+    row: int
+    email: str | None
+    error: str
+
+
+class ImportReportSchema(BaseModel):
+
+    total: int = 0
+    imported: int = 0
+    failed: int = 0
+    failures: List[ImportFailureSchema] = []
+
+
+class BatchMatchSchema(BaseModel):
+
+    target_ids: List[int] = Field(min_length=1, max_length=MATCH_BATCH_MAX_SIZE)
+
+
+class MatchResultSchema(BaseModel):
+
+    target_id: int
+    status: Literal["matched", "mutual", "already_matched", "limit_reached", "not_found", "self"]
+    target_email: str | None = None
+
+
+class BatchMatchResultSchema(BaseModel):
+
+    results: List[MatchResultSchema]
+
+
+class CurrentUserSchema(BaseModel):
+
+    """Поля авторизованного пользователя, которые нужны горячим путям (без хеша пароля)."""
+
+    id: int
+    email: EmailStr
+    first_name: str | None
+    longitude: float | None
+    latitude: float | None
+
+    class Config:
+        from_attributes = True
+
+
+class ClientPageSchema(BaseModel):
+
+    items: List[ClientSchema]
+    next_cursor: str | None
+
+
 class LoginClientSchema(BaseModel):
 
     email: EmailStr
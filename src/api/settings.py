@@ -8,12 +8,30 @@ load_dotenv()
 # DATABASE_URL: str = f"postgresql+asyncpg://{os.getenv("PG_NAME")}:{os.getenv("PG_PASSWORD")}@ \
 #                      {os.getenv("PG_HOST")}:{os.getenv("PG_PORT")}/{os.getenv("PG_DB_NAME")}"
 DATABASE_URL: str = os.getenv("DATABASE_URL")
-print(DATABASE_URL)
 DATABASE_ECHO: bool = False
+# Реплики только для чтения через запятую. Пусто - всё читается с основной базы.
+DATABASE_REPLICA_URLS: list[str] = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",")
+                                    if url.strip()]
+DATABASE_POOL_SIZE: int = int(os.getenv("DATABASE_POOL_SIZE", 5))
+DATABASE_MAX_OVERFLOW: int = int(os.getenv("DATABASE_MAX_OVERFLOW", 10))
+# Пул каждой реплики (реплик обычно несколько, а чтений больше, чем записей).
+DATABASE_REPLICA_POOL_SIZE: int = int(os.getenv("DATABASE_REPLICA_POOL_SIZE", 5))
+DATABASE_REPLICA_MAX_OVERFLOW: int = int(os.getenv("DATABASE_REPLICA_MAX_OVERFLOW", 10))
+DATABASE_POOL_PRE_PING: bool = os.getenv("DATABASE_POOL_PRE_PING", "1") == "1"
+DATABASE_POOL_RECYCLE_SECONDS: int = int(os.getenv("DATABASE_POOL_RECYCLE_SECONDS", 1800))
+# Кэш подготовленных выражений asyncpg на соединение. За pgbouncer в режиме transaction нужно 0.
+DATABASE_STATEMENT_CACHE_SIZE: int = int(os.getenv("DATABASE_STATEMENT_CACHE_SIZE", 100))
+# После записи клиент столько секунд читает с основной базы (cookie), чтобы видеть свои изменения
+# несмотря на отставание реплик.
+READ_YOUR_WRITES_SECONDS: int = int(os.getenv("READ_YOUR_WRITES_SECONDS", 5))
+READ_PRIMARY_COOKIE: str = "read_primary"
 
 
 ALGORITHM: str = "RS256"
 ACCESS_TOKEN_LIFE_TIME_MINUTES: int = 60
+TOKEN_CACHE_MAXSIZE: int = 10000
+USER_CACHE_MAXSIZE: int = 10000
+USER_CACHE_TTL_SECONDS: int = 300
 
 
 def get_private_key() -> str:
@@ -31,9 +49,159 @@ public_key = get_public_key()
 
 
 DAILY_LIKE_LIMIT = 5
+MATCH_BATCH_MAX_SIZE: int = 100
+
+# Таблица match секционирована по месяцам time_created. Фоновое обслуживание заранее создаёт секции
+# на MATCH_PARTITIONS_AHEAD_MONTHS месяцев вперёд, удаляет секции старше MATCH_RETENTION_MONTHS (0 - хранить всё)
+# и строки счётчика daily_likes старше DAILY_LIKES_RETENTION_DAYS дней.
+PARTITION_MAINTENANCE_ENABLED: bool = os.getenv('PARTITION_MAINTENANCE_ENABLED', '1') == '1'
+PARTITION_MAINTENANCE_INTERVAL_SECONDS: float = 3600.0
+MATCH_PARTITIONS_AHEAD_MONTHS: int = 2
+MATCH_RETENTION_MONTHS: int = int(os.getenv('MATCH_RETENTION_MONTHS', 0))
+DAILY_LIKES_RETENTION_DAYS: int = 7
+
+
+LIST_PAGE_DEFAULT_LIMIT: int = 50
+LIST_PAGE_MAX_LIMIT: int = 500
+LIST_CACHE_MAXSIZE: int = 100
+LIST_CACHE_TTL_SECONDS: int = 60
+NAME_SEARCH_MAX_RESULTS: int = 100
+# Сколько строк за раз забирается из серверного курсора при выгрузке /list в NDJSON.
+NDJSON_CHUNK_SIZE: int = 1000
+# max-age анонимных ответов /list: столько nginx и браузеры отдают страницу без перепроверки ETag.
+LIST_HTTP_MAX_AGE_SECONDS: int = 5
+NEAREST_DEFAULT_LIMIT: int = 20
+NEAREST_MAX_LIMIT: int = 100
+
+# Колоночный снимок таблицы client в памяти воркера (src/api/snapshot.py): /list и /clients/me/nearest
+# считаются на NumPy без запросов к базе. Снимок догружает изменения раз в CLIENT_SNAPSHOT_REFRESH_SECONDS.
+CLIENT_SNAPSHOT_ENABLED: bool = os.getenv('CLIENT_SNAPSHOT_ENABLED', '0') == '1'
+CLIENT_SNAPSHOT_REFRESH_SECONDS: float = float(os.getenv('CLIENT_SNAPSHOT_REFRESH_SECONDS', 5.0))
+# Дельта перечитывает строки с запасом: транзакция могла закоммититься позже, чем началась.
+CLIENT_SNAPSHOT_DELTA_OVERLAP_SECONDS: float = 60.0
+# Строк за раз при загрузке: обработка пачки блокирует event loop на единицы миллисекунд.
+CLIENT_SNAPSHOT_CHUNK_SIZE: int = 2000
+# Размер ячейки сетки для поиска по расстоянию, в градусах.
+CLIENT_SNAPSHOT_GRID_DEGREES: float = 0.25
 
 
 SENDER_EMAIL = os.getenv('SENDER_EMAIL')
 SENDER_PASSWORD = os.getenv('SENDER_PASSWORD')
 SMTP_SERVER = os.getenv('SMTP_SERVER')
 SMTP_PORT = os.getenv('SMTP_PORT')
+
+PHOTO_STORAGE_DIR: str = "client_photos"
+PHOTO_URL_PREFIX: str = "/static"
+# Число процессов uvicorn (--workers). У каждого свой пул обработки фото, поэтому ядра делятся между ними.
+WEB_WORKERS: int = int(os.getenv('WEB_WORKERS', 1))
+PHOTO_WORKERS: int = int(os.getenv('PHOTO_WORKERS', max(1, (os.cpu_count() or 1) // WEB_WORKERS)))
+PHOTO_QUEUE_SIZE: int = int(os.getenv('PHOTO_QUEUE_SIZE', PHOTO_WORKERS * 2))
+PHOTO_QUEUE_TIMEOUT_SECONDS: float = 10.0
+# Варианты фото: имя -> максимальная сторона в пикселях. "full" сохраняется под основным путём.
+PHOTO_VARIANTS: dict[str, int] = {"full": 2560, "medium": 1024, "thumb": 256}
+PHOTO_WEBP: bool = os.getenv('PHOTO_WEBP', '0') == '1'
+PHOTO_JPEG_QUALITY: int = 85
+PHOTO_FONT_PATHS: tuple[str, ...] = ("arial.ttf", "DejaVuSans.ttf")
+PHOTO_FONT_SIZE: int = 36
+# Загрузка фото в /clients/create: тело запроса обрывается на лимите, формат и размеры проверяются
+# по заголовку файла, файл спулится на диск и попадает в хранилище через os.replace.
+PHOTO_MAX_BYTES: int = int(os.getenv('PHOTO_MAX_BYTES', 10 * 1024 * 1024))
+# Запас на остальные поля формы и заголовки частей multipart.
+UPLOAD_FORM_OVERHEAD_BYTES: int = 64 * 1024
+UPLOAD_BODY_LIMITS: dict[str, int] = {"/clients/create": PHOTO_MAX_BYTES + UPLOAD_FORM_OVERHEAD_BYTES}
+PHOTO_FORMATS: tuple[str, ...] = ("JPEG", "PNG", "WEBP")
+# Декодированное фото занимает 3 байта на пиксель: 40 Мп - около 120 МБ в процессе-воркере.
+PHOTO_MAX_PIXELS: int = 40_000_000
+# Временные файлы лежат в том же томе, что и фото, чтобы os.replace был переименованием, а не копированием.
+PHOTO_SPOOL_DIR: str = os.path.join(PHOTO_STORAGE_DIR, ".incoming")
+PHOTO_CHUNK_SIZE: int = 256 * 1024
+
+
+# Сброс кэшей во всех воркерах через Postgres LISTEN/NOTIFY.
+CACHE_INVALIDATION_ENABLED: bool = os.getenv('CACHE_INVALIDATION_ENABLED', '1') == '1'
+CACHE_INVALIDATION_CHANNEL: str = "cache_invalidation"
+CACHE_INVALIDATION_RECONNECT_SECONDS: float = 1.0
+
+
+EMAIL_WORKER_ENABLED: bool = os.getenv('EMAIL_WORKER_ENABLED', '1') == '1'
+EMAIL_BATCH_SIZE: int = 50
+EMAIL_POLL_INTERVAL_SECONDS: float = 5.0
+EMAIL_MAX_ATTEMPTS: int = 8
+EMAIL_RETRY_BASE_SECONDS: float = 30.0
+EMAIL_RETRY_MAX_SECONDS: float = 3600.0
+SMTP_IDLE_TIMEOUT_SECONDS: float = 30.0
+
+
+# Массовый импорт клиентов (POST /clients/import и python -m src.api.importer).
+ADMIN_TOKEN: str | None = os.getenv('ADMIN_TOKEN')
+# Строк в одном INSERT: 8 колонок на строку при лимите Postgres в 32767 параметров на запрос.
+IMPORT_BATCH_SIZE: int = 2000
+IMPORT_MAX_PHOTO_BYTES: int = 20 * 1024 * 1024
+
+
+# Ограничение частоты запросов (src/api/ratelimit.py). Лимиты действуют в каждом воркере отдельно.
+RATE_LIMIT_ENABLED: bool = os.getenv('RATE_LIMIT_ENABLED', '1') == '1'
+# Шаблон маршрута -> (запросов в секунду, всплеск). "*" - для маршрутов, которых нет в словаре.
+RATE_LIMITS_PER_USER: dict[str, tuple[float, int]] = {
+    "/list": (5, 20),
+    "/clients/create": (0.1, 3),
+    "/clients/login": (0.5, 5),
+    "/clients/{id}/match/": (2, 10),
+    "/clients/match/": (0.5, 5),
+    "*": (10, 30),
+}
+# На IP лимиты выше: за одним адресом (NAT, офис) бывает много пользователей.
+RATE_LIMITS_PER_IP: dict[str, tuple[float, int]] = {
+    "/list": (20, 60),
+    "/clients/create": (0.5, 10),
+    "/clients/login": (2, 20),
+    "*": (50, 100),
+}
+# Сколько ключей (пользователей или IP) помнит один лимит; сверх этого забываются давно не приходившие.
+RATE_LIMIT_MAX_KEYS: int = 100_000
+# Группа -> сколько запросов группы воркер обрабатывает одновременно; лишние сразу получают 503.
+CONCURRENCY_LIMITS: dict[str, int] = {
+    "photo": PHOTO_QUEUE_SIZE * 2,
+    "import": 1,
+    "db": DATABASE_POOL_SIZE + DATABASE_MAX_OVERFLOW,
+    # Выгрузка NDJSON держит соединение, пока не отдаст всю таблицу, - отдельно от "db" и понемногу.
+    "export": int(os.getenv('NDJSON_EXPORT_CONCURRENCY', 2)),
+}
+CONCURRENCY_ROUTES: dict[str, str] = {
+    "/clients/create": "photo",
+    "/clients/import": "import",
+    "/list": "db",
+    "/clients/me/likes": "db",
+    "/clients/me/liked-by": "db",
+    "/clients/me/mutuals": "db",
+    "/clients/me/nearest": "db",
+    "/clients/match/": "db",
+}
+# Группа для тех же маршрутов, когда запрошена выгрузка в NDJSON (format=ndjson или Accept).
+CONCURRENCY_EXPORT_ROUTES: dict[str, str] = {
+    "/list": "export",
+}
+NDJSON_MEDIA_TYPE: str = "application/x-ndjson"
+SHED_RETRY_AFTER_SECONDS: int = 1
+
+
+# Запрос, выполнивший больше SQL-запросов, пишется в лог как предупреждение (признак N+1).
+METRICS_QUERY_WARN_THRESHOLD: int = int(os.getenv('METRICS_QUERY_WARN_THRESHOLD', 20))
+# Одинаковый (с точностью до параметров) SQL-запрос, выполненный в одном HTTP-запросе столько раз и больше,
+# считается N+1: предупреждение в лог и метрика db_repeated_queries_requests_total.
+METRICS_REPEATED_QUERY_THRESHOLD: int = int(os.getenv('METRICS_REPEATED_QUERY_THRESHOLD', 5))
+
+
+# Профилирование отдельных запросов (src/api/profiling.py). Профиль снимается для запроса с заголовком
+# PROFILE_TOKEN_HEADER (токен из python -m src.api.profiling token) или для N следующих запросов к маршруту
+# после POST /debug/profile. Профили пишутся в PROFILE_DIR.
+PROFILING_ENABLED: bool = os.getenv('PROFILING_ENABLED', '0') == '1'
+PROFILE_DIR: str = os.getenv('PROFILE_DIR', '/tmp/profiles')
+PROFILE_TOKEN_HEADER: str = "x-profile-token"
+PROFILE_TOKEN_SCOPE: str = "profile"
+PROFILE_SAMPLE_INTERVAL_SECONDS: float = 0.001
+# Сторож event loop: если цикл не отвечает дольше порога, в лог пишется стек, на котором он завис
+# (синхронный hash_password, Pillow и т.п.).
+LOOP_MONITOR_ENABLED: bool = os.getenv('LOOP_MONITOR_ENABLED', os.getenv('PROFILING_ENABLED', '0')) == '1'
+LOOP_BLOCK_THRESHOLD_SECONDS: float = float(os.getenv('LOOP_BLOCK_THRESHOLD_SECONDS', 0.1))
+LOOP_MONITOR_INTERVAL_SECONDS: float = 0.02
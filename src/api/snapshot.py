@@ -0,0 +1,497 @@
+"""
+    Колоночный снимок таблицы client в памяти воркера (включается CLIENT_SNAPSHOT_ENABLED).
+    Фильтры /list считаются масками NumPy, расстояние - векторным гаверсинусом по кандидатам
+    из сетки по широте и долготе, "ближайшие ко мне" - расширяющимся радиусом по той же сетке.
+
+    Строки хранятся отсортированными по (time_created, id), как отдаёт /list, поэтому страница -
+    первые limit + 1 позиций маски, а курсор - бинарный поиск. Имена и пол хранятся словарными
+    кодами, email и путь к фото - в StringDType. На 1М клиентов из benchmarks.dataset снимок занимает
+    около 210 байт на клиента: ~90 - массивы (с запасом ёмкости и сеткой), остальное - строки email
+    и пути к фото (python -m benchmarks.bench_snapshot).
+
+    Снимок догружается дельтами по time_created/time_updated раз в CLIENT_SNAPSHOT_REFRESH_SECONDS
+    и сразу после сброса кэша списка (своя регистрация, импорт, NOTIFY от других воркеров).
+    Удаление клиентов в сервисе не предусмотрено, поэтому дельты его не учитывают.
+"""
+import math
+import asyncio
+import logging
+
+import numpy as np
+
+from typing import Iterable
+from numpy.dtypes import StringDType
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, or_, Select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from src.api.models import Client, table_version
+from src.api.database import async_session
+from src.api.schemas import ClientPageSchema, CurrentUserSchema, NearestClientSchema, client_list_adapter, \
+    nearest_client_adapter
+from src.api.utils import EARTH_RADIUS_KM, get_bounding_box, require_location, encode_cursor, decode_cursor
+from src.api.settings import LIST_PAGE_DEFAULT_LIMIT, CLIENT_SNAPSHOT_REFRESH_SECONDS, \
+    CLIENT_SNAPSHOT_DELTA_OVERLAP_SECONDS, CLIENT_SNAPSHOT_CHUNK_SIZE, CLIENT_SNAPSHOT_GRID_DEGREES
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+COLUMNS = {
+    "id": np.int32,
+    "latitude": np.float64,
+    "longitude": np.float64,
+    "time_created": np.int64,
+    "gender": np.int16,
+    "first_name": np.int32,
+    "last_name": np.int32,
+    "email": StringDType(na_object=None),
+    "photo": StringDType(na_object=None),
+}
+SNAPSHOT_COLUMNS = (Client.id, Client.email, Client.first_name, Client.last_name, Client.gender, Client.photo,
+                    Client.longitude, Client.latitude, Client.time_created, Client.time_updated)
+# Строки, добавленные после построения сетки, проверяются перебором, пока их не больше стольких.
+GRID_TAIL_MAX = 10_000
+NEAREST_START_RADIUS_KM = 10.0
+SCAN_BLOCK_SIZE = 65536
+
+
+def to_microseconds(value: datetime) -> int:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def from_microseconds(value: int) -> datetime:
+    return EPOCH + timedelta(microseconds=int(value))
+
+
+def np_calculate_distance(lat1: float, lon1: float, lat2: np.ndarray, lon2: np.ndarray) -> np.ndarray:
+    """Та же формула гаверсинуса, что и в calculate_distance, но над массивами координат."""
+
+    lat1_rad = math.radians(lat1)
+    lat2_rad = np.radians(lat2)
+    dlat = lat2_rad - lat1_rad
+    dlon = np.radians(lon2) - math.radians(lon1)
+
+    a = np.sin(dlat / 2) ** 2 + math.cos(lat1_rad) * np.cos(lat2_rad) * np.sin(dlon / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(np.maximum(1 - a, 0.0)))
+
+    return EARTH_RADIUS_KM * c
+
+
+class Vocabulary:
+
+    """Словарное кодирование строк: каждое значение хранится один раз, в колонке - его код (-1 - NULL)."""
+
+    def __init__(self):
+        self.values: list[str] = []
+        self.codes: dict[str, int] = {}
+        self._lower: np.ndarray | None = None
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def encode(self, value: str | None) -> int:
+        if value is None:
+            return -1
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+            self._lower = None
+        return code
+
+    def decode(self, code: int) -> str | None:
+        return self.values[code] if code >= 0 else None
+
+    def matching(self, substring: str) -> np.ndarray:
+        """
+            Код -> содержит ли значение substring без учёта регистра (как ILIKE '%...%').
+            Последний элемент (индекс -1) - NULL, он не совпадает ни с чем.
+        """
+        if self._lower is None:
+            self._lower = np.array([value.lower() for value in self.values], dtype=StringDType())
+        return np.append(np.strings.find(self._lower, substring.lower()) >= 0, False)
+
+
+class ClientSnapshot:
+
+    def __init__(self, session_factory: async_sessionmaker = async_session,
+                 refresh_interval: float = CLIENT_SNAPSHOT_REFRESH_SECONDS,
+                 grid_degrees: float = CLIENT_SNAPSHOT_GRID_DEGREES):
+        self.session_factory = session_factory
+        self.refresh_interval = refresh_interval
+        self.grid_degrees = grid_degrees
+        self.grid_rows = math.ceil(180 / grid_degrees)
+        self.grid_cols = math.ceil(360 / grid_degrees)
+
+        self.size = 0
+        self.columns = {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS.items()}
+        # id -> позиция строки в колонках (-1 - такого клиента нет).
+        self.positions = np.empty(0, dtype=np.int32)
+        self.names = Vocabulary()
+        self.genders = Vocabulary()
+        # Самое позднее time_created/time_updated среди загруженных строк, в микросекундах.
+        self.watermark: int | None = None
+        # Версия таблицы (table_version), прочитанная перед последней загрузкой: снимок не старее её.
+        self.version = 0
+        # Сколько раз снимок менялся через apply() после смены version (регистрации в этом воркере):
+        # содержимое уже другое, а version - ещё нет, поэтому в ETag идут оба числа.
+        self.local_changes = 0
+        self.ready = False
+
+        # Позиции клиентов с координатами, сгруппированные по ячейкам сетки, и начало каждой ячейки.
+        self._grid_positions: np.ndarray | None = None
+        self._grid_starts: np.ndarray | None = None
+        self._grid_size = 0
+
+        self._task: asyncio.Task | None = None
+        self._wake = asyncio.Event()
+
+        self.refreshes = 0
+        self.applied = 0
+        self.grid_builds = 0
+
+    def column(self, name: str) -> np.ndarray:
+        return self.columns[name][:self.size]
+
+    def apply(self, rows: Iterable) -> int:
+        """Добавляет новые строки и обновляет уже известные (по id). Строки - Row или Client."""
+        applied = self._merge(rows)
+        if applied:
+            self.local_changes += 1
+        return applied
+
+    def _merge(self, rows: Iterable) -> int:
+        rows = list(rows)
+        if not rows:
+            return 0
+
+        changed = to_microseconds(max(row.time_updated or row.time_created for row in rows))
+        if self.watermark is None or changed > self.watermark:
+            self.watermark = changed
+
+        ids = np.fromiter((row.id for row in rows), dtype=np.int64, count=len(rows))
+        positions = np.full(len(rows), -1, dtype=np.int64)
+        known = ids < len(self.positions)
+        positions[known] = self.positions[ids[known]]
+
+        for index in np.flatnonzero(positions >= 0).tolist():
+            self._update(int(positions[index]), rows[index])
+        if (positions < 0).any():
+            self._append([rows[index] for index in np.flatnonzero(positions < 0).tolist()])
+
+        self.applied += len(rows)
+        return len(rows)
+
+    def _update(self, position: int, row):
+        columns = self.columns
+        latitude = np.nan if row.latitude is None else row.latitude
+        longitude = np.nan if row.longitude is None else row.longitude
+        moved = not (np.array_equal([columns["latitude"][position], columns["longitude"][position]],
+                                    [latitude, longitude], equal_nan=True))
+        if moved and position < self._grid_size:
+            self._grid_positions = None
+
+        columns["latitude"][position] = latitude
+        columns["longitude"][position] = longitude
+        columns["gender"][position] = self.genders.encode(row.gender)
+        columns["first_name"][position] = self.names.encode(row.first_name)
+        columns["last_name"][position] = self.names.encode(row.last_name)
+        columns["email"][position] = row.email
+        columns["photo"][position] = row.photo
+
+    def _append(self, rows: list):
+        start, end = self.size, self.size + len(rows)
+        self._reserve(end)
+
+        columns = self.columns
+        columns["id"][start:end] = [row.id for row in rows]
+        columns["latitude"][start:end] = [np.nan if row.latitude is None else row.latitude for row in rows]
+        columns["longitude"][start:end] = [np.nan if row.longitude is None else row.longitude for row in rows]
+        columns["time_created"][start:end] = [to_microseconds(row.time_created) for row in rows]
+        columns["gender"][start:end] = [self.genders.encode(row.gender) for row in rows]
+        columns["first_name"][start:end] = [self.names.encode(row.first_name) for row in rows]
+        columns["last_name"][start:end] = [self.names.encode(row.last_name) for row in rows]
+        columns["email"][start:end] = [row.email for row in rows]
+        columns["photo"][start:end] = [row.photo for row in rows]
+        self.size = end
+
+        max_id = int(columns["id"][start:end].max())
+        if max_id >= len(self.positions):
+            positions = np.full(max(max_id + 1, len(self.positions) * 2), -1, dtype=np.int32)
+            positions[:len(self.positions)] = self.positions
+            self.positions = positions
+
+        self._sort_tail(start)
+
+    def _reserve(self, capacity: int):
+        current = len(self.columns["id"])
+        if capacity <= current:
+            return
+        capacity = max(capacity, current * 2, 1024)
+        for name, dtype in COLUMNS.items():
+            column = np.empty(capacity, dtype=dtype)
+            column[:self.size] = self.columns[name][:self.size]
+            self.columns[name] = column
+
+    def _sort_tail(self, old_size: int):
+        """
+            Восстанавливает порядок (time_created, id) после добавления строк с позиции old_size.
+            Новые клиенты почти всегда новее остальных, поэтому пересортировывается только хвост
+            от места, куда попадает самая ранняя из новых строк.
+        """
+        times, ids = self.column("time_created"), self.column("id")
+        start = int(np.searchsorted(times[:old_size], times[old_size:].min(), side="left"))
+
+        order = np.lexsort((ids[start:], times[start:]))
+        if not np.array_equal(order, np.arange(len(order))):
+            for column in self.columns.values():
+                column[start:self.size] = column[start:self.size][order]
+            if start < self._grid_size:
+                self._grid_positions = None
+
+        self.positions[ids[start:]] = np.arange(start, self.size, dtype=np.int32)
+
+    def _grid_row(self, latitude: np.ndarray) -> np.ndarray:
+        return np.clip(((latitude + 90) // self.grid_degrees).astype(np.int64), 0, self.grid_rows - 1)
+
+    def _grid_col(self, longitude: np.ndarray) -> np.ndarray:
+        return np.clip(((longitude + 180) // self.grid_degrees).astype(np.int64), 0, self.grid_cols - 1)
+
+    def _build_grid(self):
+        latitude, longitude = self.column("latitude"), self.column("longitude")
+        located = np.flatnonzero(~(np.isnan(latitude) | np.isnan(longitude)))
+        cells = self._grid_row(latitude[located]) * self.grid_cols + self._grid_col(longitude[located])
+        order = np.argsort(cells, kind="stable")
+
+        self._grid_positions = located[order].astype(np.int32)
+        self._grid_starts = np.searchsorted(cells[order], np.arange(self.grid_rows * self.grid_cols + 1)).astype(np.int32)
+        self._grid_size = self.size
+        self.grid_builds += 1
+
+    def _candidates(self, latitude: float, longitude: float, distance: float) -> np.ndarray:
+        """Позиции клиентов, которые могут быть ближе distance км: ячейки ограничивающего прямоугольника."""
+        if self._grid_positions is None or self.size - self._grid_size > GRID_TAIL_MAX:
+            self._build_grid()
+
+        min_lat, max_lat, lon_ranges = get_bounding_box(latitude, longitude, distance)
+        first_row, last_row = self._grid_row(np.array([min_lat, max_lat])).tolist()
+        starts = self._grid_starts
+
+        if not lon_ranges:
+            # По долготе не ограничено - ячейки строк сетки с first_row по last_row идут подряд.
+            parts = [self._grid_positions[starts[first_row * self.grid_cols]:
+                                          starts[(last_row + 1) * self.grid_cols]]]
+        else:
+            parts = []
+            col_ranges = [self._grid_col(np.array(lon_range)).tolist() for lon_range in lon_ranges]
+            for row in range(first_row, last_row + 1):
+                offset = row * self.grid_cols
+                for first_col, last_col in col_ranges:
+                    parts.append(self._grid_positions[starts[offset + first_col]:starts[offset + last_col + 1]])
+
+        tail = np.arange(self._grid_size, self.size)
+        parts.append(tail[~np.isnan(self.columns["latitude"][tail]) & ~np.isnan(self.columns["longitude"][tail])])
+
+        return np.concatenate(parts)
+
+    def within(self, latitude: float, longitude: float, distance: float) -> tuple[np.ndarray, np.ndarray]:
+        """Позиции клиентов не дальше distance км и расстояния до них."""
+        candidates = self._candidates(latitude, longitude, distance)
+        distances = np_calculate_distance(latitude, longitude, self.columns["latitude"][candidates],
+                                          self.columns["longitude"][candidates])
+        keep = distances <= distance
+        return candidates[keep], distances[keep]
+
+    def supports(self, **kwargs) -> bool:
+        # Триграммный поиск и выборка по email остаются в базе.
+        return self.ready and not kwargs.get('search') and not kwargs.get('email')
+
+    def query_clients(self, sort_order: str | None, current_user: CurrentUserSchema | None,
+                      **kwargs) -> ClientPageSchema:
+        """То же, что query_clients_db, но по снимку."""
+        limit = kwargs.get('limit') or LIST_PAGE_DEFAULT_LIMIT
+        times, ids = self.column("time_created"), self.column("id")
+
+        # Курсор сужает диапазон позиций до маски: строки отсортированы по (time_created, id).
+        begin, end = 0, self.size
+        if kwargs.get('cursor'):
+            time_created, client_id = decode_cursor(kwargs['cursor'])
+            time_created = to_microseconds(time_created)
+            low, high = np.searchsorted(times, [time_created, time_created + 1])
+            side = "left" if sort_order == "desc" else "right"
+            position = int(low + np.searchsorted(ids[low:high], client_id, side=side))
+            if sort_order == "desc":
+                end = position
+            else:
+                begin = position
+
+        # Условия - функции (lo, hi) -> маска строк [lo, hi).
+        conditions = []
+        if kwargs.get('gender'):
+            gender = self.genders.codes.get(kwargs['gender'], -2)
+            conditions.append(lambda lo, hi: self.columns["gender"][lo:hi] == gender)
+        for name in ("first_name", "last_name"):
+            if kwargs.get(name):
+                conditions.append(lambda lo, hi, name=name, hits=self.names.matching(kwargs[name]):
+                                  hits[self.columns[name][lo:hi]])
+        if kwargs.get('time_created'):
+            time_created = to_microseconds(kwargs['time_created'])
+            conditions.append(lambda lo, hi: times[lo:hi] == time_created)
+        if kwargs.get('distance'):
+            latitude, longitude = require_location(current_user)
+            nearby = np.zeros(self.size, dtype=bool)
+            nearby[self.within(latitude, longitude, kwargs['distance'])[0]] = True
+            conditions.append(lambda lo, hi: nearby[lo:hi])
+
+        page = self.scan(conditions, begin, end, limit + 1, reverse=sort_order == "desc")
+
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            next_cursor = encode_cursor(from_microseconds(times[page[-1]]), int(ids[page[-1]]))
+
+        return ClientPageSchema.model_construct(items=client_list_adapter.validate_python(self.rows(page)),
+                                                next_cursor=next_cursor)
+
+    def scan(self, conditions: list, begin: int, end: int, count: int, reverse: bool) -> np.ndarray:
+        """
+            Первые count позиций из [begin, end), где выполнены все условия. Маски считаются блоками
+            по SCAN_BLOCK_SIZE строк, поэтому для нефильтрующих запросов просматривается начало таблицы,
+            а не вся она.
+        """
+        if not conditions:
+            if reverse:
+                return np.arange(end - 1, max(begin, end - count) - 1, -1)
+            return np.arange(begin, min(end, begin + count))
+
+        found = []
+        total = 0
+        blocks = range(begin, end, SCAN_BLOCK_SIZE)
+        for lo in reversed(blocks) if reverse else blocks:
+            hi = min(lo + SCAN_BLOCK_SIZE, end)
+            positions = np.flatnonzero(np.logical_and.reduce([condition(lo, hi) for condition in conditions])) + lo
+            if reverse:
+                positions = positions[::-1]
+            found.append(positions[:count - total])
+            total += len(found[-1])
+            if total >= count:
+                break
+
+        return np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+
+    def nearest_clients(self, current_user: CurrentUserSchema | None, limit: int) -> list[NearestClientSchema]:
+        """
+            limit ближайших к текущему пользователю клиентов (кроме него самого). Радиус растёт,
+            пока в нём не наберётся limit клиентов: всё, что вне радиуса, заведомо дальше.
+        """
+        latitude, longitude = require_location(current_user)
+
+        radius = NEAREST_START_RADIUS_KM
+        while True:
+            positions, distances = self.within(latitude, longitude, radius)
+            others = self.columns["id"][positions] != current_user.id
+            positions, distances = positions[others], distances[others]
+            if len(positions) >= limit or radius >= math.pi * EARTH_RADIUS_KM:
+                break
+            radius *= 4
+
+        order = np.lexsort((self.columns["id"][positions], distances))[:limit]
+        rows = self.rows(positions[order])
+        for row, distance in zip(rows, distances[order].tolist()):
+            row["distance"] = distance
+
+        return nearest_client_adapter.validate_python(rows)
+
+    def rows(self, positions: np.ndarray) -> list[dict]:
+        columns = self.columns
+        names, genders = self.names.decode, self.genders.decode
+        return [
+            {"id": id, "email": email, "first_name": names(first_name), "last_name": names(last_name),
+             "gender": genders(gender), "photo": photo,
+             "longitude": None if math.isnan(longitude) else longitude,
+             "latitude": None if math.isnan(latitude) else latitude}
+            for id, email, first_name, last_name, gender, photo, longitude, latitude in zip(
+                columns["id"][positions].tolist(), columns["email"][positions].tolist(),
+                columns["first_name"][positions].tolist(), columns["last_name"][positions].tolist(),
+                columns["gender"][positions].tolist(), columns["photo"][positions].tolist(),
+                columns["longitude"][positions].tolist(), columns["latitude"][positions].tolist())
+        ]
+
+    async def load(self):
+        await self.read(select(*SNAPSHOT_COLUMNS))
+        self.ready = True
+
+    async def refresh(self):
+        """Дельта: строки, созданные или изменённые после watermark (с запасом на поздние коммиты)."""
+        query = select(*SNAPSHOT_COLUMNS)
+        if self.watermark is not None:
+            since = from_microseconds(self.watermark) - timedelta(seconds=CLIENT_SNAPSHOT_DELTA_OVERLAP_SECONDS)
+            query = query.where(or_(Client.time_created >= since, Client.time_updated >= since))
+        await self.read(query)
+        self.refreshes += 1
+
+    async def read(self, query: Select):
+        query = query.order_by(Client.time_created, Client.id).execution_options(yield_per=CLIENT_SNAPSHOT_CHUNK_SIZE)
+        async with self.session_factory() as session:
+            version = await session.scalar(
+                select(table_version.c.version).where(table_version.c.name == Client.__tablename__))
+            result = await session.stream(query)
+            async for rows in result.partitions(CLIENT_SNAPSHOT_CHUNK_SIZE):
+                self._merge(rows)
+        # При той же версии счётчик не сбрасывается: apply() во время чтения мог добавить строки,
+        # и пара (version, local_changes) не должна вернуться к значению, которое уже отдавалось.
+        if (version or 0) != self.version:
+            self.version = version or 0
+            self.local_changes = 0
+
+    @property
+    def etag_version(self) -> tuple[int, int]:
+        return self.version, self.local_changes
+
+    def request_refresh(self):
+        self._wake.set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self):
+        """Первая загрузка, затем дельты по таймеру или по request_refresh()."""
+        while True:
+            try:
+                if self.ready:
+                    await self.refresh()
+                else:
+                    await self.load()
+            except Exception:
+                logger.exception("Client snapshot refresh failed")
+
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.refresh_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def nbytes(self) -> int:
+        """Память массивов снимка (без строк StringDType длиннее 15 байт, которые лежат в отдельной куче)."""
+        arrays = [*self.columns.values(), self.positions, self._grid_positions, self._grid_starts]
+        return sum(array.nbytes for array in arrays if array is not None)
+
+    def stats(self) -> dict:
+        return {"ready": int(self.ready), "version": self.version, "local_changes": self.local_changes,
+                "clients": self.size, "array_bytes": self.nbytes(), "names": len(self.names),
+                "refreshes": self.refreshes, "applied_rows": self.applied, "grid_builds": self.grid_builds}
+
+
+client_snapshot = ClientSnapshot()
@@ -0,0 +1,52 @@
+"""
+    Ограничение размера тела запроса по маршрутам (UPLOAD_BODY_LIMITS). Starlette спулит файлы
+    multipart на диск без ограничения размера, поэтому лимит проверяется здесь: по Content-Length
+    до чтения тела и по числу байт, прочитанных из receive, - для chunked-запросов и неверного заголовка.
+"""
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+
+from src.api.metrics import REQUESTS_REJECTED
+from src.api.ratelimit import match_route
+from src.api.settings import UPLOAD_BODY_LIMITS
+
+
+class BodySizeLimitMiddleware:
+
+    def __init__(self, app, limits: dict[str, int] = UPLOAD_BODY_LIMITS):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        route = match_route(scope)
+        limit = self.limits.get(route.path) if route is not None else None
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        detail = f"Request body must be at most {limit} bytes."
+        content_length = Headers(scope=scope).get("content-length", "")
+        if content_length.isdigit() and int(content_length) > limit:
+            # Чтобы MetricsMiddleware записала отказ под шаблоном маршрута.
+            scope["route"] = route
+            REQUESTS_REJECTED.labels(route.path, "too_large").inc()
+            response = JSONResponse({"detail": detail}, status_code=413, headers={"Connection": "close"})
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    REQUESTS_REJECTED.labels(route.path, "too_large").inc()
+                    # FastAPI пробрасывает HTTPException из разбора тела как есть - клиент получит 413.
+                    raise HTTPException(status_code=413, detail=detail, headers={"Connection": "close"})
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -1,27 +1,34 @@
 import os
 import jwt
+import json
 import math
-import hashlib
+import time
+import base64
 import asyncio
+import hashlib
 import aiofiles
+import aiofiles.os
 import aiosmtplib
 
-from io import BytesIO
+from sqlalchemy import func, Float
 from pydantic import EmailStr
+from cachetools import TLRUCache
 from email.mime.text import MIMEText
 from datetime import datetime, timedelta
-from PIL import Image, ImageDraw, ImageFont
 from jwt.exceptions import InvalidTokenError
 from email.mime.multipart import MIMEMultipart
-from concurrent.futures import ThreadPoolExecutor
 from fastapi import UploadFile, HTTPException
 
 from src.api.models import Client
-from src.api.schemas import CreateClientSchema
-from src.api.settings import ALGORITHM, public_key, private_key, ACCESS_TOKEN_LIFE_TIME_MINUTES, \
-    SENDER_EMAIL, SENDER_PASSWORD, SMTP_SERVER, SMTP_PORT
+from src.api.metrics import timed
+from src.api.photos import photo_pipeline, probe_photo, spool_photo
+from src.api.schemas import CurrentUserSchema
+from src.api.settings import ALGORITHM, public_key, private_key, ACCESS_TOKEN_LIFE_TIME_MINUTES, SENDER_EMAIL, \
+    PHOTO_STORAGE_DIR, PHOTO_URL_PREFIX, TOKEN_CACHE_MAXSIZE, PHOTO_MAX_BYTES, PHOTO_SPOOL_DIR
 
-executor = ThreadPoolExecutor()
+
+token_cache = TLRUCache(maxsize=TOKEN_CACHE_MAXSIZE, ttu=lambda _, claims, now: claims.get("exp", 0), timer=time.time)
+token_cache_stats = {"hits": 0, "misses": 0}
 
 
 def hash_password(password: str) -> str:
@@ -29,48 +36,55 @@ def hash_password(password: str) -> str:
     return hashlib.sha256(password.encode()).hexdigest()
 
 
-async def add_watermark(photo: UploadFile, watermark_text: str = "TEXT") -> BytesIO:
-    return await asyncio.get_running_loop().run_in_executor(executor,
-                                                            sync_add_watermark,
-                                                            photo,
-                                                            watermark_text)
-
-
-def sync_add_watermark(photo: UploadFile, watermark_text: str) -> BytesIO:
-    image = Image.open(photo.file).convert("RGBA")
-
-    watermark = Image.new("RGBA", image.size)
-    draw = ImageDraw.Draw(watermark)
+@timed("ingest_photo")
+async def ingest_client_photo(photo: UploadFile, watermark_text: str = "TEXT") -> str:
+    """
+        Приём фото с ограниченной памятью: размер и формат проверяются до обработки (413/415), загрузка
+        спулится во временный файл, варианты (см. PHOTO_VARIANTS) пул процессов пишет на диск,
+        а в хранилище они попадают через os.replace. Возвращает URL фото.
+    """
+    if photo.size is not None and photo.size > PHOTO_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Photo must be at most {PHOTO_MAX_BYTES} bytes.")
+    await asyncio.to_thread(probe_photo, photo.file)
 
+    path = await asyncio.to_thread(spool_photo, photo.file, PHOTO_SPOOL_DIR)
     try:
-        font = ImageFont.truetype("arial.ttf", 36)
-    except IOError:
-        font = ImageFont.load_default()
-
-    text_width, text_height = draw.textsize(watermark_text, font)
-    position = (image.width - text_width - 10, image.height - text_height - 10)
-    draw.text(position, watermark_text, fill=(255, 255, 255, 128), font=font)
+        digest, files = await photo_pipeline.render(path, watermark_text, PHOTO_SPOOL_DIR)
+    finally:
+        await aiofiles.os.remove(path)
+    return await store_photo_files(digest, files)
 
-    watermarked_image = Image.alpha_composite(image, watermark).convert("RGB")
 
-    output = BytesIO()
-    watermarked_image.save(output, format="JPEG")
-    output.seek(0)
+def get_photo_path(digest: str, variant: str) -> str:
+    """
+        Фото хранится по хешу содержимого в шардированных папках client_photos/ab/cd/<hash>...,
+        поэтому URL неизменяем и nginx отдаёт его с вечным кэшированием.
+    """
+    name, extension = variant.split(".")
+    filename = f"{digest}.{extension}" if name == "full" else f"{digest}_{name}.{extension}"
+    return os.path.join(PHOTO_STORAGE_DIR, digest[:2], digest[2:4], filename)
 
-    return output
 
+def get_photo_url(digest: str) -> str:
+    return f"{PHOTO_URL_PREFIX}/{digest[:2]}/{digest[2:4]}/{digest}.jpeg"
 
-async def save_client_photo(photo: BytesIO, client_email: str) -> str:
-    os.makedirs("client_photos", exist_ok=True)
 
-    filepath = os.path.join("client_photos", f"{client_email}.jpeg")
+@timed("store_photo_files")
+async def store_photo_files(digest: str, files: dict[str, str]) -> str:
+    """
+        Переносит готовые файлы вариантов в хранилище через os.replace: nginx никогда не увидит
+        недописанный файл. Уже сохранённые варианты (то же фото) не трогаются.
+    """
+    os.makedirs(os.path.dirname(get_photo_path(digest, "full.jpeg")), exist_ok=True)
 
-    async with aiofiles.open(filepath, 'wb') as f:
-        await f.write(photo.read())
+    for variant, tmp_filepath in files.items():
+        filepath = get_photo_path(digest, variant)
+        if os.path.exists(filepath):
+            await aiofiles.os.remove(tmp_filepath)
+        else:
+            await aiofiles.os.replace(tmp_filepath, filepath)
 
-    filepath = f"/static/{client_email}.jpeg"
-
-    return filepath
+    return get_photo_url(digest)
 
 
 def encode_jwt(payload: dict, private_key: str = private_key,
@@ -85,6 +99,7 @@ def encode_jwt(payload: dict, private_key: str = private_key,
     return encoded
 
 
+@timed("decode_jwt")
 def decode_jwt(token: str, public_key: str = public_key,
                algorithm: str = ALGORITHM) -> dict:
 
@@ -95,9 +110,31 @@ def decode_jwt(token: str, public_key: str = public_key,
         raise HTTPException(status_code=403, detail="Authorization token error.")
 
 
+EARTH_RADIUS_KM = 6371.0
+
+
+def decode_jwt_cached(token: str) -> dict:
+    """
+        decode_jwt с кэшем по хешу токена: проверка RS256 делается один раз на токен,
+        запись живёт ровно до истечения токена (exp).
+    """
+    key = hashlib.sha256(token.encode()).digest()
+
+    claims = token_cache.get(key)
+    if claims is not None:
+        token_cache_stats["hits"] += 1
+        return claims
+
+    token_cache_stats["misses"] += 1
+    claims = decode_jwt(token)
+    token_cache[key] = claims
+
+    return claims
+
+
 def calculate_distance(lat1, lon1, lat2, lon2):
 
-    r = 6371.0
+    r = EARTH_RADIUS_KM
 
     lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
 
@@ -110,30 +147,84 @@ def calculate_distance(lat1, lon1, lat2, lon2):
     return r * c
 
 
-async def send_email(recipient_email: EmailStr, subject: str, body: str):
+def sql_calculate_distance(lat1: float, lon1: float, lat2, lon2):
+    """Та же формула гаверсинуса, что и в calculate_distance, но в виде SQL-выражения над колонками."""
+
+    lat1_rad = math.radians(lat1)
+    lat2_rad = func.radians(lat2, type_=Float)
+    dlat = lat2_rad - lat1_rad
+    dlon = func.radians(lon2, type_=Float) - math.radians(lon1)
+
+    a = func.power(func.sin(dlat / 2.0, type_=Float), 2, type_=Float) + \
+        math.cos(lat1_rad) * func.cos(lat2_rad, type_=Float) * \
+        func.power(func.sin(dlon / 2.0, type_=Float), 2, type_=Float)
+    c = 2 * func.atan2(func.sqrt(a, type_=Float), func.sqrt(func.greatest(1 - a, 0.0, type_=Float), type_=Float),
+                       type_=Float)
+
+    return EARTH_RADIUS_KM * c
+
+
+def require_location(current_user: CurrentUserSchema | None) -> tuple[float, float]:
+    """Координаты текущего пользователя для запросов по расстоянию."""
+    if not current_user:
+        raise HTTPException(status_code=401, detail="You are not authorized!")
+
+    if current_user.latitude is None or current_user.longitude is None:
+        raise HTTPException(status_code=400, detail="Current user location is not set.")
+
+    return current_user.latitude, current_user.longitude
+
+
+def get_bounding_box(latitude: float, longitude: float,
+                     distance: float) -> tuple[float, float, list[tuple[float, float]]]:
+    """
+        Прямоугольник (в градусах), гарантированно содержащий круг радиусом distance км.
+        Возвращает (min_lat, max_lat, lon_ranges). Пустой lon_ranges означает, что по долготе
+        ограничивать нельзя (круг накрывает полюс), два диапазона - что круг пересекает 180-й меридиан.
+    """
+
+    angular_distance = distance / EARTH_RADIUS_KM
+    # Небольшой запас, чтобы погрешность float не отрезала точки на самой границе.
+    margin = 1e-9
+
+    min_lat = latitude - math.degrees(angular_distance) - margin
+    max_lat = latitude + math.degrees(angular_distance) + margin
+
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90.0), min(max_lat, 90.0), []
+
+    ratio = math.sin(angular_distance) / math.cos(math.radians(latitude))
+    if angular_distance >= math.pi / 2 or ratio >= 1:
+        return min_lat, max_lat, []
+
+    lon_delta = math.degrees(math.asin(ratio)) + margin
+    min_lon = longitude - lon_delta
+    max_lon = longitude + lon_delta
+
+    if min_lon < -180:
+        return min_lat, max_lat, [(min_lon + 360, 180.0), (-180.0, max_lon)]
+    if max_lon > 180:
+        return min_lat, max_lat, [(min_lon, 180.0), (-180.0, max_lon - 360)]
+
+    return min_lat, max_lat, [(min_lon, max_lon)]
+
+
+@timed("send_email")
+async def send_email(smtp: aiosmtplib.SMTP, recipient_email: EmailStr, subject: str, body: str,
+                     sender_email: str = SENDER_EMAIL):
+    """Отправка письма через уже открытое (и авторизованное) SMTP-соединение."""
 
     message = MIMEMultipart()
-    message["From"] = SENDER_EMAIL
+    message["From"] = sender_email
     message["To"] = recipient_email
     message["Subject"] = subject
 
     message.attach(MIMEText(body, "plain"))
 
-    try:
-        await aiosmtplib.send(
-            message,
-            hostname=SMTP_SERVER,
-            port=SMTP_PORT,
-            start_tls=True,
-            username=SENDER_EMAIL,
-            password=SENDER_PASSWORD
-        )
-        print(f"Email sent to {recipient_email}")
-    except aiosmtplib.SMTPException as e:
-        raise HTTPException(status_code=400, detail=f"Failed to send email to {recipient_email}: {e}")
-
-
-async def send_mutual_match_email(current_user: CreateClientSchema, target_client: Client) -> dict:
+    await smtp.send_message(message)
+
+
+def build_mutual_match_emails(current_user: CurrentUserSchema, target_client: Client) -> list[tuple[str, str, str]]:
     message_to_current_user = (
         f"Вы понравились {target_client.first_name}! Почта участника: {target_client.email}"
     )
@@ -141,11 +232,64 @@ async def send_mutual_match_email(current_user: CreateClientSchema, target_clien
         f"Вы понравились {current_user.first_name}! Почта участника: {current_user.email}"
     )
 
-    await send_email(current_user.email, "Взаимная симпатия!", message_to_current_user)
-    await send_email(target_client.email, "Взаимная симпатия!", message_to_target_client)
+    return [
+        (current_user.email, "Взаимная симпатия!", message_to_current_user),
+        (target_client.email, "Взаимная симпатия!", message_to_target_client),
+    ]
+
+
+def build_batch_mutual_match_emails(current_user: CurrentUserSchema,
+                                    target_clients: list) -> list[tuple[str, str, str]]:
+    """Одно письмо текущему пользователю со всеми взаимными симпатиями пачки и по письму каждому из них."""
+    if len(target_clients) == 1:
+        return build_mutual_match_emails(current_user, target_clients[0])
+
+    message_to_current_user = "Взаимная симпатия с участниками:\n" + "\n".join(
+        f"{target_client.first_name}: {target_client.email}" for target_client in target_clients)
+
+    # Второе письмо из build_mutual_match_emails - то, что адресовано самой цели.
+    return [(current_user.email, "Взаимная симпатия!", message_to_current_user)] + [
+        build_mutual_match_emails(current_user, target_client)[1] for target_client in target_clients
+    ]
+
+
+def escape_like(value: str, escape: str = "/") -> str:
+    return value.replace(escape, escape * 2).replace("%", escape + "%").replace("_", escape + "_")
+
+
+def encode_cursor(time_created: datetime, client_id: int) -> str:
+    payload = json.dumps([time_created.isoformat(), client_id]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        time_created, client_id = json.loads(payload)
+        return datetime.fromisoformat(time_created), int(client_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+
+def get_etag(cache_key: tuple) -> str:
+    """Сильный ETag ответа по ключу кэша (версия таблицы, фильтры, координаты для расстояния)."""
+    return '"' + hashlib.sha256(repr(cache_key).encode()).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Проверка If-None-Match: слабое сравнение по RFC 9110, W/ игнорируется."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
 
-    return {"message": "Mutual match!", "target_email": target_client.email}
 
+def get_cache_key(sort_order: str | None, current_user: CurrentUserSchema | None, **kwargs) -> tuple:
+    # От текущего пользователя зависит только фильтр по расстоянию, поэтому в ключ попадают
+    # его координаты, и только когда этот фильтр задан. Сессия в ключ не попадает.
+    location = None
+    if kwargs.get('distance') and current_user:
+        location = (current_user.latitude, current_user.longitude)
 
-def get_cache_key(sort_order: str | None, current_user: CreateClientSchema | None, **kwargs) -> str:
-    return f"{current_user.id if current_user else 'anon'}:{sort_order}:{kwargs}"
+    return sort_order, location, tuple(sorted(kwargs.items()))
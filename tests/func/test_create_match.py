@@ -0,0 +1,122 @@
+import asyncio
+
+from fastapi import HTTPException
+import pytest
+
+from sqlalchemy import select, func, delete
+from sqlalchemy.exc import IntegrityError
+
+from tests.conftest import test_engine, TestSessionLocal
+from src.api.crud import create_match_db, create_matches_db
+from src.api.database import BaseModel
+from src.api.models import Client, Match, match_pair
+from src.api.schemas import CreateClientSchema
+from src.api.settings import DAILY_LIKE_LIMIT
+
+
+async def create_clients(prefix: str, count: int) -> list[CreateClientSchema]:
+    async with test_engine.begin() as conn:
+        await conn.run_sync(BaseModel.metadata.create_all)
+
+    async with TestSessionLocal() as session:
+        await session.execute(delete(Client).where(Client.email.like(f"{prefix}%")))
+        clients = [Client(email=f"{prefix}{i}@example.com", password="x", first_name=f"{prefix}{i}", gender="male")
+                   for i in range(count)]
+        session.add_all(clients)
+        await session.commit()
+
+    return [CreateClientSchema.from_orm(client) for client in clients]
+
+
+async def like(target_id: int, current_user: CreateClientSchema) -> dict | int:
+    async with TestSessionLocal() as session:
+        try:
+            return await create_match_db(target_id, current_user, session)
+        except HTTPException as e:
+            return e.status_code
+
+
+def test_daily_like_limit_holds_under_parallel_requests():
+    async def main():
+        me, *targets = await create_clients("parallel", DAILY_LIKE_LIMIT * 4 + 1)
+
+        results = await asyncio.gather(*[like(target.id, me) for target in targets])
+
+        async with TestSessionLocal() as session:
+            likes = await session.scalar(select(func.count()).select_from(Match).where(Match.user_id == me.id))
+
+        await test_engine.dispose()
+        return results, likes
+
+    results, likes = asyncio.run(main())
+
+    assert likes == DAILY_LIKE_LIMIT
+    assert results.count({'message': 'Match sent!'}) == DAILY_LIKE_LIMIT
+    assert results.count(400) == len(results) - DAILY_LIKE_LIMIT
+
+
+def test_like_errors_keep_their_status_codes():
+    async def main():
+        me, target = await create_clients("semantics", 2)
+
+        results = [
+            await like(me.id, me),
+            await like(target.id + 100_000, me),
+            await like(target.id, me),
+            await like(target.id, me),
+        ]
+
+        await test_engine.dispose()
+        return results
+
+    assert asyncio.run(main()) == [403, 404, {'message': 'Match sent!'}, 400]
+
+
+def test_batch_like_shares_the_daily_limit_and_finds_mutuals():
+    async def main():
+        me, liked_me, *targets = await create_clients("batch", DAILY_LIKE_LIMIT + 3)
+
+        async with TestSessionLocal() as session:
+            session.add(Match(user_id=liked_me.id, target_user_id=me.id))
+            await session.commit()
+
+        first = await like(targets[0].id, me)
+        async with TestSessionLocal() as session:
+            batch = await create_matches_db([targets[0].id, me.id, 10 ** 9, liked_me.id] +
+                                            [target.id for target in targets[1:]], me, session)
+
+        await test_engine.dispose()
+        return first, batch
+
+    first, batch = asyncio.run(main())
+    statuses = [result.status for result in batch.results]
+
+    assert first == {'message': 'Match sent!'}
+    assert statuses[:4] == ["already_matched", "self", "not_found", "mutual"]
+    assert statuses[4:].count("matched") == DAILY_LIKE_LIMIT - 2
+    assert statuses[4:].count("limit_reached") == len(statuses[4:]) - (DAILY_LIKE_LIMIT - 2)
+    assert batch.results[3].target_email.startswith("batch")
+
+
+def test_pair_is_unique_without_the_advisory_lock():
+    async def main():
+        me, target = await create_clients("pair", 2)
+
+        async with TestSessionLocal() as session:
+            await session.execute(match_pair.insert().values(user_id=me.id, target_user_id=target.id))
+            await session.commit()
+
+        # Писатель в обход create_match_db (без блокировки) не может вставить пару второй раз,
+        # а лайк по уже существующей паре отклоняется.
+        async with TestSessionLocal() as session:
+            with pytest.raises(IntegrityError):
+                await session.execute(match_pair.insert().values(user_id=me.id, target_user_id=target.id))
+
+        result = await like(target.id, me)
+        async with TestSessionLocal() as session:
+            likes = await session.scalar(select(func.count()).select_from(Match).where(Match.user_id == me.id))
+
+        await test_engine.dispose()
+        return result, likes
+
+    assert asyncio.run(main()) == (400, 0)
@@ -0,0 +1,40 @@
+import asyncio
+
+from datetime import datetime, timedelta, timezone
+
+from tests.conftest import TestSessionLocal, test_engine
+from tests.func.test_create_match import create_clients
+from src.api.crud import get_feed_db
+from src.api.models import Match
+from src.api.schemas import CurrentUserSchema
+
+
+def test_feeds_page_through_likes_and_find_mutuals():
+    async def main():
+        me, *others = await create_clients("feed", 6)
+        now = datetime.now(timezone.utc)
+
+        async with TestSessionLocal() as session:
+            # Я лайкнул всех пятерых (последним - others[4]), меня лайкнули others[0] и others[1].
+            session.add_all([Match(user_id=me.id, target_user_id=other.id, time_created=now - timedelta(minutes=5 - i))
+                             for i, other in enumerate(others)])
+            session.add_all([Match(user_id=other.id, target_user_id=me.id) for other in others[:2]])
+            await session.commit()
+
+        current_user = CurrentUserSchema.model_validate(me, from_attributes=True)
+        async with TestSessionLocal() as session:
+            first = await get_feed_db(session, "likes", current_user, limit=3)
+            second = await get_feed_db(session, "likes", current_user, limit=3, cursor=first.next_cursor)
+            liked_by = await get_feed_db(session, "liked_by", current_user)
+            mutuals = await get_feed_db(session, "mutuals", current_user)
+
+        await test_engine.dispose()
+        return others, first, second, liked_by, mutuals
+
+    others, first, second, liked_by, mutuals = asyncio.run(main())
+    ids = [other.id for other in others]
+
+    assert [item.id for item in first.items + second.items] == ids[::-1]
+    assert second.next_cursor is None
+    assert sorted(item.id for item in liked_by.items) == ids[:2]
+    assert [item.id for item in mutuals.items] == ids[1::-1]
@@ -0,0 +1,62 @@
+import io
+import asyncio
+import zipfile
+
+from PIL import Image
+from sqlalchemy import select, delete
+
+from tests.conftest import test_engine, TestSessionLocal
+from src.api.importer import import_clients
+from src.api.database import BaseModel
+from src.api.models import Client
+
+MANIFEST = """email,password,first_name,last_name,gender,longitude,latitude,photo
+import-a@example.com,secret,Anna,Ivanova,female,37.6,55.7,a.jpg
+import-taken@example.com,secret,Taken,Taken,male,37.6,55.7,a.jpg
+import-a@example.com,secret,Anna,Ivanova,female,37.6,55.7,a.jpg
+import-b@example.com,secret,Boris,Petrov,male,30.3,59.9,b.jpg
+import-llllllllllllllllllllllllllllllllllllllllllllllllllllllllllll@example.com,secret,Long,Email,male,30.3,59.9,b.jpg
+import-c@example.com,secret,Clara,Smith,female,30.3,59.9,missing.jpg
+"""
+
+
+def make_archive() -> io.BytesIO:
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as photos:
+        for name, color in (("a.jpg", "red"), ("b.jpg", "blue")):
+            photo = io.BytesIO()
+            Image.new("RGB", (400, 300), color).save(photo, format="JPEG")
+            photos.writestr(name, photo.getvalue())
+    archive.seek(0)
+    return archive
+
+
+def test_import_reports_bad_rows_and_keeps_the_rest():
+    async def main():
+        async with test_engine.begin() as conn:
+            await conn.run_sync(BaseModel.metadata.create_all)
+
+        async with TestSessionLocal() as session:
+            await session.execute(delete(Client).where(Client.email.like("import-%")))
+            session.add(Client(email="import-taken@example.com", password="x", first_name="Taken", gender="male"))
+            await session.commit()
+
+        report = await import_clients(io.BytesIO(MANIFEST.encode()), "csv", make_archive(),
+                                      session_factory=TestSessionLocal, batch_size=2)
+
+        async with TestSessionLocal() as session:
+            result = await session.execute(select(Client).where(Client.email.in_(
+                ["import-a@example.com", "import-b@example.com"])))
+            clients = result.scalars().all()
+
+        await test_engine.dispose()
+        return report, clients
+
+    report, clients = asyncio.run(main())
+
+    assert (report.total, report.imported, report.failed) == (6, 2, 4)
+    assert [(failure.row, failure.email) for failure in report.failures] == [
+        (3, "import-taken@example.com"), (4, "import-a@example.com"), (6, f"import-{'l' * 60}@example.com"),
+        (7, "import-c@example.com")]
+    assert len(clients) == 2
+    assert all(client.photo.startswith("/static/") and client.password != "secret" for client in clients)
@@ -0,0 +1,59 @@
+import asyncio
+
+from tests.conftest import DATABASE_TEST_URL, test_engine, TestSessionLocal
+from src.api.invalidation import CacheInvalidationListener, publish_invalidation, handlers
+from src.api.crud import clients_cache
+
+
+def test_notify_reaches_listener_after_commit_only(monkeypatch):
+    received = []
+    monkeypatch.setitem(handlers, "test", received.append)
+
+    async def main():
+        listener = CacheInvalidationListener(DATABASE_TEST_URL, channel="cache_invalidation_test")
+        await listener.start()
+        monkeypatch.setattr("src.api.invalidation.CACHE_INVALIDATION_CHANNEL", listener.channel)
+
+        async with TestSessionLocal() as session:
+            await publish_invalidation(session, {"cache": "test", "step": "rollback"})
+            await session.rollback()
+        async with TestSessionLocal() as session:
+            await publish_invalidation(session, {"cache": "test", "step": "commit"})
+            await session.commit()
+
+        for _ in range(50):
+            if received:
+                break
+            await asyncio.sleep(0.02)
+        stats = listener.stats()
+
+        await listener.stop()
+        await test_engine.dispose()
+        return stats
+
+    stats = asyncio.run(main())
+
+    assert received == [{"cache": "test", "step": "commit"}]
+    assert stats["listening"] == 1
+
+
+def test_clients_event_drops_local_list_cache():
+    async def main():
+        listener = CacheInvalidationListener(DATABASE_TEST_URL)
+        await listener.start()
+
+        await clients_cache.get_or_load("key", lambda: asyncio.sleep(0, result=["client"]))
+        async with TestSessionLocal() as session:
+            await publish_invalidation(session, {"cache": "clients"})
+            await session.commit()
+
+        for _ in range(50):
+            if not len(clients_cache):
+                break
+            await asyncio.sleep(0.02)
+
+        await listener.stop()
+        await test_engine.dispose()
+        return len(clients_cache)
+
+    assert asyncio.run(main()) == 0
@@ -0,0 +1,77 @@
+import json
+import asyncio
+
+from sqlalchemy import delete
+
+from tests.conftest import test_engine, TestSessionLocal
+from src.api.crud import build_clients_query, stream_clients_db
+from src.api.database import BaseModel
+from src.api.models import Client
+
+
+def test_ndjson_export_streams_every_row_in_chunks():
+    async def main():
+        async with test_engine.begin() as conn:
+            await conn.run_sync(BaseModel.metadata.create_all)
+
+        async with TestSessionLocal() as session:
+            await session.execute(delete(Client).where(Client.email.like("export%")))
+            session.add_all([Client(email=f"export{i}@example.com", password="x", first_name="Export", gender="female")
+                             for i in range(25)])
+            await session.commit()
+
+        query = build_clients_query("asc", None, gender="female", first_name="Export")
+        chunks = [chunk async for chunk in stream_clients_db(query, chunk_size=10, session_factory=TestSessionLocal)]
+
+        await test_engine.dispose()
+        return chunks
+
+    chunks = asyncio.run(main())
+    lines = [json.loads(line) for chunk in chunks for line in chunk.splitlines()]
+    rows = [line for line in lines if "next_cursor" not in line]
+
+    assert len(chunks) == 3
+    assert all("next_cursor" in chunk.splitlines()[-1].decode() for chunk in chunks)
+    assert len(rows) == 25
+    assert [row["id"] for row in rows] == sorted(row["id"] for row in rows)
+    assert "password" not in rows[0]
+
+
+def test_interrupted_ndjson_export_resumes_from_last_cursor():
+    async def export(cursor: str | None = None, stop_after: int | None = None) -> list[dict]:
+        query = build_clients_query("desc", None, first_name="Resume", cursor=cursor)
+        stream = stream_clients_db(query, chunk_size=4, session_factory=TestSessionLocal)
+        lines = []
+        async for chunk in stream:
+            lines.extend(json.loads(line) for line in chunk.splitlines())
+            if stop_after is not None and len(lines) >= stop_after:
+                break
+        await stream.aclose()
+        return lines
+
+    async def main():
+        async with test_engine.begin() as conn:
+            await conn.run_sync(BaseModel.metadata.create_all)
+
+        async with TestSessionLocal() as session:
+            await session.execute(delete(Client).where(Client.email.like("resume%")))
+            session.add_all([Client(email=f"resume{i}@example.com", password="x", first_name="Resume", gender="male")
+                             for i in range(10)])
+            await session.commit()
+
+        full = await export()
+        # Обрыв посреди второй пачки: строки после последнего next_cursor выбрасываются и приходят снова.
+        received = (await export(stop_after=7))[:7]
+        cursor = [line["next_cursor"] for line in received if "next_cursor" in line][-1]
+        kept = received[:received.index({"next_cursor": cursor})]
+        resumed = await export(cursor=cursor)
+
+        await test_engine.dispose()
+        return full, kept, resumed
+
+    full, kept, resumed = asyncio.run(main())
+    ids = [line["id"] for line in full if "id" in line]
+    resumed_ids = [line["id"] for line in kept + resumed if "id" in line]
+
+    assert len(ids) == 10
+    assert resumed_ids == ids
@@ -0,0 +1,102 @@
+import asyncio
+
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, func, text
+
+from tests.conftest import TestSessionLocal, test_engine
+from tests.func.test_create_match import create_clients, like
+from src.api.models import Match, daily_likes, match_pair
+from src.api.partitions import PartitionMaintainer, add_months
+
+
+def test_like_counts_into_daily_likes_and_lands_in_monthly_partition():
+    async def main():
+        me, *targets = await create_clients("counter", 3)
+
+        results = [await like(target.id, me) for target in targets]
+        today = datetime.utcnow().date()
+
+        async with TestSessionLocal() as session:
+            count = await session.scalar(select(daily_likes.c.count).where(daily_likes.c.user_id == me.id,
+                                                                           daily_likes.c.day == today))
+            partitions = set((await session.execute(
+                select(text("tableoid::regclass::text")).select_from(Match).where(Match.user_id == me.id))).scalars())
+
+        await test_engine.dispose()
+        return results, count, partitions
+
+    results, count, partitions = asyncio.run(main())
+
+    assert results == [{'message': 'Match sent!'}] * 2
+    assert count == 2
+    assert partitions == {f"match_{datetime.now(timezone.utc):%Y_%m}"}
+
+
+def test_maintenance_creates_future_partitions_and_drops_expired_ones():
+    async def main():
+        me, target = await create_clients("maintenance", 2)
+        today = datetime.now(timezone.utc).date()
+        old_month = add_months(today.replace(day=1), -2)
+
+        async with TestSessionLocal() as session:
+            await session.execute(select(func.create_match_partitions(old_month, old_month)))
+            session.add(Match(user_id=me.id, target_user_id=target.id,
+                              time_created=datetime.combine(old_month, datetime.min.time(), timezone.utc)))
+            await session.execute(match_pair.insert().values(user_id=me.id, target_user_id=target.id))
+            await session.execute(daily_likes.insert().values(user_id=me.id, day=today - timedelta(days=30), count=1))
+            await session.commit()
+
+        maintainer = PartitionMaintainer(session_factory=TestSessionLocal, ahead_months=3, retention_months=1,
+                                         counter_retention_days=7)
+        done = await maintainer.maintain()
+
+        async with TestSessionLocal() as session:
+            result = await session.execute(text(
+                "SELECT child.relname FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+                "WHERE pg_inherits.inhparent = 'match'::regclass"))
+            partitions = set(result.scalars())
+            old_likes = await session.scalar(select(daily_likes.c.count).where(
+                daily_likes.c.user_id == me.id, daily_likes.c.day == today - timedelta(days=30)))
+            old_pairs = await session.scalar(select(func.count()).select_from(match_pair).where(
+                match_pair.c.user_id == me.id))
+
+        await test_engine.dispose()
+        return done, today, old_month, partitions, old_likes, old_pairs
+
+    done, today, old_month, partitions, old_likes, old_pairs = asyncio.run(main())
+
+    assert done
+    assert f"match_{add_months(today.replace(day=1), 3):%Y_%m}" in partitions
+    assert f"match_{old_month:%Y_%m}" not in partitions
+    assert old_likes is None
+    assert old_pairs == 0
+
+
+def test_likes_without_partition_go_to_default_and_move_out_with_it():
+    async def main():
+        me, target = await create_clients("default", 2)
+        # Дальше, чем create_all и обслуживание создают секции.
+        month = add_months(datetime.now(timezone.utc).date().replace(day=1), 6)
+        liked_at = datetime.combine(month, datetime.min.time(), timezone.utc) + timedelta(days=3)
+
+        async with TestSessionLocal() as session:
+            # Секция могла остаться от прошлого запуска.
+            await session.execute(text(f"DROP TABLE IF EXISTS match_{month:%Y_%m}"))
+            session.add(Match(user_id=me.id, target_user_id=target.id, time_created=liked_at))
+            await session.commit()
+            stranded = await session.scalar(text("SELECT count(*) FROM match_default"))
+
+        maintainer = PartitionMaintainer(session_factory=TestSessionLocal, ahead_months=6)
+        await maintainer.maintain()
+
+        async with TestSessionLocal() as session:
+            moved = await session.scalar(text(f"SELECT count(*) FROM match_{month:%Y_%m}"))
+            left = await session.scalar(text("SELECT count(*) FROM match_default"))
+
+        await test_engine.dispose()
+        return stranded, moved, left, maintainer.stats()
+
+    stranded, moved, left, stats = asyncio.run(main())
+
+    assert (stranded, moved, left) == (1, 1, 0)
+    assert stats["default_rows"] == 0 and stats["last_success_time"] > 0
@@ -0,0 +1,78 @@
+import asyncio
+
+from sqlalchemy import delete, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from tests.conftest import test_engine, TestSessionLocal
+from src.api.crud import get_table_version
+from src.api.database import BaseModel
+from src.api.models import Client
+
+
+def test_client_version_changes_on_commit_only():
+    async def main():
+        async with test_engine.begin() as conn:
+            await conn.run_sync(BaseModel.metadata.create_all)
+
+        async with TestSessionLocal() as session:
+            before = await get_table_version(session, "client")
+
+        async with TestSessionLocal() as session:
+            session.add(Client(email="version@example.com", password="x", first_name="Version", gender="male"))
+            await session.flush()
+            async with TestSessionLocal() as other:
+                uncommitted = await get_table_version(other, "client")
+            await session.rollback()
+
+        async with TestSessionLocal() as session:
+            rolled_back = await get_table_version(session, "client")
+            session.add(Client(email="version@example.com", password="x", first_name="Version", gender="male"))
+            await session.commit()
+            committed = await get_table_version(session, "client")
+            await session.execute(delete(Client).where(Client.email == "version@example.com"))
+            await session.commit()
+
+        await test_engine.dispose()
+        return before, uncommitted, rolled_back, committed
+
+    before, uncommitted, rolled_back, committed = asyncio.run(main())
+
+    assert uncommitted == before
+    assert rolled_back == before
+    assert committed > before
+
+
+def test_statements_without_changed_rows_neither_bump_nor_block():
+    async def main():
+        async with test_engine.begin() as conn:
+            await conn.run_sync(BaseModel.metadata.create_all)
+
+        async with TestSessionLocal() as session:
+            await session.execute(delete(Client).where(Client.email.like("noop%")))
+            session.add(Client(email="noop-taken@example.com", password="x", first_name="Taken", gender="male"))
+            await session.commit()
+            before = await get_table_version(session, "client")
+
+        async with TestSessionLocal() as importer:
+            # Как пачка импорта из одних занятых email: транзакция открыта, но строк не изменила.
+            await importer.execute(pg_insert(Client).values(email="noop-taken@example.com", password="x")
+                                   .on_conflict_do_nothing(index_elements=[Client.email]))
+            await importer.execute(update(Client).where(Client.email == "noop-missing@example.com").values(gender="female"))
+
+            async with TestSessionLocal() as session:
+                session.add(Client(email="noop-new@example.com", password="x", first_name="New", gender="male"))
+                # Без блокировки table_version в открытой транзакции регистрация не ждёт её коммита.
+                await asyncio.wait_for(session.commit(), timeout=5)
+                registered = await get_table_version(session, "client")
+            await importer.commit()
+
+        async with TestSessionLocal() as session:
+            after = await get_table_version(session, "client")
+
+        await test_engine.dispose()
+        return before, registered, after
+
+    before, registered, after = asyncio.run(main())
+
+    assert registered == before + 1
+    assert after == registered
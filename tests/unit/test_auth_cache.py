@@ -0,0 +1,43 @@
+import time
+import asyncio
+
+import pytest
+
+from fastapi import HTTPException, Request
+
+from src.api import utils
+from src.api.crud import get_current_user
+from src.api.settings import PROFILE_TOKEN_SCOPE
+from src.api.utils import encode_jwt, decode_jwt_cached, token_cache, token_cache_stats
+
+
+def test_token_is_verified_once(monkeypatch):
+    calls = []
+    decode_jwt = utils.decode_jwt
+    monkeypatch.setattr(utils, "decode_jwt", lambda token: calls.append(token) or decode_jwt(token))
+
+    token = encode_jwt({"sub": "cached@example.com", "email": "cached@example.com"})
+    hits = token_cache_stats["hits"]
+
+    assert decode_jwt_cached(token)["email"] == "cached@example.com"
+    assert decode_jwt_cached(token)["email"] == "cached@example.com"
+    assert len(calls) == 1
+    assert token_cache_stats["hits"] == hits + 1
+
+
+def test_cache_entry_expires_with_token():
+    token_cache[b"expired"] = {"email": "expired@example.com", "exp": time.time() - 1}
+    token_cache[b"valid"] = {"email": "valid@example.com", "exp": time.time() + 60}
+
+    assert token_cache.get(b"expired") is None
+    assert token_cache.get(b"valid")["email"] == "valid@example.com"
+
+
+def test_profile_token_is_not_a_session():
+    token = encode_jwt({"sub": "profiler", "scope": PROFILE_TOKEN_SCOPE})
+    request = Request({"type": "http", "headers": [(b"cookie", f"auth_token={token}".encode())]})
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(get_current_user(request, session=None))
+
+    assert error.value.status_code == 401
@@ -0,0 +1,147 @@
+import asyncio
+
+import pytest
+
+from src.api.cache import AsyncTTLCache
+
+
+class FakeTimer:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_caches_results_not_coroutines():
+    cache = AsyncTTLCache(maxsize=10, ttl=60)
+    calls = []
+
+    async def load():
+        calls.append(1)
+        return ["client"]
+
+    async def main():
+        first = await cache.get_or_load("key", load)
+        second = await cache.get_or_load("key", load)
+        return first, second
+
+    assert asyncio.run(main()) == (["client"], ["client"])
+    assert len(calls) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_concurrent_misses_are_collapsed():
+    cache = AsyncTTLCache(maxsize=10, ttl=60)
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return len(calls)
+
+    async def main():
+        return await asyncio.gather(*[cache.get_or_load("key", load) for _ in range(20)])
+
+    assert asyncio.run(main()) == [1] * 20
+    assert len(calls) == 1
+    assert (cache.misses, cache.coalesced) == (1, 19)
+
+
+def test_lru_and_ttl_eviction():
+    timer = FakeTimer()
+    cache = AsyncTTLCache(maxsize=2, ttl=10, timer=timer)
+
+    async def load(value):
+        return value
+
+    async def main():
+        await cache.get_or_load("a", lambda: load(1))
+        await cache.get_or_load("b", lambda: load(2))
+        await cache.get_or_load("a", lambda: load(1))
+        await cache.get_or_load("c", lambda: load(3))
+        assert await cache.get_or_load("b", lambda: load("reloaded")) == "reloaded"
+
+        timer.now = 11
+        assert await cache.get_or_load("b", lambda: load("expired")) == "expired"
+
+    asyncio.run(main())
+    assert cache.evictions == 2
+    assert cache.expirations == 1
+
+
+def test_invalidate_during_load_does_not_store_stale_result():
+    cache = AsyncTTLCache(maxsize=10, ttl=60)
+
+    async def slow_load():
+        await asyncio.sleep(0.01)
+        return "stale"
+
+    async def fresh_load():
+        return "fresh"
+
+    async def main():
+        task = asyncio.create_task(cache.get_or_load("key", slow_load))
+        await asyncio.sleep(0)
+        cache.invalidate()
+        assert await task == "stale"
+        return await cache.get_or_load("key", fresh_load)
+
+    assert asyncio.run(main()) == "fresh"
+
+
+def test_errors_are_not_cached():
+    cache = AsyncTTLCache(maxsize=10, ttl=60)
+
+    async def failing_load():
+        raise ValueError("boom")
+
+    async def main():
+        with pytest.raises(ValueError):
+            await cache.get_or_load("key", failing_load)
+
+    asyncio.run(main())
+    assert len(cache) == 0
+
+
+def test_cancelled_leader_does_not_fail_waiters():
+    cache = AsyncTTLCache(maxsize=10, ttl=60)
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return len(calls)
+
+    async def main():
+        leader = asyncio.create_task(cache.get_or_load("key", load))
+        await asyncio.sleep(0)
+        waiters = [asyncio.create_task(cache.get_or_load("key", load)) for _ in range(5)]
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.gather(*waiters)
+
+    # Первая загрузка отменена вместе с запросом, ждущие выполняют одну повторную.
+    assert asyncio.run(main()) == [2] * 5
+    assert len(calls) == 2
+    assert cache.stats()["size"] == 1
+
+
+def test_invalidating_one_key_keeps_other_loads():
+    cache = AsyncTTLCache(maxsize=10, ttl=60)
+
+    async def slow_load(value):
+        await asyncio.sleep(0.01)
+        return value
+
+    async def main():
+        tasks = [asyncio.create_task(cache.get_or_load(key, lambda key=key: slow_load(key))) for key in ("a", "b")]
+        await asyncio.sleep(0)
+        cache.invalidate(lambda key: key == "a")
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert list(cache._data) == ["b"]
@@ -0,0 +1,31 @@
+from src.api.schemas import CurrentUserSchema
+from src.api.utils import get_cache_key, get_etag, etag_matches
+
+
+def test_etag_depends_on_version_and_filters():
+    first = get_etag(get_cache_key("asc", None, gender="male", version=1))
+
+    assert first == get_etag(get_cache_key("asc", None, gender="male", version=1))
+    assert first != get_etag(get_cache_key("asc", None, gender="male", version=2))
+    assert first != get_etag(get_cache_key("asc", None, gender="female", version=1))
+    assert first.startswith('"') and first.endswith('"')
+
+
+def test_etag_depends_on_location_only_with_distance():
+    user = CurrentUserSchema(id=1, email="a@example.com", first_name=None, longitude=37.6, latitude=55.7)
+    moved = user.model_copy(update={"latitude": 59.9})
+
+    assert get_etag(get_cache_key(None, user, version=1)) == get_etag(get_cache_key(None, moved, version=1))
+    assert get_etag(get_cache_key(None, user, distance=10, version=1)) != \
+        get_etag(get_cache_key(None, moved, distance=10, version=1))
+
+
+def test_etag_matches():
+    etag = '"abc"'
+
+    assert etag_matches('"abc"', etag)
+    assert etag_matches('W/"abc"', etag)
+    assert etag_matches('"old", "abc"', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches('"old"', etag)
@@ -0,0 +1,34 @@
+import random
+
+import pytest
+
+from src.api.utils import calculate_distance, get_bounding_box
+
+
+def in_bounding_box(box, latitude, longitude):
+    min_lat, max_lat, lon_ranges = box
+    if not min_lat <= latitude <= max_lat:
+        return False
+    return not lon_ranges or any(min_lon <= longitude <= max_lon for min_lon, max_lon in lon_ranges)
+
+
+@pytest.mark.parametrize("center", [(55.75, 37.62), (0.0, 0.0), (89.5, 10.0), (-33.87, 179.9), (64.0, -179.95)])
+@pytest.mark.parametrize("distance", [1.0, 50.0, 500.0])
+def test_bounding_box_contains_every_point_in_range(center, distance):
+    rng = random.Random(0)
+    box = get_bounding_box(*center, distance)
+
+    for _ in range(5000):
+        latitude = max(-90.0, min(90.0, center[0] + rng.uniform(-10, 10)))
+        longitude = (center[1] + rng.uniform(-30, 30) + 180) % 360 - 180
+        if calculate_distance(*center, latitude, longitude) <= distance:
+            assert in_bounding_box(box, latitude, longitude)
+
+
+def test_bounding_box_covering_pole_does_not_limit_longitude():
+    assert get_bounding_box(89.9, 0.0, 100.0)[2] == []
+
+
+def test_bounding_box_crossing_antimeridian_is_split():
+    _, _, lon_ranges = get_bounding_box(0.0, 179.99, 10.0)
+    assert len(lon_ranges) == 2
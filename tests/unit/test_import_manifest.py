@@ -0,0 +1,46 @@
+import io
+
+import pytest
+
+from pydantic import ValidationError
+
+from src.api.schemas import ImportClientSchema
+from src.api.importer import read_manifest, get_manifest_format, format_validation_error
+
+
+def test_csv_rows_are_numbered_like_in_a_spreadsheet():
+    manifest = io.StringIO("email,photo\na@example.com,a.jpg\nb@example.com,b.jpg\n")
+
+    assert list(read_manifest(manifest, "csv")) == [
+        (2, {"email": "a@example.com", "photo": "a.jpg"}),
+        (3, {"email": "b@example.com", "photo": "b.jpg"}),
+    ]
+
+
+def test_broken_jsonl_lines_are_reported_not_raised():
+    manifest = io.StringIO('{"email": "a@example.com"}\n\nnot json\n[1, 2]\n{"email": "b@example.com"}\n')
+
+    assert list(read_manifest(manifest, "jsonl")) == [
+        (1, {"email": "a@example.com"}),
+        (3, None),
+        (4, None),
+        (5, {"email": "b@example.com"}),
+    ]
+
+
+def test_manifest_format_is_taken_from_extension():
+    assert get_manifest_format("clients.CSV") == "csv"
+    assert get_manifest_format("clients.jsonl") == "jsonl"
+    with pytest.raises(ValueError):
+        get_manifest_format("clients.xlsx")
+
+
+def test_email_longer_than_the_column_is_a_row_error():
+    row = {"email": f"{'a' * 60}@example.com", "password": "x", "first_name": "A", "last_name": "B",
+           "gender": "male", "longitude": 0, "latitude": 0, "photo": "a.jpg"}
+
+    with pytest.raises(ValidationError) as error:
+        ImportClientSchema.model_validate(row)
+
+    assert format_validation_error(error.value).startswith("email: ")
+    assert ImportClientSchema.model_validate({**row, "email": "a@example.com"}).email == "a@example.com"
@@ -0,0 +1,29 @@
+import asyncio
+
+from src.api.invalidation import handle_event, invalidate_all, handlers
+from src.api.crud import users_cache
+
+
+def test_event_is_routed_by_cache_name(monkeypatch):
+    received = []
+    monkeypatch.setitem(handlers, "test", received.append)
+
+    handle_event({"cache": "test", "email": "a@example.com"})
+    handle_event({"cache": "unknown"})
+
+    assert received == [{"cache": "test", "email": "a@example.com"}]
+
+
+def test_users_event_drops_only_given_email():
+    async def fill():
+        for email in ("a@example.com", "b@example.com"):
+            await users_cache.get_or_load(email, lambda: asyncio.sleep(0, result=email))
+
+    users_cache.invalidate()
+    asyncio.run(fill())
+
+    handle_event({"cache": "users", "email": "a@example.com"})
+
+    assert len(users_cache) == 1
+    invalidate_all()
+    assert len(users_cache) == 0
@@ -0,0 +1,76 @@
+import socket
+import asyncio
+
+from aiosmtpd.controller import Controller
+
+from src.api.models import Outbox
+from src.api.mailer import EmailOutboxWorker, get_retry_delay
+
+
+class RecordingHandler:
+
+    def __init__(self):
+        self.messages = []
+        self.sessions = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        self.sessions.add(id(session))
+        self.messages.append(envelope)
+        return "250 OK"
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def make_worker(port: int) -> EmailOutboxWorker:
+    return EmailOutboxWorker(hostname="127.0.0.1", port=port, username=None, password=None,
+                             sender="noreply@example.com", start_tls=False)
+
+
+def make_emails(count: int) -> list[Outbox]:
+    return [Outbox(id=i, recipient=f"user{i}@example.com", subject="Взаимная симпатия!", body="body")
+            for i in range(count)]
+
+
+def test_batch_is_sent_over_one_connection():
+    handler = RecordingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=get_free_port())
+    controller.start()
+
+    try:
+        worker = make_worker(controller.port)
+
+        async def main():
+            errors = await worker.send_batch(make_emails(10))
+            await worker.close_connection()
+            return errors
+
+        errors = asyncio.run(main())
+    finally:
+        controller.stop()
+
+    assert errors == {}
+    assert len(handler.messages) == 10
+    assert len(handler.sessions) == 1
+    assert worker.connections == 1
+    assert worker.stats()["sent"] == 10
+
+
+def test_unreachable_server_reports_every_email_as_failed():
+    worker = make_worker(get_free_port())
+
+    errors = asyncio.run(worker.send_batch(make_emails(3)))
+
+    assert set(errors) == {0, 1, 2}
+    assert worker.failed == 3
+
+
+def test_retry_delay_grows_exponentially_and_is_capped():
+    delays = [get_retry_delay(attempts, base=10, maximum=100).total_seconds() for attempts in range(1, 7)]
+
+    assert 8 <= delays[0] <= 12
+    assert 16 <= delays[1] <= 24
+    assert all(delay <= 120 for delay in delays)
@@ -0,0 +1,100 @@
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, text
+
+from src.api.metrics import timed, instrument_engine, request_queries, RequestQueries, MetricsMiddleware
+
+
+def sample(metric: str, **labels) -> float:
+    return REGISTRY.get_sample_value(metric, labels) or 0.0
+
+
+def test_timed_records_sync_and_async_calls():
+    @timed("test_sync")
+    def sync_function():
+        return 1
+
+    @timed("test_async")
+    async def async_function():
+        return 2
+
+    assert sync_function() == 1
+    assert asyncio.run(async_function()) == 2
+    assert sample("function_duration_seconds_count", name="test_sync") == 1
+    assert sample("function_duration_seconds_count", name="test_async") == 1
+
+
+def test_queries_are_counted_per_request():
+    engine = create_engine("sqlite://")
+    instrument_engine(engine)
+
+    queries = RequestQueries()
+    token = request_queries.set(queries)
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        conn.execute(text("SELECT 2"))
+    request_queries.reset(token)
+
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 3"))
+
+    assert queries.count == 2
+    assert queries.duration > 0
+
+
+def test_latency_is_labelled_by_route_template():
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware, query_warn_threshold=0)
+
+    @app.get("/items/{id}")
+    async def get_item(id: int):
+        return {"id": id}
+
+    with TestClient(app) as client:
+        client.get("/items/1")
+        client.get("/items/2")
+        client.get("/missing")
+
+    assert sample("http_request_duration_seconds_count", method="GET", route="/items/{id}", status="200") == 2
+    assert sample("http_request_duration_seconds_count", method="GET", route="unmatched", status="404") == 1
+
+
+def test_repeated_statements_are_grouped_without_literals_and_parameter_lists():
+    engine = create_engine("sqlite://")
+    instrument_engine(engine)
+
+    queries = RequestQueries()
+    token = request_queries.set(queries)
+    with engine.connect() as conn:
+        for i in range(5):
+            conn.exec_driver_sql(f"SELECT {i} WHERE 1 IN ({', '.join(['?'] * (i + 1))})", tuple(range(i + 1)))
+        conn.exec_driver_sql("SELECT 'other'")
+    request_queries.reset(token)
+
+    (statement, count, duration), = queries.repeated(5)
+
+    assert statement == "SELECT ? WHERE ? IN (?)"
+    assert count == 5
+    assert queries.count == 6
+
+
+def test_repeated_queries_are_flagged_per_route():
+    engine = create_engine("sqlite://")
+    instrument_engine(engine)
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware, repeated_query_threshold=3)
+
+    @app.get("/n-plus-one")
+    def n_plus_one():
+        with engine.connect() as conn:
+            for i in range(3):
+                conn.execute(text("SELECT :id"), {"id": i})
+        return {}
+
+    with TestClient(app) as client:
+        client.get("/n-plus-one")
+
+    assert sample("db_repeated_queries_requests_total", route="/n-plus-one") == 1
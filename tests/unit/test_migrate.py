@@ -0,0 +1,56 @@
+from alembic.config import Config
+
+from src.api import migrate as migrate_module
+from src.api.migrate import get_head_revisions, migrate
+
+
+def get_config() -> Config:
+    return Config("alembic.ini")
+
+
+def test_migrations_have_single_head():
+    assert get_head_revisions(get_config()) == {"a4d81f6c0e27"}
+
+
+def test_skips_upgrade_when_database_is_at_head(monkeypatch):
+    upgrades = []
+
+    async def current(database_url):
+        return {"a4d81f6c0e27"}
+
+    monkeypatch.setattr(migrate_module, "get_current_revisions", current)
+    monkeypatch.setattr(migrate_module.command, "upgrade", lambda config, revision: upgrades.append(revision))
+
+    assert migrate(get_config(), "postgresql+asyncpg://db") == 0
+    assert upgrades == []
+
+
+def test_upgrades_or_fails_check_when_database_is_behind(monkeypatch):
+    upgrades = []
+
+    async def current(database_url):
+        return {"7c3e9a51d2b4"}
+
+    monkeypatch.setattr(migrate_module, "get_current_revisions", current)
+    monkeypatch.setattr(migrate_module.command, "upgrade", lambda config, revision: upgrades.append(revision))
+
+    assert migrate(get_config(), "postgresql+asyncpg://db", check=True) == 1
+    assert upgrades == []
+
+    assert migrate(get_config(), "postgresql+asyncpg://db") == 0
+    assert upgrades == ["heads"]
+
+
+def test_unknown_revision_is_reported_instead_of_upgrading(monkeypatch, capsys):
+    upgrades = []
+
+    async def current(database_url):
+        return {"d41d8cd98f00"}
+
+    monkeypatch.setattr(migrate_module, "get_current_revisions", current)
+    monkeypatch.setattr(migrate_module.command, "upgrade", lambda config, revision: upgrades.append(revision))
+
+    assert migrate(get_config(), "postgresql+asyncpg://db") == 2
+    assert migrate(get_config(), "postgresql+asyncpg://db", check=True) == 2
+    assert upgrades == []
+    assert "alembic stamp --purge 3a824b1ff5c9" in capsys.readouterr().err
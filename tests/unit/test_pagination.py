@@ -0,0 +1,20 @@
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from src.api.utils import encode_cursor, decode_cursor
+
+
+def test_cursor_round_trip():
+    time_created = datetime(2024, 5, 17, 12, 30, 1, 250, tzinfo=timezone.utc)
+
+    assert decode_cursor(encode_cursor(time_created, 42)) == (time_created, 42)
+
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", "WzFd"])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+
+    assert error.value.status_code == 400
@@ -0,0 +1,36 @@
+import asyncio
+
+from datetime import date
+
+from src.api.partitions import PartitionMaintainer, add_months, get_expired_partitions
+
+
+def test_add_months_crosses_years():
+    assert add_months(date(2026, 11, 1), 2) == date(2027, 1, 1)
+    assert add_months(date(2026, 1, 1), -1) == date(2025, 12, 1)
+    assert add_months(date(2026, 10, 1), -12) == date(2025, 10, 1)
+
+
+def test_expired_partitions_keep_retention_months_and_skip_other_tables():
+    names = ["match_2025_08", "match_2025_09", "match_2025_10", "match_2026_10", "match_2026_12", "match_default",
+             "match_2025_9"]
+
+    assert get_expired_partitions(names, date(2026, 10, 18), 12) == ["match_2025_08", "match_2025_09"]
+    assert get_expired_partitions(names, date(2026, 10, 18), 0) == []
+
+
+def test_failed_passes_are_counted_in_stats():
+    def broken_session():
+        raise ConnectionError("database is down")
+
+    async def main():
+        maintainer = PartitionMaintainer(session_factory=broken_session, interval=0.01)
+        maintainer.start()
+        await asyncio.sleep(0.1)
+        await maintainer.stop()
+        return maintainer.stats()
+
+    stats = asyncio.run(main())
+
+    assert stats["failures"] >= 2
+    assert stats["last_success_time"] == 0
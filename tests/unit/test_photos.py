@@ -0,0 +1,71 @@
+import os
+import hashlib
+
+from io import BytesIO
+
+import pytest
+
+from PIL import Image
+from fastapi import HTTPException
+
+from src.api.photos import render_photo_files, probe_photo, spool_photo
+
+
+def make_jpeg(size: tuple[int, int]) -> bytes:
+    output = BytesIO()
+    Image.new("RGB", size, (0, 0, 0)).save(output, format="JPEG")
+    return output.getvalue()
+
+
+def render(directory, data: bytes, **kwargs) -> dict[str, bytes]:
+    path = spool_photo(BytesIO(data), str(directory))
+    digest, files = render_photo_files(path, "TEXT", str(directory), **kwargs)
+    return {variant: open(filepath, "rb").read() for variant, filepath in files.items()}
+
+
+def test_variants_fit_their_bounds(tmp_path):
+    variants = render(tmp_path, make_jpeg((4000, 3000)), variants={"full": 2000, "medium": 800, "thumb": 200},
+                      webp=True)
+
+    sizes = {name: Image.open(BytesIO(data)).size for name, data in variants.items()}
+
+    assert sizes == {
+        "full.jpeg": (2000, 1500), "full.webp": (2000, 1500),
+        "medium.jpeg": (800, 600), "medium.webp": (800, 600),
+        "thumb.jpeg": (200, 150), "thumb.webp": (200, 150),
+    }
+
+
+def test_small_photo_is_not_upscaled_and_gets_watermark(tmp_path):
+    variants = render(tmp_path, make_jpeg((300, 200)), variants={"full": 2000}, webp=False)
+
+    image = Image.open(BytesIO(variants["full.jpeg"]))
+
+    assert image.size == (300, 200)
+    assert max(image.convert("L").crop((200, 150, 300, 200)).getdata()) > 64
+
+
+def test_probe_reads_header_and_rejects_early():
+    assert probe_photo(BytesIO(make_jpeg((4000, 3000)))) == ("JPEG", 4000, 3000)
+
+    gif = BytesIO()
+    Image.new("RGB", (10, 10)).save(gif, format="GIF")
+    for data, max_pixels, status in ((b"not an image", 100, 415), (gif.getvalue(), 1000, 415),
+                                     (make_jpeg((4000, 3000)), 10_000_000, 413)):
+        file = BytesIO(data)
+        with pytest.raises(HTTPException) as error:
+            probe_photo(file, max_pixels=max_pixels)
+        assert error.value.status_code == status
+        assert file.tell() == 0
+
+
+def test_rendered_files_and_digest(tmp_path):
+    path = spool_photo(BytesIO(make_jpeg((1200, 900))), str(tmp_path), chunk_size=1024)
+
+    digest, files = render_photo_files(path, "TEXT", str(tmp_path), variants={"full": 800, "thumb": 200}, webp=True)
+    variants = {variant: open(filepath, "rb").read() for variant, filepath in files.items()}
+
+    assert sorted(variants) == ["full.jpeg", "full.webp", "thumb.jpeg", "thumb.webp"]
+    expected = hashlib.sha256(b"".join(variant.encode() + variants[variant] for variant in sorted(variants)))
+    assert digest == expected.hexdigest()
+    assert sorted(os.listdir(tmp_path)) == sorted([os.path.basename(path), *map(os.path.basename, files.values())])
@@ -0,0 +1,89 @@
+import json
+import time
+import asyncio
+import threading
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.api.profiling import StackSampler, RequestProfiler, ProfilingMiddleware, LoopBlockingMonitor
+from src.api.settings import PROFILE_TOKEN_SCOPE
+from src.api.utils import encode_jwt
+
+
+def busy_function(seconds: float):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def test_sampler_sees_the_running_function():
+    sampler = StackSampler(threading.get_ident(), interval=0.001)
+    sampler.start()
+    busy_function(0.1)
+    sampler.stop()
+
+    assert any("busy_function" in stack for stack in sampler.samples)
+
+
+def create_app(profiler: RequestProfiler) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(ProfilingMiddleware, profiler=profiler)
+
+    @app.get("/slow/{id}")
+    async def slow(id: int):
+        busy_function(0.05)
+        return {"id": id}
+
+    return app
+
+
+def test_profile_is_written_only_for_signed_requests(tmp_path):
+    profiler = RequestProfiler(directory=str(tmp_path))
+    token = encode_jwt({"sub": "profiler", "scope": PROFILE_TOKEN_SCOPE})
+    user_token = encode_jwt({"sub": "user@example.com", "email": "user@example.com"})
+
+    with TestClient(create_app(profiler)) as client:
+        plain = client.get("/slow/1")
+        forged = client.get("/slow/1", headers={"X-Profile-Token": user_token})
+        profiled = client.get("/slow/1", headers={"X-Profile-Token": token})
+
+    name = profiled.headers["x-profile"]
+    profile = json.loads((tmp_path / f"{name}.json").read_text())
+
+    assert "x-profile" not in plain.headers and "x-profile" not in forged.headers
+    assert profile["route"] == "/slow/{id}" and profile["status"] == 200
+    assert any("busy_function" in stack["stack"] for stack in profile["stacks"])
+    assert (tmp_path / f"{name}.folded").read_text()
+    assert len(list(tmp_path.iterdir())) == 2
+
+
+def test_armed_route_is_profiled_count_times(tmp_path):
+    profiler = RequestProfiler(directory=str(tmp_path))
+    profiler.arm("/slow/{id}", 2)
+
+    with TestClient(create_app(profiler)) as client:
+        responses = [client.get(f"/slow/{i}") for i in range(3)]
+
+    assert ["x-profile" in response.headers for response in responses] == [True, True, False]
+    assert profiler.stats() == {"active": 0, "armed": 0, "written": 2}
+
+
+def test_loop_monitor_reports_the_blocking_call(caplog):
+    def blocking_call():
+        time.sleep(0.2)
+
+    async def main():
+        monitor = LoopBlockingMonitor(threshold=0.05, interval=0.01)
+        monitor.start()
+        await asyncio.sleep(0.05)
+        blocking_call()
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+        return monitor
+
+    monitor = asyncio.run(main())
+
+    assert monitor.stalls == 1
+    assert monitor.max_lag >= 0.15
+    assert "blocking_call" in caplog.text
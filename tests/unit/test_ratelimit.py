@@ -0,0 +1,131 @@
+import asyncio
+
+import httpx
+
+from fastapi import FastAPI
+
+from src.api.ratelimit import RateLimiter, RateLimitMiddleware, RequestLimits
+from src.api.utils import encode_jwt
+
+
+class FakeTimer:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_bucket_allows_burst_then_refills():
+    timer = FakeTimer()
+    limiter = RateLimiter(rate=2, burst=3, timer=timer)
+
+    assert [limiter.acquire("a") for _ in range(3)] == [0, 0, 0]
+    assert limiter.acquire("a") == 0.5
+    assert limiter.acquire("b") == 0
+
+    timer.now = 0.5
+    assert limiter.acquire("a") == 0
+    assert limiter.acquire("a") == 0.5
+
+
+def test_idle_keys_are_evicted_and_size_is_capped():
+    timer = FakeTimer()
+    limiter = RateLimiter(rate=1, burst=5, max_keys=3, timer=timer)
+
+    for key in (b"\x01", b"\x02", b"\x03", b"\x04"):
+        limiter.acquire(key)
+    assert len(limiter) == 3
+
+    timer.now = 10
+    limiter.acquire(b"\x05")
+    limiter.acquire(b"\x05")
+    assert len(limiter) == 1
+
+
+def make_app(limits: RequestLimits, release: asyncio.Event | None = None) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/items/{id}")
+    async def get_item(id: int):
+        return {"id": id}
+
+    @app.get("/heavy")
+    async def heavy():
+        await release.wait()
+        return {}
+
+    app.add_middleware(RateLimitMiddleware, limits=limits)
+    return app
+
+
+def test_rejects_per_ip_and_per_user_by_route_template():
+    limits = RequestLimits(user_limits={"/items/{id}": (0.01, 2)}, ip_limits={"*": (0.01, 3)},
+                           concurrency_limits={}, concurrency_routes={})
+    token = encode_jwt({"sub": "a@example.com", "email": "a@example.com"})
+
+    async def main():
+        transport = httpx.ASGITransport(make_app(limits))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            user = [(await client.get(f"/items/{i}", headers={"X-Real-IP": "10.0.0.1",
+                                                              "Cookie": f"auth_token={token}"})).status_code
+                    for i in range(3)]
+            ip = [(await client.get(f"/items/{i}", headers={"X-Real-IP": "10.0.0.2"})).status_code for i in range(4)]
+            rejected = await client.get("/items/1", headers={"X-Real-IP": "10.0.0.2"})
+            return user, ip, rejected
+
+    user, ip, rejected = asyncio.run(main())
+
+    assert user == [200, 200, 429]
+    assert ip == [200, 200, 200, 429]
+    assert int(rejected.headers["Retry-After"]) >= 1
+    assert limits.stats()["user_keys"] == 1
+
+
+def test_sheds_requests_over_concurrency_cap():
+    limits = RequestLimits(user_limits={}, ip_limits={}, concurrency_limits={"db": 2},
+                           concurrency_routes={"/heavy": "db"})
+
+    async def main():
+        release = asyncio.Event()
+        transport = httpx.ASGITransport(make_app(limits, release))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            running = [asyncio.create_task(client.get("/heavy")) for _ in range(2)]
+            await asyncio.sleep(0.05)
+            shed = await client.get("/heavy")
+            light = await client.get("/items/1")
+            release.set()
+            return [r.status_code for r in await asyncio.gather(*running)], shed, light.status_code
+
+    running, shed, light = asyncio.run(main())
+
+    assert running == [200, 200]
+    assert shed.status_code == 503 and shed.headers["Retry-After"] == "1"
+    assert light == 200
+    assert limits.stats() == {"user_keys": 0, "ip_keys": 0, "db_active": 0, "db_rejected": 1}
+
+
+def test_ndjson_export_has_its_own_concurrency_group():
+    limits = RequestLimits(user_limits={}, ip_limits={}, concurrency_limits={"db": 2, "export": 1},
+                           concurrency_routes={"/heavy": "db"}, export_routes={"/heavy": "export"})
+
+    async def main():
+        release = asyncio.Event()
+        transport = httpx.ASGITransport(make_app(limits, release))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            export = asyncio.create_task(client.get("/heavy", params={"format": "ndjson"}))
+            await asyncio.sleep(0.05)
+            shed = await client.get("/heavy", headers={"Accept": "application/x-ndjson"})
+            running = [asyncio.create_task(client.get("/heavy", params={"format": "json"})) for _ in range(2)]
+            await asyncio.sleep(0.05)
+            active = limits.stats()
+            release.set()
+            running = [r.status_code for r in await asyncio.gather(*running)]
+            return (await export).status_code, shed.status_code, running, active
+
+    export, shed, running, active = asyncio.run(main())
+
+    # Выгрузка не занимает место обычных запросов к базе, и выгрузок сверх своего лимита не бывает.
+    assert (export, shed, running) == (200, 503, [200, 200])
+    assert (active["export_active"], active["db_active"]) == (1, 2)
@@ -0,0 +1,43 @@
+import asyncio
+import itertools
+
+from fastapi import Request, Response
+
+from src.api import database
+from src.api.settings import READ_PRIMARY_COOKIE
+
+
+def make_request(cookies: dict | None = None) -> Request:
+    headers = []
+    if cookies:
+        headers.append((b"cookie", "; ".join(f"{k}={v}" for k, v in cookies.items()).encode()))
+    return Request({"type": "http", "method": "GET", "path": "/list", "headers": headers})
+
+
+def test_reads_go_to_primary_without_replicas(monkeypatch):
+    monkeypatch.setattr(database, "replica_sessions", [])
+
+    assert database.get_read_sessionmaker(make_request()) is database.async_session
+
+
+def test_reads_rotate_over_replicas_until_client_writes(monkeypatch):
+    replicas = ["replica0", "replica1"]
+    monkeypatch.setattr(database, "replica_sessions", replicas)
+    monkeypatch.setattr(database, "_next_replica", itertools.cycle(replicas))
+
+    routed = [database.get_read_sessionmaker(make_request()) for _ in range(4)]
+    sticky = database.get_read_sessionmaker(make_request({READ_PRIMARY_COOKIE: "1"}))
+
+    assert routed == ["replica0", "replica1", "replica0", "replica1"]
+    assert sticky is database.async_session
+
+
+def test_write_marks_client_for_primary_reads(monkeypatch):
+    response = Response()
+    monkeypatch.setattr(database, "replica_sessions", ["replica0"])
+
+    session = asyncio.run(database.get_write_session(response, session="primary"))
+
+    assert session == "primary"
+    assert f"{READ_PRIMARY_COOKIE}=1" in response.headers["set-cookie"]
+    assert "Max-Age" in response.headers["set-cookie"]
@@ -0,0 +1,41 @@
+import asyncio
+
+from sqlalchemy.dialects import postgresql
+
+from src.api.crud import query_clients_db
+from src.api.settings import NAME_SEARCH_MAX_RESULTS
+from src.api.utils import escape_like
+
+
+class RecordingSession:
+
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+        return self
+
+    def all(self):
+        return []
+
+
+def test_escape_like():
+    assert escape_like("100%") == "100/%"
+    assert escape_like("first_name") == "first/_name"
+    assert escape_like("a/b") == "a//b"
+    # Сначала удваивается сам escape-символ, иначе экранирование % и _ испортилось бы.
+    assert escape_like("/%_") == "///%/_"
+    assert escape_like("Анна") == "Анна"
+
+
+def test_search_is_capped_and_ignores_cursor():
+    session = RecordingSession()
+
+    # Курсор не разбирается: с ним "not-a-cursor" был бы 400.
+    page = asyncio.run(query_clients_db(session, "desc", None, search="Анна", limit=500, cursor="not-a-cursor"))
+
+    assert page.items == [] and page.next_cursor is None
+    sql = str(session.statements[0].compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+    assert sql.endswith(f"LIMIT {NAME_SEARCH_MAX_RESULTS}")
+    assert "time_created" not in sql.split("WHERE", 1)[1]
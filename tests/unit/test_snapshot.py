@@ -0,0 +1,156 @@
+import random
+import asyncio
+
+import pytest
+
+from types import SimpleNamespace
+from datetime import datetime, timedelta, timezone
+from fastapi import HTTPException
+
+from src.api.snapshot import ClientSnapshot
+from src.api.schemas import CurrentUserSchema
+from src.api.utils import calculate_distance
+
+NOW = datetime(2026, 10, 18, tzinfo=timezone.utc)
+MOSCOW = (55.75, 37.62)
+
+
+def make_row(id: int, rng: random.Random, **fields) -> SimpleNamespace:
+    row = SimpleNamespace(id=id, email=f"user{id}@example.com", first_name=rng.choice(["Анна", "Иван", "Maria"]),
+                          last_name=rng.choice(["Петров", "Smith", None]), gender=rng.choice(["male", "female"]),
+                          photo=None, latitude=MOSCOW[0] + rng.gauss(0, 2), longitude=MOSCOW[1] + rng.gauss(0, 2),
+                          time_created=NOW - timedelta(seconds=rng.randint(0, 100_000)), time_updated=None)
+    if rng.random() < 0.05:
+        row.latitude = row.longitude = None
+    row.__dict__.update(fields)
+    return row
+
+
+@pytest.fixture
+def rows() -> list:
+    rng = random.Random(42)
+    return sorted((make_row(i + 1, rng) for i in range(3000)), key=lambda row: (row.time_created, row.id))
+
+
+@pytest.fixture
+def snapshot(rows) -> ClientSnapshot:
+    snapshot = ClientSnapshot(grid_degrees=0.5)
+    for i in range(0, len(rows), 700):
+        snapshot.apply(rows[i:i + 700])
+    return snapshot
+
+
+@pytest.fixture
+def current_user() -> CurrentUserSchema:
+    return CurrentUserSchema(id=1, email="user1@example.com", first_name=None, latitude=MOSCOW[0], longitude=MOSCOW[1])
+
+
+def read_all(snapshot, current_user, sort_order, **filters) -> list[int]:
+    ids, cursor = [], None
+    while True:
+        page = snapshot.query_clients(sort_order, current_user, limit=250, cursor=cursor, **filters)
+        ids += [client.id for client in page.items]
+        cursor = page.next_cursor
+        if cursor is None:
+            return ids
+
+
+def matches(row, gender=None, first_name=None, last_name=None, distance=None) -> bool:
+    return ((not gender or row.gender == gender)
+            and (not first_name or first_name.lower() in (row.first_name or "").lower())
+            and (not last_name or last_name.lower() in (row.last_name or "").lower())
+            and (not distance or (row.latitude is not None
+                                  and calculate_distance(*MOSCOW, row.latitude, row.longitude) <= distance)))
+
+
+@pytest.mark.parametrize("filters", [{}, {"gender": "female"}, {"first_name": "АН"}, {"last_name": "smi"},
+                                     {"distance": 50}, {"distance": 300, "gender": "male"}, {"distance": 20000}])
+@pytest.mark.parametrize("sort_order", [None, "desc"])
+def test_query_matches_brute_force(snapshot, rows, current_user, filters, sort_order):
+    expected = [row.id for row in rows if matches(row, **filters)]
+    if sort_order == "desc":
+        expected.reverse()
+
+    assert read_all(snapshot, current_user, sort_order, **filters) == expected
+
+
+def test_distance_needs_location(snapshot):
+    with pytest.raises(HTTPException) as e:
+        snapshot.query_clients(None, None, distance=10)
+
+    assert e.value.status_code == 401
+
+
+@pytest.mark.parametrize("location", [MOSCOW, (-89.9, 179.9), (10.0, -179.99)])
+def test_nearest_matches_brute_force(snapshot, rows, location):
+    current_user = CurrentUserSchema(id=1, email="user1@example.com", first_name=None,
+                                     latitude=location[0], longitude=location[1])
+    expected = sorted((calculate_distance(*location, row.latitude, row.longitude), row.id)
+                      for row in rows if row.latitude is not None and row.id != 1)[:15]
+
+    nearest = snapshot.nearest_clients(current_user, 15)
+
+    assert [client.id for client in nearest] == [id for _, id in expected]
+    assert nearest[0].distance == pytest.approx(expected[0][0])
+
+
+def test_late_rows_and_updates_keep_order_and_grid(snapshot, rows, current_user):
+    rng = random.Random(1)
+    snapshot.within(*MOSCOW, 10)  # сетка построена до изменений
+    late = make_row(5000, rng, first_name="Поздний", time_created=rows[10].time_created, latitude=MOSCOW[0],
+                    longitude=MOSCOW[1])
+    moved = make_row(rows[-1].id, rng, time_created=rows[-1].time_created, time_updated=NOW,
+                     latitude=MOSCOW[0] + 0.0001, longitude=MOSCOW[1])
+    snapshot.apply([late, moved])
+
+    ids = read_all(snapshot, current_user, None)
+    nearest = [client.id for client in snapshot.nearest_clients(current_user, 2)]
+
+    assert len(ids) == len(rows) + 1
+    assert ids.index(5000) < ids.index(rows[11].id)
+    assert [client.id for client in snapshot.query_clients(None, None, first_name="поздн").items] == [5000]
+    assert nearest == [5000, moved.id]
+    assert snapshot.watermark == (NOW - datetime(1970, 1, 1, tzinfo=timezone.utc)) // timedelta(microseconds=1)
+
+
+class FakeSnapshotSession:
+
+    def __init__(self, version: int, rows: list):
+        self.version = version
+        self.rows = rows
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def scalar(self, query):
+        return self.version
+
+    async def stream(self, query):
+        return self
+
+    async def partitions(self, size):
+        yield self.rows
+
+
+def test_etag_version_changes_on_every_local_apply(snapshot, rows):
+    rng = random.Random(2)
+    session = FakeSnapshotSession(7, [])
+    snapshot.session_factory = lambda: session
+    asyncio.run(snapshot.refresh())
+    seen = {snapshot.etag_version}
+
+    # Регистрация в этом воркере меняет страницу раньше, чем фоновое обновление увидит новую версию.
+    snapshot.apply([make_row(6000, rng)])
+    assert snapshot.etag_version not in seen
+    seen.add(snapshot.etag_version)
+
+    # Обновление с той же версией не возвращает ETag к уже отданному значению.
+    asyncio.run(snapshot.refresh())
+    assert snapshot.etag_version == (7, 1)
+
+    session.version = 8
+    asyncio.run(snapshot.refresh())
+    assert snapshot.etag_version == (8, 0)
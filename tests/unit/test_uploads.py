@@ -0,0 +1,122 @@
+import os
+import sys
+import json
+import asyncio
+import subprocess
+
+import httpx
+import pytest
+
+from PIL import Image
+from fastapi import FastAPI, Request
+
+from src.api.uploads import BodySizeLimitMiddleware
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Выполняется в отдельном процессе. Пик RSS (VmHWM) сбрасывается перед замером через /proc/self/clear_refs,
+# поэтому видно, насколько вырос процесс за одну загрузку, а не за всё время работы.
+MEASURE_INGEST = """
+import os, sys, json, asyncio, resource, tempfile
+from starlette.datastructures import UploadFile
+from src.api import utils
+from src.api.photos import photo_pipeline
+from src.api.utils import ingest_client_photo
+
+utils.PHOTO_STORAGE_DIR = os.path.join(sys.argv[3], "client_photos")
+utils.PHOTO_SPOOL_DIR = os.path.join(utils.PHOTO_STORAGE_DIR, ".incoming")
+
+def memory(field):
+    with open("/proc/self/status") as status:
+        return next(int(line.split()[1]) * 1024 for line in status if line.startswith(field + ":"))
+
+def reset_peak():
+    with open("/proc/self/clear_refs", "w") as clear_refs:
+        clear_refs.write("5")
+    return memory("VmRSS")
+
+def upload(path):
+    # Так же, как MultiPartParser: SpooledTemporaryFile с порогом 1 МБ, запись кусками.
+    file = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    with open(path, "rb") as source:
+        while chunk := source.read(64 * 1024):
+            file.write(chunk)
+    file.seek(0)
+    return UploadFile(file, size=file.tell() or None)
+
+async def main():
+    await ingest_client_photo(upload(sys.argv[2]))
+    photo = upload(sys.argv[1])
+    before = reset_peak()
+    url = await ingest_client_photo(photo)
+    ingest = memory("VmHWM") - before
+
+    photo = upload(sys.argv[1])
+    before = reset_peak()
+    data = photo.file.read()
+    read = memory("VmHWM") - before
+    return url, ingest, read, len(data)
+
+url, ingest, read, size = asyncio.run(main())
+photo_pipeline.executor.shutdown(wait=True)
+worker = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024
+print(json.dumps({"url": url, "ingest": ingest, "read": read, "size": size, "worker": worker}))
+"""
+
+
+def make_app(limit: int) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/upload")
+    async def upload(request: Request):
+        return {"size": len(await request.body())}
+
+    @app.post("/other")
+    async def other(request: Request):
+        return {"size": len(await request.body())}
+
+    app.add_middleware(BodySizeLimitMiddleware, limits={"/upload": limit})
+    return app
+
+
+def test_body_is_cut_off_at_the_route_limit():
+    async def chunks(size: int):
+        for _ in range(size // 100):
+            yield b"x" * 100
+
+    async def main():
+        transport = httpx.ASGITransport(make_app(limit=1000))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return (await client.post("/upload", content=b"x" * 1000),
+                    await client.post("/upload", content=b"x" * 1001),
+                    await client.post("/upload", content=chunks(5000)),
+                    await client.post("/other", content=b"x" * 5000))
+
+    fits, declared, streamed, other = asyncio.run(main())
+
+    assert fits.json() == {"size": 1000}
+    assert declared.status_code == 413 and declared.headers["Connection"] == "close"
+    assert streamed.status_code == 413
+    assert other.json() == {"size": 5000}
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/clear_refs"), reason="Linux only")
+def test_ingest_peak_rss_does_not_grow_with_upload_size(tmp_path):
+    photo, small = tmp_path / "photo.jpeg", tmp_path / "small.jpeg"
+    # Шум почти не сжимается: около 8 МБ на диске и 4.8 Мп после декодирования.
+    Image.frombytes("RGB", (2400, 2000), os.urandom(2400 * 2000 * 3)).save(photo, format="JPEG", quality=100)
+    Image.new("RGB", (100, 100)).save(small, format="JPEG")
+
+    result = subprocess.run([sys.executable, "-c", MEASURE_INGEST, str(photo), str(small), str(tmp_path)], cwd=ROOT,
+                            env={**os.environ, "PYTHONPATH": ROOT, "PHOTO_WORKERS": "1"},
+                            capture_output=True, text=True, check=True)
+    measured = json.loads(result.stdout)
+    print(f"upload {measured['size'] / 2 ** 20:.1f} MB: web peak +{measured['ingest'] / 2 ** 20:.1f} MB "
+          f"(read() +{measured['read'] / 2 ** 20:.1f} MB), photo worker peak {measured['worker'] / 2 ** 20:.1f} MB")
+
+    assert measured["size"] > 6 * 2 ** 20
+    # Загрузка целиком в память процесса web-воркера не попадает, в отличие от photo.read().
+    assert measured["read"] >= measured["size"]
+    assert measured["ingest"] < measured["size"] / 4
+    assert (tmp_path / measured["url"].replace("/static", "client_photos", 1).lstrip("/")).exists()
+    assert os.listdir(tmp_path / "client_photos" / ".incoming") == []